@@ -0,0 +1,205 @@
+import asyncio
+import inspect
+from concurrent.futures import Executor
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple
+
+from entityAgent.context import ContextWindow
+from entityAgent.llm import merge_chunks, response_to_dict
+from entityAgent.prompt import system_prompt
+from entityAgent.tools import ToolRegistry, parse_process_query, tool_call_parts, tools_unsupported
+
+# Receives every `(event, data)` pair an Agent reports; may be a coroutine function.
+Hook = Callable[[str, dict], Any]
+
+
+class Agent:
+    """
+    The agent loop: sends the conversation in `context` to the model, runs
+    the tools it calls and repeats until it answers in plain text.
+
+    `client` has the `chat` signature of an ollama client and may be sync
+    (CachingClient) or async (AsyncCachingClient); only an async one lets
+    several agents share an event loop. What the agent does is reported to
+    each of `hooks` as `(event, data)`:
+
+    - "message" {"message"}: a message was added to the conversation
+    - "token" {"token"}: part of a reply, when `stream` is set
+    - "tool_call" {"name", "arguments"}: a tool is about to run
+    - "tool_result" {"name", "arguments", "result", "concurrent"}: it ran,
+      on a worker thread if `concurrent`
+    - "reply" {"content"}: the answer that ends the turn
+    - "usage" {"prompt_tokens", "prompt_eval_count", "eval_count"}: after
+      each model request; the first is estimated, the others are Ollama's
+      counts (None when it did not report them)
+    - "warning" {"message"}
+
+    Read-only tool calls requested together run concurrently on `executor`.
+    A call that runs alone also goes to `executor` when `offload` is set, so
+    the event loop stays free; otherwise it runs on the calling thread (the
+    CLI, which streams command output and handles Ctrl+C there).
+
+    Models without tool calling are detected on the first request; the agent
+    then switches to the "run:" reply protocol for the rest of its life.
+    """
+
+    def __init__(self, client: Any, model: str, context: ContextWindow, tools: Optional[ToolRegistry] = None,
+                 native_tools: bool = True, os_name: Optional[str] = None, executor: Optional[Executor] = None,
+                 offload: bool = True, stream: bool = False, hooks: Optional[List[Hook]] = None):
+        self.client = client
+        self.model = model
+        self.context = context
+        self.tools = tools
+        self.native_tools = native_tools and tools is not None
+        self.os_name = os_name
+        self.executor = executor
+        self.offload = offload
+        self.stream = stream
+        self.hooks: List[Hook] = list(hooks or [])
+
+    # ── Public API ───────────────────────────────────────────────────────────
+    async def run(self, user_input: str) -> str:
+        """Answer one user message, running tools as needed; returns the reply."""
+        await self._add({'role': 'user', 'content': user_input})
+        while True:
+            reply = await self.step()
+            if reply is not None:
+                return reply
+
+    async def step(self) -> Optional[str]:
+        """
+        One model request and the tools it asks for. Returns the reply when
+        the model answered, or None when tools ran and it must be asked again.
+        """
+        message = await self._request()
+        content = message.get('content') or ''
+        if self.native_tools and message.get('tool_calls'):
+            await self._add({'role': 'assistant', 'content': content, 'tool_calls': message['tool_calls']})
+            for batch in self.tools.batches(message['tool_calls']):
+                await self._run_batch(batch)
+            return None
+
+        await self._add({'role': 'assistant', 'content': content})
+        if not self.native_tools and self.tools is not None and content.strip().lower().startswith("run:"):
+            await self._run_command(content.strip()[4:].strip())
+            return None
+        await self._emit('reply', {'content': content})
+        return content
+
+    async def events(self, user_input: str) -> AsyncIterator[Tuple[str, dict]]:
+        """`run`, yielding each `(event, data)` as it happens; errors are re-raised at the end."""
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def hook(event, data):
+            queue.put_nowait((event, data))
+
+        self.hooks.append(hook)
+        task = asyncio.ensure_future(self.run(user_input))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                yield item
+            task.result()
+        finally:
+            self.hooks.remove(hook)
+            task.cancel()
+
+    # ── Model requests ───────────────────────────────────────────────────────
+    async def _request(self) -> dict:
+        params = {'tools': self.tools.schemas()} if self.native_tools else {}
+        try:
+            response = self.client.chat(model=self.model, messages=self.context.prepare(), stream=self.stream, **params)
+            if inspect.isawaitable(response):
+                response = await response
+            response = await self._collect(response) if self.stream else response_to_dict(response)
+        except Exception as e:
+            if not params or not tools_unsupported(e):
+                raise
+            return await self._fall_back_to_commands()
+        await self._emit('usage', {
+            'prompt_tokens': self.context.token_count() + (self.tools.schema_tokens() if params else 0),
+            'prompt_eval_count': response.get('prompt_eval_count'),
+            'eval_count': response.get('eval_count'),
+        })
+        return response['message']
+
+    async def _fall_back_to_commands(self) -> dict:
+        await self._emit('warning', {
+            'message': f"Model '{self.model}' does not support tool calling; using 'run:' commands instead."
+        })
+        self.native_tools = False
+        if self.os_name is not None:
+            self.context.messages[0]['content'] = system_prompt(self.os_name, native_tools=False)
+        return await self._request()
+
+    async def _collect(self, response: Any) -> dict:
+        chunks = []
+        if hasattr(response, '__aiter__'):
+            async for chunk in response:
+                chunks.append(chunk)
+                await self._token(chunk)
+        else:
+            for chunk in response:
+                chunks.append(chunk)
+                await self._token(chunk)
+        if not chunks:
+            return {'message': {'role': 'assistant', 'content': ''}}
+        return merge_chunks(chunks)
+
+    async def _token(self, chunk: Any) -> None:
+        token = (response_to_dict(chunk).get('message') or {}).get('content')
+        if token:
+            await self._emit('token', {'token': token})
+
+    # ── Tools ────────────────────────────────────────────────────────────────
+    async def _run_batch(self, batch: List[dict]) -> None:
+        calls = [tool_call_parts(tool_call) for tool_call in batch]
+        for name, arguments in calls:
+            await self._emit('tool_call', {'name': name, 'arguments': arguments})
+        concurrent = self.offload or (len(calls) > 1 and self.executor is not None)
+        if concurrent:
+            loop = asyncio.get_running_loop()
+            results = await asyncio.gather(
+                *(loop.run_in_executor(self.executor, self.tools.call, name, arguments) for name, arguments in calls)
+            )
+        else:
+            results = [self.tools.call(name, arguments) for name, arguments in calls]
+        for (name, arguments), result in zip(calls, results):
+            await self._emit('tool_result', {'name': name, 'arguments': arguments, 'result': result,
+                                             'concurrent': concurrent})
+            self.context.append_tool_output(result, role='tool', tool_name=name)
+            await self._emit('message', {'message': self.context.messages[-1]})
+
+    async def _run_command(self, command: str) -> None:
+        """Run a "run:" reply through the matching tool."""
+        if command.split(" ", 1)[0] == "list_processes":
+            name = 'list_processes'
+            try:
+                arguments = parse_process_query(command[len("list_processes"):])
+            except ValueError as e:
+                arguments, result = None, f"list_processes failed: {e}"
+        else:
+            name, arguments = 'execute_command', {'command': command}
+        await self._emit('tool_call', {'name': name, 'arguments': arguments})
+        if arguments is not None:
+            if self.offload:
+                result = await asyncio.get_running_loop().run_in_executor(self.executor, self.tools.call, name, arguments)
+            else:
+                result = self.tools.call(name, arguments)
+        await self._emit('tool_result', {'name': name, 'arguments': arguments, 'result': result,
+                                         'concurrent': self.offload})
+        self.context.append_tool_output(f"Command execution result:\n{result}")
+        await self._emit('message', {'message': self.context.messages[-1]})
+
+    # ── Events ───────────────────────────────────────────────────────────────
+    async def _add(self, message: dict) -> None:
+        self.context.append(message)
+        await self._emit('message', {'message': message})
+
+    async def _emit(self, event: str, data: dict) -> None:
+        for hook in list(self.hooks):
+            result = hook(event, data)
+            if inspect.isawaitable(result):
+                await result
@@ -0,0 +1,343 @@
+import random
+import threading
+import time
+from typing import Any, List, Optional
+
+# Responses with this status or above mean the server failed, rather than
+# rejected the request, so the request is worth retrying elsewhere.
+RETRYABLE_STATUS = 500
+
+
+class BackendUnavailableError(ConnectionError):
+    """Raised when every Ollama backend is failing or has its circuit open."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status >= RETRYABLE_STATUS
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(error, httpx.TransportError)
+
+
+class Backend:
+    """One Ollama server in a pool, with its load and circuit-breaker state."""
+
+    def __init__(self, url: str, weight: float = 1.0, client_options: Optional[dict] = None):
+        self.url = url
+        self.weight = weight
+        self.client_options = client_options or {}
+        self.outstanding = 0
+        self.failures = 0
+        self.open_until = 0.0
+        self._client = None
+        self._async_client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import ollama
+            self._client = ollama.Client(host=self.url, **self.client_options)
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            import ollama
+            self._async_client = ollama.AsyncClient(host=self.url, **self.client_options)
+        return self._async_client
+
+    def available(self, now: float) -> bool:
+        # Once the cool-down has passed a tripped backend gets one trial
+        # request at a time (half-open) until it succeeds again.
+        return now >= self.open_until and (self.open_until == 0.0 or self.outstanding == 0)
+
+    def __repr__(self) -> str:
+        return f"Backend({self.url!r}, weight={self.weight})"
+
+
+class BackendPool:
+    """
+    Spreads chat requests over several Ollama servers.
+
+    Each request goes to the available backend with the fewest outstanding
+    requests relative to its weight. A backend that fails
+    `failure_threshold` times in a row, or fails a health check, has its
+    circuit opened for `cooldown` seconds; failed requests that never
+    reached a reply are retried on up to `retries` other backends.
+    """
+
+    def __init__(self, backends: List[Backend], failure_threshold: int = 3, cooldown: float = 30.0,
+                 retries: int = 1, health_interval: Optional[float] = None):
+        if not backends:
+            raise ValueError("BackendPool needs at least one backend")
+        self.backends = backends
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.retries = retries
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_config(cls, config) -> Optional["BackendPool"]:
+        """A pool for `config.backends`, or None when a single server is configured."""
+        from entityAgent.llm import client_options
+
+        if not config.backends:
+            return None
+        options = client_options(config)
+        backends = [
+            Backend(entry, client_options=options) if isinstance(entry, str)
+            else Backend(entry["url"], float(entry.get("weight", 1.0)), client_options=options)
+            for entry in config.backends
+        ]
+        return cls(
+            backends,
+            failure_threshold=config.backend_failure_threshold,
+            cooldown=config.backend_cooldown,
+            retries=config.backend_retries,
+            health_interval=config.backend_health_interval,
+        )
+
+    # ── Selection and circuit breaking ───────────────────────────────────────
+    def acquire(self, exclude: List[Backend] = ()) -> Backend:
+        """Reserve the least loaded available backend not in `exclude`."""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [b for b in self.backends if b not in exclude and b.available(now)]
+            if not candidates:
+                raise BackendUnavailableError("No Ollama backend is available.")
+            backend = min(candidates, key=lambda b: ((b.outstanding + 1) / b.weight, random.random()))
+            backend.outstanding += 1
+            return backend
+
+    def release(self, backend: Backend, error: Optional[BaseException] = None) -> None:
+        """Return a reservation, recording whether the request succeeded."""
+        with self._lock:
+            backend.outstanding -= 1
+            if error is None:
+                backend.failures = 0
+                backend.open_until = 0.0
+            elif is_retryable(error):
+                backend.failures += 1
+                if backend.failures >= self.failure_threshold or backend.open_until:
+                    backend.open_until = time.monotonic() + self.cooldown
+
+    def _attempts(self) -> int:
+        return min(len(self.backends), self.retries + 1)
+
+    # ── Health checks ────────────────────────────────────────────────────────
+    def start(self) -> None:
+        """Start background health checks every `health_interval` seconds."""
+        if self._thread is not None or not self.health_interval:
+            return
+        self._thread = threading.Thread(target=self._run, name="entity-backend-health", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.health_interval + 1)
+
+    def close(self) -> None:
+        """Stop health checks and close the backends' sync clients."""
+        from entityAgent.llm import close_client
+
+        self.stop()
+        for backend in self.backends:
+            if backend._client is not None:
+                close_client(backend._client)
+                backend._client = None
+
+    async def aclose(self) -> None:
+        """`close`, plus the async clients."""
+        from entityAgent.llm import close_client
+
+        self.close()
+        for backend in self.backends:
+            if backend._async_client is not None:
+                await close_client(backend._async_client)
+                backend._async_client = None
+
+    def check_health(self) -> None:
+        """Probe every backend once, opening or closing its circuit."""
+        from entityAgent.ollama_utils import ollama_is_up
+
+        for backend in self.backends:
+            healthy = ollama_is_up(backend.url, timeout=2.0)
+            with self._lock:
+                if healthy:
+                    if backend.open_until:
+                        backend.failures = 0
+                        backend.open_until = 0.0
+                else:
+                    backend.failures = max(backend.failures, self.failure_threshold)
+                    backend.open_until = time.monotonic() + self.cooldown
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.health_interval):
+            self.check_health()
+
+    # ── Requests ─────────────────────────────────────────────────────────────
+    def chat(self, **kwargs: Any):
+        """`ollama.Client.chat` on the best backend, retrying on another if it fails."""
+        tried: List[Backend] = []
+        error: Optional[Exception] = None
+        for _ in range(self._attempts()):
+            backend = self._next(tried, error)
+            try:
+                response = backend.client.chat(**kwargs)
+                if kwargs.get("stream"):
+                    # Connection errors surface on the first chunk; retry those too.
+                    response = iter(response)
+                    first = next(response, None)
+            except Exception as e:
+                self.release(backend, e)
+                if not is_retryable(e):
+                    raise
+                error = e
+                continue
+            if kwargs.get("stream"):
+                self._hand_over(backend)
+                return self._stream(backend, first, response)
+            self.release(backend)
+            return response
+        raise error
+
+    async def achat(self, **kwargs: Any):
+        """`ollama.AsyncClient.chat` on the best backend, with the same retries."""
+        tried: List[Backend] = []
+        error: Optional[Exception] = None
+        for _ in range(self._attempts()):
+            backend = self._next(tried, error)
+            first = None
+            try:
+                response = await backend.async_client.chat(**kwargs)
+                if kwargs.get("stream"):
+                    first = await response.__anext__()
+            except StopAsyncIteration:
+                pass
+            except Exception as e:
+                self.release(backend, e)
+                if not is_retryable(e):
+                    raise
+                error = e
+                continue
+            if kwargs.get("stream"):
+                self._hand_over(backend)
+                return self._astream(backend, first, response)
+            self.release(backend)
+            return response
+        raise error
+
+    def broadcast(self, **kwargs: Any) -> None:
+        """Send the same request to every available backend (e.g. to load a model)."""
+        error = None
+        now = time.monotonic()
+        for backend in [b for b in self.backends if b.available(now)]:
+            try:
+                backend.client.chat(**kwargs)
+            except Exception as e:
+                error = e
+        if error is not None:
+            raise error
+
+    async def abroadcast(self, **kwargs: Any) -> None:
+        """`broadcast` through the async clients, concurrently."""
+        import asyncio
+
+        now = time.monotonic()
+        results = await asyncio.gather(
+            *(b.async_client.chat(**kwargs) for b in self.backends if b.available(now)),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+    def _next(self, tried: List[Backend], error: Optional[Exception]) -> Backend:
+        """Acquire an untried backend; if none is left, re-raise the last failure."""
+        try:
+            backend = self.acquire(tried)
+        except BackendUnavailableError:
+            if error is not None:
+                raise error
+            raise
+        tried.append(backend)
+        return backend
+
+    def _hand_over(self, backend: Backend) -> None:
+        """
+        Give back a reservation for a stream, whose body takes it again: a
+        generator that is never started never runs its `finally`, so a
+        stream nobody reads would otherwise hold its backend forever.
+        """
+        with self._lock:
+            backend.outstanding -= 1
+
+    def _reserve(self, backend: Backend) -> None:
+        with self._lock:
+            backend.outstanding += 1
+
+    def _stream(self, backend: Backend, first: Any, rest):
+        self._reserve(backend)
+        error = None
+        try:
+            if first is not None:
+                yield first
+            yield from rest
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.release(backend, error)
+
+    async def _astream(self, backend: Backend, first: Any, rest):
+        self._reserve(backend)
+        error = None
+        try:
+            if first is not None:
+                yield first
+                async for chunk in rest:
+                    yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.release(backend, error)
+
+
+class PoolClient:
+    """
+    Drop-in for `ollama.Client` whose `chat` goes through a BackendPool,
+    or to every backend at once with `broadcast=True`.
+    """
+
+    def __init__(self, pool: BackendPool, broadcast: bool = False):
+        self.pool = pool
+        self.broadcast = broadcast
+
+    def chat(self, **kwargs: Any):
+        if self.broadcast:
+            return self.pool.broadcast(**kwargs)
+        return self.pool.chat(**kwargs)
+
+
+class AsyncPoolClient:
+    """PoolClient for async callers, in place of `ollama.AsyncClient`."""
+
+    def __init__(self, pool: BackendPool, broadcast: bool = False):
+        self.pool = pool
+        self.broadcast = broadcast
+
+    async def chat(self, **kwargs: Any):
+        if self.broadcast:
+            return await self.pool.abroadcast(**kwargs)
+        return await self.pool.achat(**kwargs)
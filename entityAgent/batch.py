@@ -0,0 +1,214 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Set
+
+from entityAgent.agent import Agent
+from entityAgent.backends import AsyncPoolClient, BackendPool
+from entityAgent.command_cache import command_cache_from_config
+from entityAgent.llm import AsyncCachingClient, close_client, make_async_client
+from entityAgent.ollama_utils import ensure_ollama_ready, ensure_python_package
+from entityAgent.platform_interaction import get_operating_system
+from entityAgent.prompt import PrefixCacheStats, context_from_config
+from entityAgent.tools import ToolRegistry, default_registry
+from entityAgent.warmup import warm_up_async
+
+
+def load_tasks(path: str) -> List[dict]:
+    """
+    Read a JSONL task file. Each line is an object with a `prompt` and an
+    optional `id` (default: the line number), or just a JSON string prompt.
+    """
+    tasks = []
+    with open(os.path.expanduser(path)) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if isinstance(entry, str):
+                entry = {'prompt': entry}
+            if not isinstance(entry, dict) or 'prompt' not in entry:
+                raise ValueError(f"{path}:{number}: expected an object with a 'prompt'")
+            tasks.append({**entry, 'id': str(entry.get('id', number))})
+    return tasks
+
+
+def completed_ids(path: str) -> Set[str]:
+    """IDs that already have a successful result in the output file at `path`."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue  # A line cut short when the previous run was interrupted
+            if 'error' not in result:
+                done.add(str(result['id']))
+    return done
+
+
+def drop_partial_line(path: str) -> None:
+    """Cut a last line left unterminated by an interrupted run, so the next result starts on its own line."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - 4096)
+            f.seek(start)
+            chunk = f.read(position - start)
+            if position == end and chunk.endswith(b"\n"):
+                return
+            newline = chunk.rfind(b"\n")
+            if newline >= 0:
+                f.truncate(start + newline + 1)
+                return
+            position = start
+        f.truncate(0)
+
+
+def default_output_path(tasks_path: str) -> str:
+    root, _ = os.path.splitext(tasks_path)
+    return f"{root}.results.jsonl"
+
+
+@dataclass
+class BatchStats:
+    total: int = 0
+    skipped: int = 0
+    completed: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+
+    def percentile(self, fraction: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def summary(self) -> str:
+        rate = (self.completed + self.failed) / self.seconds if self.seconds else 0.0
+        return (
+            f"{self.completed} completed, {self.failed} failed, {self.skipped} skipped of {self.total} tasks "
+            f"in {self.seconds:.1f}s ({rate:.2f} tasks/s; latency p50 {self.percentile(0.5):.1f}s, "
+            f"p95 {self.percentile(0.95):.1f}s)"
+        )
+
+
+class BatchRunner:
+    """
+    Runs independent tasks through the agent, `workers` at a time on one
+    event loop. Every task gets a fresh conversation; results are appended
+    to the output file as each task finishes, so an interrupted run can be
+    resumed and only the tasks without a successful result run again.
+    """
+
+    def __init__(self, client: Any, config, workers: int = 4, tools: Optional[ToolRegistry] = None,
+                 executor: Optional[ThreadPoolExecutor] = None, os_name: Optional[str] = None):
+        self.client = client
+        self.config = config
+        self.workers = max(1, workers)
+        self.tools = tools if tools is not None else default_registry(config, cache=command_cache_from_config(config))
+        self.executor = executor
+        self.os_name = os_name or get_operating_system()
+        # Cleared for every later task once one finds the model lacks tool calling.
+        self.native_tools = config.native_tools
+        self.prefix_cache = PrefixCacheStats()
+
+    async def run(self, tasks: List[dict], output_path: str) -> BatchStats:
+        done = completed_ids(output_path)
+        pending = [task for task in tasks if task['id'] not in done]
+        stats = BatchStats(total=len(tasks), skipped=len(tasks) - len(pending))
+        queue: asyncio.Queue = asyncio.Queue()
+        for task in pending:
+            queue.put_nowait(task)
+
+        started = time.monotonic()
+        drop_partial_line(output_path)
+        with open(output_path, 'a') as output:
+            async def worker():
+                while not queue.empty():
+                    result = await self.run_task(queue.get_nowait())
+                    # Each result is on disk before the next task starts
+                    output.write(json.dumps(result) + "\n")
+                    output.flush()
+                    if 'error' in result:
+                        stats.failed += 1
+                        print(f"[WARN] Task {result['id']} failed: {result['error']}")
+                    else:
+                        stats.completed += 1
+                        stats.latencies.append(result['seconds'])
+                    finished = stats.completed + stats.failed
+                    print(f"[INFO] {finished}/{len(pending)} tasks done "
+                          f"({finished / max(time.monotonic() - started, 1e-6):.2f} tasks/s)", flush=True)
+
+            await asyncio.gather(*(worker() for _ in range(min(self.workers, len(pending)))))
+        stats.seconds = time.monotonic() - started
+        return stats
+
+    async def run_task(self, task: dict) -> dict:
+        """One task's result: its `response`, or the `error` that stopped it."""
+        tool_calls = []
+        agent = Agent(
+            self.client, self.config.model,
+            context_from_config(self.config, self.os_name, self.native_tools),
+            tools=self.tools, native_tools=self.native_tools, os_name=self.os_name, executor=self.executor,
+            hooks=[lambda event, data: tool_calls.append(data['name']) if event == 'tool_call' else None,
+                   self.prefix_cache.hook],
+        )
+        started = time.monotonic()
+        try:
+            response = await agent.run(task['prompt'])
+            result = {'id': task['id'], 'response': response}
+        except Exception as e:
+            result = {'id': task['id'], 'error': str(e)}
+        if not agent.native_tools:
+            self.native_tools = False
+        result.update(seconds=round(time.monotonic() - started, 3), tool_calls=tool_calls)
+        return result
+
+
+def run_batch(config, tasks_path: str, output_path: Optional[str] = None, workers: int = 4) -> BatchStats:
+    """Run the task file at `tasks_path` against the configured model (the `--batch` CLI mode)."""
+    tasks = load_tasks(tasks_path)
+    output_path = output_path or default_output_path(tasks_path)
+    pool = BackendPool.from_config(config)
+    if pool:
+        ensure_python_package("ollama")
+    else:
+        ensure_ollama_ready(config.model)
+
+    async def main():
+        if pool:
+            pool.start()
+            client, load_client = AsyncPoolClient(pool), AsyncPoolClient(pool, broadcast=True)
+        else:
+            client = load_client = make_async_client(config)
+        executor = ThreadPoolExecutor(max_workers=config.tool_workers, thread_name_prefix="entity-tool")
+        try:
+            if config.model_warmup:
+                await warm_up_async(load_client, config.model, config.keep_alive)
+            runner = BatchRunner(AsyncCachingClient.from_config(client, config), config,
+                                 workers=workers, executor=executor)
+            stats = await runner.run(tasks, output_path)
+            if runner.prefix_cache.requests:
+                print(f"[INFO] {runner.prefix_cache.summary()}")
+            return stats
+        finally:
+            executor.shutdown(wait=False)
+            if pool:
+                await pool.aclose()
+            else:
+                await close_client(client)
+
+    print(f"[INFO] Running {len(tasks)} tasks from {tasks_path} with {workers} workers; results go to {output_path}")
+    stats = asyncio.run(main())
+    print(f"[INFO] {stats.summary()}")
+    return stats
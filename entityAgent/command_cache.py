@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from entityAgent.llm_cache import ResponseCache
+from entityAgent.platform_interaction import is_read_only_command
+
+# Seconds a successful result stays valid, per program. Facts that cannot
+# change while the machine is up are kept for a day; live readings only
+# long enough to absorb the repeats within one task. Programs that read
+# files or print their arguments (`cat`, `ls`, `echo`) and other read-only
+# programs missing here (e.g. `ps`) are never cached unless `ttls` adds them.
+DEFAULT_COMMAND_TTLS = {
+    'uname': 86400, 'lscpu': 86400, 'nproc': 86400, 'whoami': 86400,
+    'id': 3600, 'which': 3600, 'lsblk': 300,
+    'df': 30, 'free': 5, 'uptime': 5,
+}
+# Environment variables that can change what a read-only command prints.
+KEY_ENV_VARS = ('PATH', 'HOME', 'USER', 'LANG', 'LC_ALL', 'LC_MESSAGES', 'TZ')
+
+# (stdout, stderr, return_code), as returned by execute_command.
+CommandResult = Tuple[str, str, int]
+
+
+def command_ttl(command: str, ttls: Dict[str, float]) -> float:
+    """
+    Seconds `command`'s result may be reused: the shortest TTL of the
+    programs in its pipeline, or 0 if it is not read-only or any of them
+    has no TTL.
+    """
+    if not is_read_only_command(command):
+        return 0
+    programs = [os.path.basename(segment.split()[0]) for segment in command.split('|')]
+    return min(ttls.get(program, 0) for program in programs)
+
+
+def command_cache_from_config(config) -> Optional["CommandCache"]:
+    if not config.command_cache:
+        return None
+    return CommandCache(ttls=config.command_cache_ttls, db_path=config.command_cache_db)
+
+
+class CommandCache:
+    """
+    Reuses results of side-effect-free shell commands the agent repeats.
+
+    Results are keyed by the command, the working directory and the
+    environment variables in KEY_ENV_VARS, and kept for the command's TTL
+    (see DEFAULT_COMMAND_TTLS, extended or overridden by `ttls`; 0 turns a
+    program off). Only commands that exit with status 0 are stored, and
+    every result is dropped once a command that is not read-only runs. With
+    `db_path` the results survive restarts.
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, max_entries: int = 256,
+                 db_path: Optional[str] = None):
+        self.ttls = {**DEFAULT_COMMAND_TTLS, **(ttls or {})}
+        self.cache = ResponseCache(max_entries=max_entries, ttl=max(self.ttls.values(), default=0), db_path=db_path)
+
+    def get(self, command: str) -> Optional[Tuple[CommandResult, float]]:
+        """A still-valid result for `command` and its age in seconds, or None."""
+        if not command_ttl(command, self.ttls):
+            return None
+        entry = self.cache.get(self._key(command))
+        if entry is None or entry['expires'] <= time.time():
+            return None
+        return (entry['stdout'], entry['stderr'], entry['return_code']), time.time() - entry['created']
+
+    def put(self, command: str, result: CommandResult) -> None:
+        ttl = command_ttl(command, self.ttls)
+        stdout, stderr, return_code = result
+        if not ttl or return_code != 0:
+            return
+        now = time.time()
+        self.cache.put(self._key(command), {
+            'stdout': stdout, 'stderr': stderr, 'return_code': return_code, 'created': now, 'expires': now + ttl,
+        })
+
+    def run(self, command: str, runner: Callable[[str], CommandResult],
+            fresh: bool = False) -> Tuple[CommandResult, Optional[float]]:
+        """
+        `runner(command)`, or the cached result when there is one and
+        `fresh` is not set. Returns the result and, if it came from the
+        cache, its age in seconds.
+        """
+        if not fresh:
+            hit = self.get(command)
+            if hit is not None:
+                return hit
+        result = runner(command)
+        self.put(command, result)
+        self.invalidate(command)
+        return result, None
+
+    def invalidate(self, command: str) -> None:
+        """Drop every cached result if `command` may have changed what they report."""
+        if not is_read_only_command(command):
+            self.cache.clear()
+
+    @staticmethod
+    def _key(command: str) -> str:
+        payload = json.dumps({
+            'command': command.strip(),
+            'cwd': os.getcwd(),
+            'env': {name: os.environ.get(name) for name in KEY_ENV_VARS},
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
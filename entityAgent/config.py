@@ -1,19 +1,148 @@
 import os
 import yaml
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional, Union
 
 @dataclass
 class Config:
     model: str = "llama3"
     server_url: Optional[str] = None
+    # Several Ollama servers to balance chat requests across, as URLs or
+    # {url, weight} entries (None = just `server_url`). A backend is skipped
+    # for `backend_cooldown` seconds after `backend_failure_threshold`
+    # consecutive errors or a failed health check; a failed request is
+    # retried on up to `backend_retries` other backends.
+    backends: Optional[List[Union[str, dict]]] = None
+    backend_failure_threshold: int = 3
+    backend_cooldown: float = 30.0
+    backend_retries: int = 1
+    backend_health_interval: Optional[float] = 10.0
+    # Maximum number of blocking jobs (shell commands, process scans) the
+    # web server runs at once.
+    max_concurrency: int = 4
+    # Web chat admission: chat requests run at once per model (overridable
+    # per model name), requests allowed to wait per model and per client.
+    # Beyond those limits requests are refused with 503 or 429.
+    chat_concurrency: int = 2
+    model_concurrency: Optional[Dict[str, int]] = None
+    chat_queue_size: int = 64
+    chat_queue_per_client: int = 4
+    # Chat sessions (web and CLI): idle seconds before one leaves memory, how
+    # many are kept in memory, and an optional SQLite log that persists them
+    # for `session_retention` seconds after their last message. A session
+    # reloaded from the log holds only its last `session_load_messages`.
+    session_ttl: int = 3600
+    max_sessions: int = 256
+    session_db: Optional[str] = None
+    session_retention: float = 30 * 86400
+    session_load_messages: Optional[int] = 200
+    # Prompt budget per conversation: estimated tokens sent per turn, recent
+    # messages never dropped, the size at which tool output is elided, and
+    # the page size in which old turns are dropped when over budget (larger
+    # pages keep the prompt prefix cacheable for more turns; None = drop
+    # only what is needed).
+    context_max_tokens: int = 4096
+    context_keep_recent: int = 6
+    max_tool_output_chars: int = 4000
+    context_page_tokens: Optional[int] = 1024
+    # Estimated tokens of one tool result sent to the model; whole lines from
+    # its head and tail are kept (None = no limit besides the one above).
+    max_tool_output_tokens: Optional[int] = 800
+    # Shell commands: seconds before a command is killed (None = no limit) and
+    # bytes of stdout/stderr retained per stream (head and tail are kept).
+    command_timeout: Optional[float] = None
+    max_command_output_bytes: int = 1_000_000
+    # Timeout used instead of a missing `command_timeout` for commands nobody
+    # can interrupt with Ctrl+C: web requests, batch tasks and tool calls run
+    # on worker threads (None = no limit).
+    unattended_command_timeout: Optional[float] = 300
+    # Per-command rlimits, applied on Linux only: CPU seconds and memory (MB).
+    command_cpu_limit: Optional[int] = None
+    command_memory_limit_mb: Optional[int] = None
+
+    # Offer commands, process listing and file access to the model through
+    # Ollama's native tool calling (models without it fall back to "run:").
+    native_tools: bool = True
+    # Worker threads for read-only tool calls the model requests together.
+    tool_workers: int = 4
+    # Opt-in reuse of results of read-only commands the model repeats, for a
+    # TTL per program (`command_cache_ttls` overrides the defaults; 0 = never
+    # cache it), optionally persisted to a SQLite file across sessions.
+    command_cache: bool = False
+    command_cache_ttls: Optional[Dict[str, float]] = None
+    command_cache_db: Optional[str] = None
+
+    # Default number of processes `run: list_processes` returns.
+    process_list_limit: Optional[int] = 50
+    # Seconds between background process-table scans served by /api/processes.
+    process_sample_interval: float = 2.0
+
+    # HTTP connections to Ollama: seconds allowed to connect and to wait for
+    # each part of a reply (None = no limit), the connection-pool size, and
+    # how long idle connections stay open for reuse.
+    llm_connect_timeout: float = 5.0
+    llm_read_timeout: Optional[float] = 300.0
+    llm_max_connections: int = 32
+    llm_max_keepalive_connections: int = 16
+    llm_keepalive_expiry: float = 60.0
+
+    # Generation temperature sent to Ollama (None = model default).
+    llm_temperature: Optional[float] = None
+    # Opt-in response cache: entries kept in memory, seconds before expiry,
+    # optional SQLite file, and whether to cache replies at temperature > 0.
+    llm_cache: bool = False
+    llm_cache_size: int = 512
+    llm_cache_ttl: Optional[float] = 86400
+    llm_cache_db: Optional[str] = None
+    llm_cache_nondeterministic: bool = False
+
+    # Model residency: how long Ollama keeps the model loaded after a request
+    # ("30m", -1 = forever, None = server default), whether to load it at
+    # startup, and seconds between keep-alive pings while in use (None = off),
+    # which stop after `model_idle_timeout` seconds without requests.
+    keep_alive: Optional[Union[str, float]] = None
+    model_warmup: bool = True
+    model_heartbeat_interval: Optional[float] = 240
+    model_idle_timeout: float = 1800
+
+    def llm_options(self) -> dict:
+        """Generation options passed to every Ollama chat request."""
+        options = {}
+        if self.llm_temperature is not None:
+            options["temperature"] = self.llm_temperature
+        return options
+
+    def session_store_options(self) -> dict:
+        """Keyword arguments for SessionStore from this config."""
+        return {
+            "max_sessions": self.max_sessions,
+            "ttl": self.session_ttl,
+            "db_path": self.session_db,
+            "retention": self.session_retention,
+            "load_limit": self.session_load_messages,
+        }
+
+    def command_limits(self, unattended: bool = False) -> dict:
+        """
+        Keyword arguments for CommandStream/execute_command from this config;
+        `unattended` commands fall back to `unattended_command_timeout`.
+        """
+        timeout = self.command_timeout
+        if timeout is None and unattended:
+            timeout = self.unattended_command_timeout
+        return {
+            "timeout": timeout,
+            "max_output_bytes": self.max_command_output_bytes,
+            "cpu_limit": self.command_cpu_limit,
+            "memory_limit": self.command_memory_limit_mb * 1024 * 1024 if self.command_memory_limit_mb else None,
+        }
 
 def load_config() -> Config:
     """
     Load configuration from config.yaml or environment variables.
     Priority:
-    1. Environment Variables (ENTITY_LLM_MODEL, ENTITY_OLLAMA_URL)
+    1. Environment Variables (ENTITY_LLM_MODEL, ENTITY_OLLAMA_URL, ENTITY_MAX_CONCURRENCY)
     2. config.yaml in current directory
     3. config.yaml in ~/.entity/config.yaml
     4. Defaults
@@ -32,10 +161,9 @@ def load_config() -> Config:
                 with open(path, "r") as f:
                     data = yaml.safe_load(f)
                     if data:
-                        if "model" in data:
-                            config.model = data["model"]
-                        if "server_url" in data:
-                            config.server_url = data["server_url"]
+                        for field in fields(Config):
+                            if field.name in data:
+                                setattr(config, field.name, data[field.name])
             except Exception as e:
                 print(f"[WARN] Failed to load config from {path}: {e}")
 
@@ -48,4 +176,21 @@ def load_config() -> Config:
     if env_url:
         config.server_url = env_url
 
+    env_concurrency = os.environ.get("ENTITY_MAX_CONCURRENCY")
+    if env_concurrency:
+        config.max_concurrency = _at_least_one(env_concurrency, "ENTITY_MAX_CONCURRENCY")
+    else:
+        config.max_concurrency = _at_least_one(config.max_concurrency, "max_concurrency")
+
     return config
+
+
+def _at_least_one(value, name: str) -> int:
+    """`value` as a whole number of at least 1; anything else is an error naming `name`."""
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = None
+    if number is None or number < 1 or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"{name} must be a whole number of at least 1, got {value!r}")
+    return number
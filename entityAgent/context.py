@@ -0,0 +1,156 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+# Rough average for English text and shell output; good enough to budget
+# against the model's context window without a tokenizer dependency.
+CHARS_PER_TOKEN = 4
+# Per-message overhead for role markers and separators in the chat template.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def message_tokens(message: dict) -> int:
+    return estimate_tokens(message.get('content') or '') + MESSAGE_OVERHEAD_TOKENS
+
+
+def elide(text: str, max_chars: int) -> str:
+    """
+    Keep the head and tail of `text` and replace the middle with a marker
+    when it is longer than `max_chars`.
+    """
+    if len(text) <= max_chars:
+        return text
+    head = max_chars * 2 // 3
+    tail = max_chars - head
+    omitted = len(text) - head - tail
+    return f"{text[:head]}\n… [{omitted} characters elided] …\n{text[-tail:] if tail else ''}"
+
+
+class ContextWindow:
+    """
+    Message list for one conversation, kept inside a token budget.
+
+    The system prompt and the most recent `keep_recent` messages are always
+    sent. Tool output is elided to `max_tool_output_chars` as it is added.
+    When the estimated size exceeds `max_tokens`, the oldest turns are dropped
+    from the prompt right away and, if a `summarize` callable is given, folded
+    into a running summary computed on a background thread; the summary is
+    picked up by the next `prepare()` call so no turn waits on it.
+
+    Earlier messages are never rewritten otherwise, so Ollama can reuse the
+    cached prompt up to the newest message. With `page_tokens`, turns are
+    dropped up to the next multiple of `page_tokens` counted from the start
+    of the conversation, instead of just enough to fit: the following turns
+    only append until the window is full again, and a window rebuilt from
+    the same history cuts it at the same place.
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        max_tokens: int = 4096,
+        keep_recent: int = 6,
+        max_tool_output_chars: int = 4000,
+        summarize: Optional[Callable[[List[dict]], str]] = None,
+        page_tokens: Optional[int] = None,
+    ):
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.max_tool_output_chars = max_tool_output_chars
+        self.summarize = summarize
+        self.page_tokens = page_tokens
+        # Estimated tokens of all messages dropped so far
+        self._dropped_tokens = 0
+        self.messages: List[dict] = [{'role': 'system', 'content': system_prompt}]
+        self._summary_message: Optional[dict] = None
+        self._summary = ''
+        self._summary_ready = False
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    # ── Public API ───────────────────────────────────────────────────────────
+    def append(self, message: dict) -> None:
+        self.messages.append(message)
+
+    def append_tool_output(self, content: str, role: str = 'system', **fields) -> None:
+        """
+        Append command/tool output, eliding the middle of oversized results.
+        Extra `fields` (such as `tool_name`) are added to the message.
+        """
+        self.append({'role': role, 'content': elide(content, self.max_tool_output_chars), **fields})
+
+    def token_count(self) -> int:
+        return sum(message_tokens(m) for m in self.messages)
+
+    def prepare(self) -> List[dict]:
+        """
+        Bring the window within budget and return the message list to send.
+        The same list object is returned every time.
+        """
+        with self._lock:
+            if self._summary_ready and self._summary_message is not None:
+                self._summary_message['content'] = SUMMARY_PREFIX + self._summary
+                self._summary_ready = False
+        if self.token_count() > self.max_tokens:
+            dropped = self._drop_oldest()
+            if dropped and self.summarize:
+                self._schedule_summary(dropped)
+        return self.messages
+
+    def wait_for_summary(self) -> None:
+        """Block until queued summaries are finished (used by tests and shutdown)."""
+        if self._executor:
+            self._executor.submit(lambda: None).result()
+
+    def close(self) -> None:
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+    # ── Internals ────────────────────────────────────────────────────────────
+    def _drop_oldest(self) -> List[dict]:
+        first = 2 if self._summary_message is not None else 1
+        dropped = []
+
+        def drop():
+            dropped.append(self.messages.pop(first))
+            self._dropped_tokens += message_tokens(dropped[-1])
+
+        while (
+            self.token_count() > self.max_tokens
+            and len(self.messages) - first > self.keep_recent
+        ):
+            drop()
+        if dropped and self.page_tokens:
+            boundary = -(-self._dropped_tokens // self.page_tokens) * self.page_tokens
+            while self._dropped_tokens < boundary and len(self.messages) - first > self.keep_recent:
+                drop()
+        return dropped
+
+    def _schedule_summary(self, dropped: List[dict]) -> None:
+        if self._summary_message is None:
+            self._summary_message = {'role': 'system', 'content': SUMMARY_PREFIX + "(pending)"}
+            self.messages.insert(1, self._summary_message)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="entity-summary")
+        # A single worker runs jobs in order, so each one extends the summary
+        # produced by the previous job.
+        self._executor.submit(self._run_summary, dropped)
+
+    def _run_summary(self, dropped: List[dict]) -> None:
+        with self._lock:
+            previous = self._summary
+        prior = [{'role': 'system', 'content': SUMMARY_PREFIX + previous}] if previous else []
+        try:
+            summary = self.summarize(prior + dropped)
+        except Exception as e:
+            print(f"[WARN] Failed to summarize conversation: {e}")
+            return
+        with self._lock:
+            self._summary = summary
+            self._summary_ready = True
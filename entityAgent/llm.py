@@ -0,0 +1,192 @@
+import asyncio
+import functools
+from typing import Any, Iterable, Optional
+
+from entityAgent.llm_cache import ResponseCache, cache_key
+
+# Request parameters that do not change the generated reply.
+UNCACHED_PARAMS = {"keep_alive"}
+
+
+def response_to_dict(response: Any) -> dict:
+    """Plain-dict copy of an ollama ChatResponse (or a dict already)."""
+    if hasattr(response, "model_dump"):
+        return response.model_dump(exclude_none=True)
+    return dict(response)
+
+
+def merge_chunks(chunks: Iterable[Any]) -> dict:
+    """Collapse streamed chat chunks into the equivalent non-streamed response."""
+    chunks = [response_to_dict(chunk) for chunk in chunks]
+    merged = dict(chunks[-1])
+    message = dict(merged.get("message") or {"role": "assistant"})
+    message["content"] = "".join(chunk.get("message", {}).get("content") or "" for chunk in chunks)
+    tool_calls = [call for chunk in chunks for call in chunk.get("message", {}).get("tool_calls") or []]
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+    merged["message"] = message
+    return merged
+
+
+def client_options(config) -> dict:
+    """httpx timeouts and connection limits for ollama clients, from config."""
+    import httpx
+
+    return {
+        "timeout": httpx.Timeout(
+            connect=config.llm_connect_timeout,
+            read=config.llm_read_timeout,
+            write=config.llm_read_timeout,
+            pool=config.llm_read_timeout,
+        ),
+        "limits": httpx.Limits(
+            max_connections=config.llm_max_connections,
+            max_keepalive_connections=config.llm_max_keepalive_connections,
+            keepalive_expiry=config.llm_keepalive_expiry,
+        ),
+    }
+
+
+def make_client(config, host: Optional[str] = None):
+    """An `ollama.Client` reusing pooled keep-alive connections to `host`."""
+    import ollama
+
+    return ollama.Client(host=host or config.server_url, **client_options(config))
+
+
+def make_async_client(config, host: Optional[str] = None):
+    """`make_client` for `ollama.AsyncClient`; create it on the loop that uses it."""
+    import ollama
+
+    return ollama.AsyncClient(host=host or config.server_url, **client_options(config))
+
+
+def close_client(client: Any):
+    """Close an ollama client's connections; await the result for an AsyncClient."""
+    if hasattr(client, "close"):
+        return client.close()
+    # Older ollama releases only expose the underlying httpx client
+    inner = client._client
+    return getattr(inner, "aclose", inner.close)()
+
+
+def response_cache_from_config(config) -> Optional[ResponseCache]:
+    if not config.llm_cache:
+        return None
+    return ResponseCache(
+        max_entries=config.llm_cache_size,
+        ttl=config.llm_cache_ttl,
+        db_path=config.llm_cache_db,
+    )
+
+
+class CachingClient:
+    """
+    Wraps an ollama client (or the `ollama` module itself) with the same
+    `chat` signature, adding default generation `options` and serving
+    repeated requests from a ResponseCache.
+
+    Only deterministic requests (temperature 0) are cached unless
+    `cache_nondeterministic` is set; everything else goes straight through.
+    A configured `keep_alive` is sent with every request.
+    """
+
+    def __init__(self, client: Any, cache: Optional[ResponseCache] = None,
+                 options: Optional[dict] = None, cache_nondeterministic: bool = False,
+                 keep_alive: Any = None):
+        self.client = client
+        self.cache = cache
+        self.options = options or {}
+        self.cache_nondeterministic = cache_nondeterministic
+        self.keep_alive = keep_alive
+
+    @classmethod
+    def from_config(cls, client: Any, config) -> "CachingClient":
+        return cls(
+            client,
+            cache=response_cache_from_config(config),
+            options=config.llm_options(),
+            cache_nondeterministic=config.llm_cache_nondeterministic,
+            keep_alive=config.keep_alive,
+        )
+
+    def chat(self, model: str, messages: list, stream: bool = False, options: Optional[dict] = None, **params: Any):
+        options, params = self._options(options), self._params(params)
+        key = self._key(model, messages, options, params)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return iter([cached]) if stream else cached
+
+        response = self.client.chat(model=model, messages=messages, stream=stream, options=options, **params)
+        if key is None:
+            return response
+        if stream:
+            return self._cache_stream(key, response)
+        self.cache.put(key, response_to_dict(response))
+        return response
+
+    def _options(self, options: Optional[dict]) -> Optional[dict]:
+        merged = {**self.options, **(options or {})}
+        return merged or None
+
+    def _params(self, params: dict) -> dict:
+        if self.keep_alive is not None:
+            params.setdefault("keep_alive", self.keep_alive)
+        return params
+
+    def _key(self, model: str, messages: list, options: Optional[dict], params: dict) -> Optional[str]:
+        if self.cache is None:
+            return None
+        if not self.cache_nondeterministic and (options or {}).get("temperature") != 0:
+            return None
+        params = {name: value for name, value in params.items() if name not in UNCACHED_PARAMS}
+        return cache_key(model, messages, options, **params)
+
+    def _cache_stream(self, key: str, chunks):
+        seen = []
+        for chunk in chunks:
+            seen.append(chunk)
+            yield chunk
+        if seen:
+            self.cache.put(key, merge_chunks(seen))
+
+
+class AsyncCachingClient(CachingClient):
+    """
+    CachingClient for `ollama.AsyncClient`; `chat` is a coroutine. Lookups
+    in a cache backed by SQLite run on the loop's default thread pool.
+    """
+
+    async def chat(self, model: str, messages: list, stream: bool = False, options: Optional[dict] = None, **params: Any):
+        options, params = self._options(options), self._params(params)
+        key = self._key(model, messages, options, params)
+        if key is not None:
+            cached = await self._off_loop(self.cache.get, key)
+            if cached is not None:
+                return _replay(cached) if stream else cached
+
+        response = await self.client.chat(model=model, messages=messages, stream=stream, options=options, **params)
+        if key is None:
+            return response
+        if stream:
+            return self._cache_stream_async(key, response)
+        await self._off_loop(self.cache.put, key, response_to_dict(response))
+        return response
+
+    async def _cache_stream_async(self, key: str, chunks):
+        seen = []
+        async for chunk in chunks:
+            seen.append(chunk)
+            yield chunk
+        if seen:
+            await self._off_loop(self.cache.put, key, merge_chunks(seen))
+
+    async def _off_loop(self, function, *args):
+        if not self.cache.persistent:
+            return function(*args)  # Memory only: cheaper than a thread hop
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(function, *args))
+
+
+async def _replay(response: dict):
+    yield response
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+
+def _jsonable(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump(exclude_none=True)
+    return str(value)
+
+
+def cache_key(model: str, messages: list, options: Optional[dict] = None, **params: Any) -> str:
+    """
+    Stable hash of everything that determines a reply: the model name, the
+    messages, generation options and any other request parameters (tools,
+    format, ...).
+    """
+    payload = json.dumps(
+        {"model": model, "messages": messages, "options": options or {}, "params": params},
+        sort_keys=True, default=_jsonable, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-level cache of chat responses: an in-memory LRU of `max_entries`
+    in front of an optional SQLite file holding up to `max_db_entries`.
+    Entries older than `ttl` seconds are treated as misses.
+    """
+
+    # Trim the SQLite table back to size after this many inserts.
+    DB_TRIM_EVERY = 64
+
+    def __init__(self, max_entries: int = 512, ttl: Optional[float] = None,
+                 db_path: Optional[str] = None, max_db_entries: int = 10_000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_db_entries = max_db_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self._db = None
+        if db_path:
+            db_path = os.path.expanduser(db_path)
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @property
+    def persistent(self) -> bool:
+        """Whether entries are also kept in SQLite, so lookups may do disk I/O."""
+        return self._db is not None
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and self._fresh(entry[0]):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._memory.pop(key, None)
+
+            if self._db:
+                row = self._db.execute(
+                    "SELECT response, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row and self._fresh(row[1]):
+                    response = json.loads(row[0])
+                    self._remember(key, row[1], response)
+                    self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    self.hits += 1
+                    return response
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, response: dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, response)
+            if self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(response, default=_jsonable), now, now),
+                )
+                self._inserts += 1
+                if self._inserts % self.DB_TRIM_EVERY == 0:
+                    self._trim_db()
+                self._db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def _fresh(self, created: float) -> bool:
+        return self.ttl is None or time.time() - created <= self.ttl
+
+    def _remember(self, key: str, created: float, response: dict) -> None:
+        self._memory[key] = (created, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _trim_db(self) -> None:
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        self._db.execute(
+            "DELETE FROM responses WHERE key NOT IN "
+            "(SELECT key FROM responses ORDER BY accessed DESC LIMIT ?)",
+            (self.max_db_entries,),
+        )
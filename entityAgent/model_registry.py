@@ -0,0 +1,115 @@
+import json
+import sys
+import urllib.error
+import urllib.request
+from typing import Callable, Iterator, List, Optional
+
+DEFAULT_REGISTRY_PREFIX = "registry.ollama.ai/library/"
+
+
+class ModelRegistryError(RuntimeError):
+    """Raised when the Ollama API rejects a model request."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+def normalize_model_name(name: str) -> str:
+    """
+    Canonical form of a model reference: `llama3` and
+    `registry.ollama.ai/library/llama3` both become `llama3:latest`.
+    """
+    if name.startswith(DEFAULT_REGISTRY_PREFIX):
+        name = name[len(DEFAULT_REGISTRY_PREFIX):]
+    if ":" not in name.rsplit("/", 1)[-1]:
+        name = f"{name}:latest"
+    return name
+
+
+def print_pull_progress(update: dict) -> None:
+    """Default `pull` progress callback: one rewritten line per layer."""
+    status = update.get("status", "")
+    total, completed = update.get("total"), update.get("completed")
+    if total and completed is not None:
+        sys.stdout.write(f"\r[INFO] {status}: {completed * 100 // total}% of {total / 1e6:.0f} MB")
+    else:
+        sys.stdout.write(f"\n[INFO] {status}")
+    if status == "success":
+        sys.stdout.write("\n")
+    sys.stdout.flush()
+
+
+class ModelRegistry:
+    """
+    Reads and changes the models installed on an Ollama server through its
+    HTTP API (`/api/tags`, `/api/show`, `/api/pull`), without the CLI.
+    """
+
+    def __init__(self, host: str, timeout: float = 10.0):
+        self.host = host.rstrip("/")
+        self.timeout = timeout
+
+    # ── Queries ──────────────────────────────────────────────────────────────
+    def list(self) -> List[dict]:
+        """Installed models as returned by `/api/tags`."""
+        return self._request("/api/tags").get("models", [])
+
+    def find(self, model: str) -> Optional[dict]:
+        """
+        The installed model whose name (tag included) or digest matches
+        `model` exactly, or None. A bare name means its `latest` tag, so
+        `llama3` never matches `llama3.1`.
+        """
+        wanted = normalize_model_name(model)
+        for entry in self.list():
+            name = normalize_model_name(entry.get("model") or entry.get("name", ""))
+            if name == wanted or entry.get("digest") == model:
+                return entry
+        return None
+
+    def show(self, model: str) -> Optional[dict]:
+        """Details of an installed model from `/api/show`, or None if it is missing."""
+        try:
+            return self._request("/api/show", {"model": model})
+        except ModelRegistryError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    # ── Changes ──────────────────────────────────────────────────────────────
+    def pull(self, model: str, progress: Optional[Callable[[dict], None]] = print_pull_progress) -> None:
+        """Download `model`, passing each streamed status update to `progress`."""
+        for update in self._stream("/api/pull", {"model": model}):
+            if "error" in update:
+                raise ModelRegistryError(f"Pulling '{model}' failed: {update['error']}")
+            if progress is not None:
+                progress(update)
+
+    # ── HTTP ─────────────────────────────────────────────────────────────────
+    def _open(self, path: str, body: Optional[dict] = None, timeout: Optional[float] = None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(
+            f"{self.host}{path}", data=data, headers={"Content-Type": "application/json"}
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=timeout or self.timeout)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("error", e.reason)
+            except ValueError:
+                message = e.reason
+            raise ModelRegistryError(f"{path}: {message}", status=e.code) from e
+        except urllib.error.URLError as e:
+            raise ModelRegistryError(f"Cannot reach Ollama at {self.host}: {e.reason}") from e
+
+    def _request(self, path: str, body: Optional[dict] = None) -> dict:
+        with self._open(path, body) as response:
+            return json.loads(response.read())
+
+    def _stream(self, path: str, body: dict) -> Iterator[dict]:
+        # Downloads can stall between updates for a while; allow a generous read timeout.
+        with self._open(path, {**body, "stream": True}, timeout=max(self.timeout, 300)) as response:
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
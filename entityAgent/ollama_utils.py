@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import atexit
+import json
 import os
 import pathlib
 import platform
@@ -11,7 +13,11 @@ import tempfile
 import time
 import urllib.request
 from dataclasses import dataclass
-from typing import Final
+from typing import Callable, Final, Optional
+
+from entityAgent.model_registry import ModelRegistry, ModelRegistryError
+
+DEFAULT_OLLAMA_HOST: Final[str] = "http://127.0.0.1:11434"
 
 
 class OllamaSetupError(RuntimeError):
@@ -31,6 +37,64 @@ def _run(cmd: list[str], *, check: bool = True) -> subprocess.CompletedProcess[s
     return result
 
 
+# ──────────────────────────────────────────────────────────────────────────────
+# 0. Readiness probes
+# ──────────────────────────────────────────────────────────────────────────────
+def wait_until(
+    probe: Callable[[], bool],
+    timeout: float = 30.0,
+    *,
+    initial_delay: float = 0.05,
+    max_delay: float = 1.0,
+    abort: Optional[Callable[[], bool]] = None,
+) -> bool:
+    """
+    Call `probe` until it returns True, doubling the delay between attempts
+    from `initial_delay` up to `max_delay`. Returns False once `timeout`
+    seconds have passed or as soon as `abort` returns True.
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        if probe():
+            return True
+        if abort is not None and abort():
+            return False
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+
+def ollama_host() -> str:
+    """Base URL of the Ollama server, from OLLAMA_HOST if set."""
+    host = os.environ.get("OLLAMA_HOST") or DEFAULT_OLLAMA_HOST
+    if "://" not in host:
+        host = f"http://{host}"
+    return host.rstrip("/")
+
+
+def ollama_is_up(host: Optional[str] = None, timeout: float = 1.0) -> bool:
+    """True if the Ollama HTTP API at `host` answers `/api/version`."""
+    try:
+        with urllib.request.urlopen(f"{host or ollama_host()}/api/version", timeout=timeout) as response:
+            return response.status == 200
+    except Exception:
+        return False
+
+
+def port_is_open(host: str, port: int, timeout: float = 0.5) -> bool:
+    """True if something accepts TCP connections on `host:port`."""
+    import socket
+
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # 1. Python package handling
 # ──────────────────────────────────────────────────────────────────────────────
@@ -56,18 +120,42 @@ class OllamaCLI:
 
     model: str = os.environ.get("ENTITY_LLM_MODEL", "llama3")
     linux_url: str = os.environ.get("OLLAMA_LINUX_URL", "https://ollama.com/download/ollama-linux-amd64.tar.gz")
+    startup_timeout: float = float(os.environ.get("ENTITY_OLLAMA_STARTUP_TIMEOUT", "30"))
+    server_log: str = os.path.expanduser("~/.entity/ollama-serve.log")
+    fingerprint_path: str = os.path.expanduser("~/.entity/startup.json")
+    fingerprint_ttl: float = float(os.environ.get("ENTITY_STARTUP_CACHE_TTL", "86400"))
 
     # Computed attributes (populated at runtime)
     executable: str | None = None
+    server_process: subprocess.Popen | None = None
     _system: Final[str] = platform.system().lower()
 
     # ── Public API ───────────────────────────────────────────────────────────
     def ensure_ready(self) -> None:
-        """Main entry point called by user code."""
+        """
+        Main entry point called by user code.
+
+        The CLI version check and the server probe run concurrently; the model
+        check needs the server, so it runs once that is up. After a successful
+        check the result is cached as a fingerprint, and later launches with a
+        valid fingerprint skip the CLI subprocess and only talk to the server.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
         self._locate_or_install_cli()
-        self._verify_cli()
-        self._ensure_model()
-        self._ensure_server_running()
+        cached = self._cached_fingerprint()
+        if cached is not None:
+            self._ensure_server_running()
+            version = cached["version"]
+        else:
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                version = pool.submit(self._verify_cli)
+                server = pool.submit(self._ensure_server_running)
+                server.result()
+                version = version.result()
+        digest = self._ensure_model()
+        if cached is None or cached.get("model_digest") != digest:
+            self._save_fingerprint(version, digest)
 
     # ── Internals ────────────────────────────────────────────────────────────
     # 2.1 Locate or install CLI
@@ -164,30 +252,106 @@ class OllamaCLI:
             raise OllamaSetupError("Ollama CLI installer completed, but ollama.exe not found. Please ensure it is installed and in your PATH.")
 
     # 2.2 Verify function
-    def _verify_cli(self) -> None:
-        """Ensure `ollama --version` works."""
-        _run([self.executable, "--version"])
+    def _verify_cli(self) -> str:
+        """Ensure `ollama --version` works and return its output."""
+        return _run([self.executable, "--version"]).stdout.strip()
 
     # 2.3 Model availability
-    def _ensure_model(self) -> None:
-        models = _run([self.executable, "list"], check=False).stdout
-        if self.model not in models:
-            print(f"[INFO] Downloading Ollama model '{self.model}'…")
-            _run([self.executable, "pull", self.model])
+    def _ensure_model(self) -> str | None:
+        """Pull the model through the server's API if it is missing; return its digest."""
+        registry = ModelRegistry(ollama_host())
+        try:
+            entry = registry.find(self.model)
+            if entry is None:
+                print(f"[INFO] Downloading Ollama model '{self.model}'…")
+                registry.pull(self.model)
+                entry = registry.find(self.model)
+            if entry is None and registry.show(self.model) is None:
+                raise OllamaSetupError(f"Model '{self.model}' is still missing after pulling it.")
+        except ModelRegistryError as e:
+            raise OllamaSetupError(str(e)) from e
+        return entry.get("digest") if entry else None
 
     # 2.4 Server availability
     def _ensure_server_running(self) -> None:
-        try:
-            import ollama
-
-            ollama.list()
-        except Exception:
-            print("[INFO] Starting local Ollama server…")
-            subprocess.Popen([self.executable, "run", self.model])
-            time.sleep(5)  # allow startup
-            import ollama
+        """
+        Start `ollama serve` in the background unless the API already answers,
+        then poll it with exponential backoff until it is ready. The server is
+        stopped again when this process exits.
+        """
+        host = ollama_host()
+        if ollama_is_up(host):
+            return
+
+        print("[INFO] Starting local Ollama server…")
+        os.makedirs(os.path.dirname(self.server_log), exist_ok=True)
+        with open(self.server_log, "wb") as log:
+            self.server_process = subprocess.Popen(
+                [self.executable, "serve"],
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                start_new_session=self._system != "windows",
+            )
+        atexit.register(self.stop_server)
 
-            ollama.list()
+        exited = lambda: self.server_process.poll() is not None
+        if wait_until(lambda: ollama_is_up(host), self.startup_timeout, abort=exited):
+            return
+        if exited():
+            raise OllamaSetupError(
+                f"'ollama serve' exited with code {self.server_process.returncode}; see {self.server_log}"
+            )
+        self.stop_server()
+        raise OllamaSetupError(f"Ollama server at {host} did not become ready within {self.startup_timeout:g}s.")
+
+    def stop_server(self) -> None:
+        """Terminate the server started by `_ensure_server_running`, if any."""
+        process, self.server_process = self.server_process, None
+        if process is None or process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    # 2.5 Startup fingerprint
+    def _fingerprint(self) -> dict:
+        """What a cached check depends on: the CLI binary and the model name."""
+        stat = os.stat(self.executable)
+        return {
+            "executable": self.executable,
+            "executable_mtime": stat.st_mtime,
+            "executable_size": stat.st_size,
+            "model": self.model,
+        }
+
+    def _cached_fingerprint(self) -> dict | None:
+        """The saved fingerprint if it is unexpired and matches the current CLI and model."""
+        try:
+            with open(self.fingerprint_path, encoding="utf-8") as f:
+                cached = json.load(f)
+            current = self._fingerprint()
+        except (OSError, ValueError):
+            return None
+        if time.time() - cached.get("checked", 0) > self.fingerprint_ttl:
+            return None
+        if any(cached.get(key) != value for key, value in current.items()) or "version" not in cached:
+            return None
+        return cached
+
+    def _save_fingerprint(self, version: str, digest: str | None) -> None:
+        fingerprint = {**self._fingerprint(), "version": version, "model_digest": digest, "checked": time.time()}
+        try:
+            os.makedirs(os.path.dirname(self.fingerprint_path), exist_ok=True)
+            tmp_path = f"{self.fingerprint_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(fingerprint, f)
+            os.replace(tmp_path, self.fingerprint_path)
+        except OSError as e:
+            print(f"[WARN] Could not cache startup checks: {e}")
 
     # ── Platform-specific helpers ────────────────────────────────────────────
     def _install_linux_tar(self) -> str:
@@ -247,9 +411,14 @@ def setup_ollama_cli(model: str = "llama3") -> None:
 def ensure_ollama_ready(model: str = "llama3") -> None:
     """
     Convenience wrapper: ensure Python pkg, CLI, model and server are ready.
+    Importing (or installing) the Python package overlaps with the CLI checks.
     """
-    ensure_python_package("ollama")
-    OllamaCLI(model).ensure_ready()
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        package = pool.submit(ensure_python_package, "ollama")
+        OllamaCLI(model).ensure_ready()
+        package.result()
 
 
 def uninstall_ollama_cli():
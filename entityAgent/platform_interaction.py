@@ -1,6 +1,25 @@
+import asyncio
+import os
 import platform
+import queue
+import re
+import signal
+import socket
+import stat
 import subprocess
 import sys
+import threading
+import time
+from collections import deque
+
+# Output retained per stream (stdout/stderr) of a command: the first half of
+# the budget is kept as the head, the second half as a rolling tail.
+DEFAULT_MAX_OUTPUT_BYTES = 1_000_000
+# Pipe read size; also the longest line yielded before it is split, so output
+# without newlines cannot grow unbounded.
+READ_CHUNK_BYTES = 64 * 1024
+# Exit status reported for a command cancelled before it was started.
+CANCELLED_BEFORE_START = -1
 
 def get_operating_system():
     os_name = platform.system()
@@ -8,22 +27,591 @@ def get_operating_system():
         return 'macOS'
     return os_name
 
-def execute_command(command):
+
+class OutputBuffer:
+    """
+    Retains the first and last bytes of a stream within `max_bytes`,
+    counting how many bytes in the middle were dropped.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_OUTPUT_BYTES):
+        self.head_limit = max_bytes // 2
+        self.tail_limit = max_bytes - self.head_limit
+        self.head = bytearray()
+        self.tail = deque()
+        self.tail_bytes = 0
+        self.dropped_bytes = 0
+
+    def add(self, data):
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if not data:
+            return
+        self.tail.append(data)
+        self.tail_bytes += len(data)
+        while self.tail_bytes > self.tail_limit:
+            excess = self.tail_bytes - self.tail_limit
+            first = self.tail[0]
+            if len(first) <= excess:
+                self.tail.popleft()
+                removed = len(first)
+            else:
+                self.tail[0] = first[excess:]
+                removed = excess
+            self.tail_bytes -= removed
+            self.dropped_bytes += removed
+
+    @property
+    def truncated(self):
+        return self.dropped_bytes > 0
+
+    def text(self):
+        text = self.head.decode(errors='replace')
+        if self.dropped_bytes:
+            text += f"\n… [{self.dropped_bytes} bytes omitted] …\n"
+        return text + b"".join(self.tail).decode(errors='replace')
+
+
+def _limit_resources(pid, cpu_limit, memory_limit):
+    """
+    Apply CPU-seconds and address-space rlimits to a started command with
+    prlimit, rather than a preexec_fn, which is unsafe in threaded programs.
+    Only done on Linux, where RLIMIT_AS is enforced; children the command
+    starts inherit the limits.
+    """
+    if not sys.platform.startswith('linux') or not (cpu_limit or memory_limit):
+        return
+    import resource
     try:
-        result = subprocess.run(command, shell=True, capture_output=True, text=True)
-        stdout = result.stdout.strip()
-        stderr = result.stderr.strip()
-        return_code = result.returncode
-        return stdout, stderr, return_code
+        if cpu_limit:
+            resource.prlimit(pid, resource.RLIMIT_CPU, (cpu_limit, cpu_limit))
+        if memory_limit:
+            resource.prlimit(pid, resource.RLIMIT_AS, (memory_limit, memory_limit))
+    except ProcessLookupError:
+        pass  # Already exited
+
+
+def _spawn_options():
+    """
+    Popen keyword arguments that start a command in its own process group,
+    so it can be killed together with everything it spawned.
+    """
+    if os.name != 'posix':
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {'start_new_session': True}
+
+
+def kill_process_tree(pid):
+    """Kill a command started with _spawn_options and all of its descendants."""
+    if os.name == 'posix':
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        return
+
+    import psutil
+    try:
+        parent = psutil.Process(pid)
+        for child in parent.children(recursive=True):
+            child.kill()
+        parent.kill()
+    except psutil.NoSuchProcess:
+        pass
+
+
+class _CommandResult:
+    """Result state shared by the sync and async command streams."""
+
+    def __init__(self, command, timeout=None, max_output_bytes=DEFAULT_MAX_OUTPUT_BYTES,
+                 cpu_limit=None, memory_limit=None):
+        self.command = command
+        self.timeout = timeout
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        self.returncode = None
+        self.timed_out = False
+        self.cancelled = False
+        self.pid = None
+        self._buffers = {
+            'stdout': OutputBuffer(max_output_bytes),
+            'stderr': OutputBuffer(max_output_bytes),
+        }
+        self._partial = {'stdout': b'', 'stderr': b''}
+
+    def _lines(self, name, chunk):
+        """
+        Record a chunk of output and return the complete lines it finishes.
+        An empty chunk marks end of stream and flushes any unterminated line.
+        """
+        self._buffers[name].add(chunk)
+        data = self._partial[name] + chunk
+        if not chunk:
+            self._partial[name] = b''
+            lines = [data] if data else []
+        else:
+            lines = data.split(b'\n')
+            self._partial[name] = lines.pop()
+            if len(self._partial[name]) >= READ_CHUNK_BYTES:
+                lines.append(self._partial[name])
+                self._partial[name] = b''
+        return [(name, line.decode(errors='replace').rstrip('\r')) for line in lines]
+
+    @property
+    def stdout(self):
+        return self._buffers['stdout'].text().strip()
+
+    @property
+    def stderr(self):
+        stderr = self._buffers['stderr'].text().strip()
+        note = None
+        if self.timed_out:
+            note = f"Command timed out after {self.timeout} seconds."
+        elif self.cancelled:
+            note = "Command was cancelled."
+        if note:
+            stderr = f"{stderr}\n{note}" if stderr else note
+        return stderr
+
+    @property
+    def truncated(self):
+        return any(buffer.truncated for buffer in self._buffers.values())
+
+    def cancel(self):
+        """
+        Kill the command and its process group. Safe to call from another
+        thread; iteration then ends once the pipes close. A command cancelled
+        before it started is never started.
+        """
+        self.cancelled = True
+        if self.pid is not None and self.returncode is None:
+            kill_process_tree(self.pid)
+
+    @staticmethod
+    def _remaining(deadline, open_streams):
+        """Seconds left to wait for the exit status: none once killed, else until the deadline."""
+        if open_streams or deadline is None:
+            return None
+        return max(0, deadline - time.monotonic())
+
+    def _expire(self, pid):
+        self.timed_out = True
+        kill_process_tree(pid)
+
+    def _started(self, pid):
+        """
+        Record the spawned process and apply its resource limits, killing it
+        if cancel() ran while it was being spawned.
+        """
+        self.pid = pid
+        _limit_resources(pid, self.cpu_limit, self.memory_limit)
+        if self.cancelled:
+            kill_process_tree(pid)
+
+
+class CommandStream(_CommandResult):
+    """
+    Runs a shell command and yields `(stream, line)` pairs as output arrives,
+    where `stream` is "stdout" or "stderr". Only the head and tail of each
+    stream (up to `max_output_bytes`) are retained; after iteration the
+    retained text is on `stdout`/`stderr` and the exit status on `returncode`.
+
+    The command runs in its own process group, limited to `cpu_limit` CPU
+    seconds and `memory_limit` bytes of address space on Linux. The whole
+    group is killed if it outlives `timeout` seconds, if `cancel()` is called,
+    or if iteration stops early (including on KeyboardInterrupt).
+    """
+
+    def __iter__(self):
+        if self.cancelled:
+            self.returncode = CANCELLED_BEFORE_START
+            return
+        process = subprocess.Popen(
+            self.command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            **_spawn_options()
+        )
+        self._started(process.pid)
+        events = queue.Queue()
+        for name, pipe in (('stdout', process.stdout), ('stderr', process.stderr)):
+            threading.Thread(target=_pump, args=(pipe, name, events), daemon=True).start()
+
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        open_streams = 2
+        try:
+            while open_streams:
+                remaining = None if deadline is None else max(0, deadline - time.monotonic())
+                try:
+                    name, chunk = events.get(timeout=remaining)
+                except queue.Empty:
+                    self.timed_out = True
+                    break
+                if not chunk:
+                    open_streams -= 1
+                for line in self._lines(name, chunk):
+                    yield line
+        finally:
+            if open_streams:
+                kill_process_tree(process.pid)
+            try:
+                # A command that closed its pipes may still be running
+                self.returncode = process.wait(timeout=self._remaining(deadline, open_streams))
+            except subprocess.TimeoutExpired:
+                self._expire(process.pid)
+                self.returncode = process.wait()
+
+
+class AsyncCommandStream(_CommandResult):
+    """Asyncio counterpart of CommandStream, iterated with `async for`."""
+
+    async def __aiter__(self):
+        if self.cancelled:
+            self.returncode = CANCELLED_BEFORE_START
+            return
+        process = await asyncio.create_subprocess_shell(
+            self.command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            **_spawn_options()
+        )
+        self._started(process.pid)
+        events = asyncio.Queue()
+        pumps = [
+            asyncio.ensure_future(_pump_async(process.stdout, 'stdout', events)),
+            asyncio.ensure_future(_pump_async(process.stderr, 'stderr', events)),
+        ]
+
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        open_streams = 2
+        try:
+            while open_streams:
+                remaining = None if deadline is None else max(0, deadline - time.monotonic())
+                try:
+                    name, chunk = await asyncio.wait_for(events.get(), remaining)
+                except asyncio.TimeoutError:
+                    self.timed_out = True
+                    break
+                if not chunk:
+                    open_streams -= 1
+                for line in self._lines(name, chunk):
+                    yield line
+        finally:
+            # killpg rather than process.kill(): the latter polls the child and
+            # can reap it behind the event loop's child watcher.
+            if open_streams:
+                kill_process_tree(process.pid)
+            for pump in pumps:
+                pump.cancel()
+            try:
+                self.returncode = await asyncio.wait_for(process.wait(), self._remaining(deadline, open_streams))
+            except asyncio.TimeoutError:
+                self._expire(process.pid)
+                self.returncode = await process.wait()
+
+
+def _pump(pipe, name, events):
+    with pipe:
+        for chunk in iter(lambda: pipe.read1(READ_CHUNK_BYTES), b''):
+            events.put((name, chunk))
+    events.put((name, b''))
+
+
+async def _pump_async(reader, name, events):
+    while True:
+        chunk = await reader.read(READ_CHUNK_BYTES)
+        await events.put((name, chunk))
+        if not chunk:
+            break
+
+
+def execute_command(command, timeout=None, max_output_bytes=DEFAULT_MAX_OUTPUT_BYTES,
+                    cpu_limit=None, memory_limit=None):
+    try:
+        stream = CommandStream(command, timeout=timeout, max_output_bytes=max_output_bytes,
+                               cpu_limit=cpu_limit, memory_limit=memory_limit)
+        for _ in stream:
+            pass
+        return stream.stdout, stream.stderr, stream.returncode
     except Exception as e:
         return '', str(e), 1
 
-def list_processes():
+async def execute_command_async(command, timeout=None, max_output_bytes=DEFAULT_MAX_OUTPUT_BYTES,
+                                cpu_limit=None, memory_limit=None):
+    """
+    Non-blocking counterpart of execute_command for use inside an event loop.
+    """
+    try:
+        stream = AsyncCommandStream(command, timeout=timeout, max_output_bytes=max_output_bytes,
+                                    cpu_limit=cpu_limit, memory_limit=memory_limit)
+        async for _ in stream:
+            pass
+        return stream.stdout, stream.stderr, stream.returncode
+    except Exception as e:
+        return '', str(e), 1
+
+# Programs that only report on the system and never change it, whatever
+# their arguments (options that write files, like `sort -o`, are excluded
+# by leaving such programs out).
+READ_ONLY_COMMANDS = {
+    'cat', 'df', 'du', 'echo', 'file', 'free', 'grep', 'head', 'id', 'ls', 'lsblk',
+    'lscpu', 'nproc', 'ps', 'pwd', 'stat', 'tail', 'uname', 'uptime', 'wc', 'which', 'whoami',
+}
+# Shell syntax that can redirect output, chain or substitute other commands.
+_UNSAFE_SHELL_SYNTAX = re.compile(r'[;&<>`\n]|\$\(')
+
+
+def is_read_only_command(command):
+    """
+    True when `command` is a pipeline of READ_ONLY_COMMANDS with no
+    redirection, chaining or command substitution, so running it cannot
+    change the system and it may run alongside other commands.
+    """
+    if not command.strip() or _UNSAFE_SHELL_SYNTAX.search(command):
+        return False
+    for segment in command.split('|'):
+        words = segment.split()
+        if not words or os.path.basename(words[0]) not in READ_ONLY_COMMANDS:
+            return False
+    return True
+
+# Fields accepted by list_processes, mapped to the psutil attribute they read.
+PROCESS_FIELDS = {
+    'pid': 'pid',
+    'name': 'name',
+    'username': 'username',
+    'status': 'status',
+    'cpu': 'cpu_percent',
+    'memory': 'memory_percent',
+    'rss': 'memory_info',
+    'threads': 'num_threads',
+    'started': 'create_time',
+    'cmdline': 'cmdline',
+}
+DEFAULT_PROCESS_FIELDS = ('pid', 'name', 'username')
+# Fields sorted largest-first; everything else sorts ascending.
+NUMERIC_PROCESS_FIELDS = {'cpu', 'memory', 'rss', 'threads', 'started'}
+
+
+def _process_value(field, value):
+    if field == 'rss':
+        return value.rss if value is not None else None
+    if field == 'cmdline':
+        return ' '.join(value) if value else ''
+    if field in ('cpu', 'memory') and value is not None:
+        return round(value, 1)
+    return value
+
+
+def _name_pattern(name):
+    """The compiled `name` filter; a malformed pattern is reported like any other bad option."""
+    try:
+        return re.compile(name, re.IGNORECASE)
+    except re.error as e:
+        raise ValueError(f"invalid name pattern: {e}")
+
+
+def list_processes(fields=DEFAULT_PROCESS_FIELDS, name=None, user=None, min_cpu=None,
+                   sort=None, limit=None, cpu_interval=0.1):
+    """
+    List running processes as dicts keyed by the requested `fields`
+    (see PROCESS_FIELDS), collected in a single psutil pass.
+
+    Filters: `name` is a regular expression searched in the process name,
+    `user` matches the username exactly, `min_cpu` keeps processes at or above
+    that CPU percentage. `sort` is a field name (numeric fields sort
+    descending) and `limit` keeps the first N results.
+
+    CPU usage is measured over one shared `cpu_interval` for all processes,
+    and only when a CPU field is requested, filtered or sorted on.
+    """
+    import psutil
+
+    fields = list(fields)
+    wanted = set(fields)
+    if user:
+        wanted.add('username')
+    if name:
+        wanted.add('name')
+    if sort:
+        wanted.add(sort)
+    unknown = wanted - PROCESS_FIELDS.keys()
+    if unknown:
+        raise ValueError(f"Unknown process field(s): {', '.join(sorted(unknown))}")
+
+    measure_cpu = 'cpu' in wanted or min_cpu is not None
+    wanted.discard('cpu')
+    attrs = [PROCESS_FIELDS[field] for field in wanted]
+    name_pattern = _name_pattern(name) if name else None
+
+    candidates = []
+    for proc in psutil.process_iter(attrs):
+        info = {field: _process_value(field, proc.info.get(PROCESS_FIELDS[field])) for field in wanted}
+        if name_pattern and not name_pattern.search(info.get('name') or ''):
+            continue
+        if user and info.get('username') != user:
+            continue
+        candidates.append((proc, info))
+
+    if measure_cpu:
+        for proc, _ in candidates:
+            try:
+                proc.cpu_percent(None)
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                pass
+        time.sleep(cpu_interval)
+        for proc, info in candidates:
+            try:
+                info['cpu'] = round(proc.cpu_percent(None), 1)
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                info['cpu'] = None
+
+    return query_processes([info for _, info in candidates], fields=fields, min_cpu=min_cpu, sort=sort, limit=limit)
+
+
+def query_processes(processes, fields=None, name=None, user=None, min_cpu=None, sort=None, limit=None):
+    """
+    Filter, sort, limit and project process dicts already collected, with the
+    same semantics as the list_processes arguments. `fields=None` keeps every
+    key present.
+    """
+    if name:
+        name_pattern = _name_pattern(name)
+        processes = [p for p in processes if name_pattern.search(p.get('name') or '')]
+    if user:
+        processes = [p for p in processes if p.get('username') == user]
+    if min_cpu is not None:
+        processes = [p for p in processes if (p.get('cpu') or 0) >= min_cpu]
+    if sort:
+        # Processes whose value could not be read go last either way.
+        present = [p for p in processes if p.get(sort) is not None]
+        missing = [p for p in processes if p.get(sort) is None]
+        present.sort(key=lambda p: p[sort], reverse=sort in NUMERIC_PROCESS_FIELDS)
+        processes = present + missing
+    if limit is not None:
+        processes = processes[:limit]
+    if fields is None:
+        return list(processes)
+    return [{field: p.get(field) for field in fields} for p in processes]
+
+
+# ── System probes ────────────────────────────────────────────────────────────
+# Read directly through psutil/platform/os, without spawning a shell. Sizes
+# are in bytes and times in seconds (epoch seconds for timestamps).
+
+def system_info():
+    """Operating system, host and uptime."""
+    import psutil
+
+    boot_time = psutil.boot_time()
+    return {
+        'os': get_operating_system(),
+        'release': platform.release(),
+        'version': platform.version(),
+        'machine': platform.machine(),
+        'hostname': platform.node(),
+        'boot_time': int(boot_time),
+        'uptime': int(time.time() - boot_time),
+        'users': sorted({user.name for user in psutil.users()}),
+    }
+
+
+def cpu_info(interval=0.1):
+    """CPU counts, overall and per-CPU usage over `interval` seconds, load and frequency."""
+    import psutil
+
+    per_cpu = psutil.cpu_percent(interval=interval, percpu=True)
+    info = {
+        'logical': psutil.cpu_count(),
+        'physical': psutil.cpu_count(logical=False),
+        'percent': round(sum(per_cpu) / len(per_cpu), 1) if per_cpu else None,
+        'per_cpu': per_cpu,
+        'load_average': [round(load, 2) for load in psutil.getloadavg()],
+    }
+    try:
+        frequency = psutil.cpu_freq()
+    except (AttributeError, NotImplementedError, OSError):
+        frequency = None
+    if frequency:
+        info['mhz'] = round(frequency.current)
+    return info
+
+
+def memory_info():
+    """RAM and swap totals and usage."""
+    import psutil
+
+    memory, swap = psutil.virtual_memory(), psutil.swap_memory()
+    return {
+        'total': memory.total,
+        'available': memory.available,
+        'used': memory.used,
+        'percent': memory.percent,
+        'swap_total': swap.total,
+        'swap_used': swap.used,
+        'swap_percent': swap.percent,
+    }
+
+
+def disk_usage(path=None):
+    """Usage of the filesystem holding `path`, or of every mounted partition."""
     import psutil
-    processes = []
-    for proc in psutil.process_iter(['pid', 'name', 'username']):
+
+    if path:
+        mounts = [(os.path.expanduser(path), None, None)]
+    else:
+        mounts = [(p.mountpoint, p.device, p.fstype) for p in psutil.disk_partitions(all=False)]
+    disks = []
+    for mountpoint, device, fstype in mounts:
         try:
-            processes.append(proc.info)
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            pass
-    return processes
+            usage = psutil.disk_usage(mountpoint)
+        except (PermissionError, FileNotFoundError, OSError):
+            continue
+        disk = {'mount': mountpoint, 'total': usage.total, 'used': usage.used, 'free': usage.free,
+                'percent': usage.percent}
+        if device:
+            disk.update(device=device, fstype=fstype)
+        disks.append(disk)
+    return disks
+
+
+def network_interfaces():
+    """Network interfaces with their state, speed and addresses."""
+    import psutil
+
+    families = {socket.AF_INET: 'ipv4', socket.AF_INET6: 'ipv6', getattr(psutil, 'AF_LINK', None): 'mac'}
+    stats = psutil.net_if_stats()
+    interfaces = []
+    for name, addresses in sorted(psutil.net_if_addrs().items()):
+        interface = {'name': name}
+        if name in stats:
+            interface.update(up=stats[name].isup, speed=stats[name].speed, mtu=stats[name].mtu)
+        for address in addresses:
+            family = families.get(address.family)
+            if family:
+                interface.setdefault(family, []).append(address.address)
+        interfaces.append(interface)
+    return interfaces
+
+
+def file_info(path):
+    """Type, size, permissions, owner and timestamps of `path`."""
+    path = os.path.expanduser(path)
+    st = os.stat(path)
+    if stat.S_ISDIR(st.st_mode):
+        kind = 'directory'
+    elif stat.S_ISREG(st.st_mode):
+        kind = 'file'
+    else:
+        kind = 'other'
+    info = {
+        'path': os.path.abspath(path),
+        'type': 'symlink' if os.path.islink(path) else kind,
+        'size': st.st_size,
+        'mode': stat.filemode(st.st_mode),
+        'modified': int(st.st_mtime),
+    }
+    try:
+        import pwd
+        info['owner'] = pwd.getpwuid(st.st_uid).pw_name
+    except (ImportError, KeyError):
+        pass
+    return info
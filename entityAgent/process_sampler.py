@@ -0,0 +1,169 @@
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+# Fields kept in the snapshot; STATIC ones are read once per process,
+# DYNAMIC ones on every scan.
+STATIC_FIELDS = ('pid', 'name', 'username', 'started')
+DYNAMIC_FIELDS = ('status', 'cpu', 'memory', 'rss', 'threads')
+SNAPSHOT_FIELDS = STATIC_FIELDS + DYNAMIC_FIELDS
+
+
+class ProcessSampler:
+    """
+    Maintains a process table refreshed every `interval` seconds on a
+    background thread, so any number of readers share one scan.
+
+    Scans are incremental: new PIDs are read in full once, known processes
+    only have their dynamic fields refreshed, and CPU usage is measured
+    between consecutive scans without sleeping. Every scan that changes the
+    table bumps `version`, which callers can use as an ETag and pass to
+    `delta()` to fetch only what changed since.
+    """
+
+    def __init__(self, interval: float = 2.0, history: int = 4096):
+        self.interval = interval
+        self.version = 0
+        self._procs: Dict[int, object] = {}
+        self._rows: Dict[int, dict] = {}
+        self._changed_at: Dict[int, int] = {}
+        self._started_at: Dict[int, int] = {}
+        # (version, pid) of recent exits; deltas older than this are served in full.
+        self._exited: deque = deque(maxlen=history)
+        self._oldest_delta = 0
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ── Lifecycle ────────────────────────────────────────────────────────────
+    def start(self) -> None:
+        """Start the background thread (idempotent); the first scan runs inline."""
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self.refresh()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stop,),
+                                            name="entity-process-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread; `start` runs a new one."""
+        with self._start_lock:
+            self._stop.set()
+            if self._thread is not None:
+                self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def _run(self, stop: threading.Event) -> None:
+        while not stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[WARN] Process sampling failed: {e}")
+
+    # ── Scanning ─────────────────────────────────────────────────────────────
+    def refresh(self) -> None:
+        """Run one scan and publish it as a new version if anything changed."""
+        import psutil
+
+        current = set(psutil.pids())
+        procs = dict(self._procs)
+        rows = {}
+        for pid in current:
+            proc = procs.get(pid)
+            if proc is None or not proc.is_running():  # new, or the PID was reused
+                try:
+                    proc = psutil.Process(pid)
+                    static = _read_static(proc)
+                    try:
+                        proc.cpu_percent(None)  # prime; the next scan reports usage
+                    except psutil.AccessDenied:
+                        pass  # Another user's process: listed, with its usage unknown
+                except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                    procs.pop(pid, None)
+                    continue
+                procs[pid] = proc
+                row = dict(static)
+            else:
+                row = {field: self._rows[pid][field] for field in STATIC_FIELDS}
+            try:
+                row.update(_read_dynamic(proc))
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                procs.pop(pid, None)
+                continue
+            rows[pid] = row
+
+        with self._lock:
+            version = self.version + 1
+            started = [pid for pid, row in rows.items()
+                       if pid not in self._rows or self._rows[pid]['started'] != row['started']]
+            exited = [pid for pid in self._rows if pid not in rows or pid in started]
+            changed = [pid for pid, row in rows.items() if self._rows.get(pid) != row]
+            if not (started or exited or changed):
+                return
+
+            for pid in exited:
+                self._changed_at.pop(pid, None)
+                self._started_at.pop(pid, None)
+                if len(self._exited) == self._exited.maxlen:
+                    self._oldest_delta = self._exited[0][0]
+                self._exited.append((version, pid))
+            for pid in started:
+                self._started_at[pid] = version
+            for pid in changed:
+                self._changed_at[pid] = version
+            self._procs = {pid: procs[pid] for pid in rows}
+            self._rows = rows
+            self.version = version
+
+    # ── Readers ──────────────────────────────────────────────────────────────
+    def snapshot(self) -> Tuple[int, List[dict]]:
+        """Return `(version, processes)` for the latest scan."""
+        with self._lock:
+            return self.version, list(self._rows.values())
+
+    def delta(self, since: int) -> dict:
+        """
+        Changes since `since`: rows for `started` and `updated` processes and
+        PIDs that `exited`. If `since` is too old or unknown the full table is
+        returned under `processes` with `full: true`.
+        """
+        with self._lock:
+            if since < self._oldest_delta or since > self.version:
+                return {"version": self.version, "full": True, "processes": list(self._rows.values())}
+            started, updated = [], []
+            for pid, version in self._changed_at.items():
+                if version > since:
+                    (started if self._started_at.get(pid, 0) > since else updated).append(self._rows[pid])
+            exited = [pid for version, pid in self._exited if version > since and pid not in self._rows]
+            return {"version": self.version, "full": False, "started": started, "updated": updated, "exited": exited}
+
+
+def _read_static(proc) -> dict:
+    info = proc.as_dict(['pid', 'name', 'username', 'create_time'], ad_value=None)
+    return {'pid': info['pid'], 'name': info['name'], 'username': info['username'], 'started': info['create_time']}
+
+
+def _read_dynamic(proc) -> dict:
+    import psutil
+
+    with proc.oneshot():
+        info = proc.as_dict(['status', 'memory_percent', 'memory_info', 'num_threads'], ad_value=None)
+        try:
+            cpu = round(proc.cpu_percent(None), 1)
+        except psutil.AccessDenied:
+            cpu = None
+    memory = info['memory_percent']
+    return {
+        'status': info['status'],
+        'cpu': cpu,
+        'memory': round(memory, 1) if memory is not None else None,
+        'rss': info['memory_info'].rss if info['memory_info'] is not None else None,
+        'threads': info['num_threads'],
+    }
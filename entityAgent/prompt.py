@@ -0,0 +1,92 @@
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from entityAgent.context import ContextWindow
+
+TOOL_SYSTEM_PROMPT = """You are Entity, an AI assistant running on {os_name}.
+You can act on the user's computer through the tools you are given: run terminal commands, list running processes, read files and list directories.
+For facts about the system (OS, CPU, memory, disks, network, uptime, file details) use the dedicated tools instead of shell commands; they are faster.
+Call several tools at once when they do not depend on each other; you will get every result before you reply.
+
+When the user asks you to perform a task, use these tools to achieve the goal.
+If the user asks a question that requires information from the system, call a tool to get it."""
+
+# Used instead of TOOL_SYSTEM_PROMPT for models without tool-calling support.
+COMMAND_SYSTEM_PROMPT = """You are Entity, an AI assistant running on {os_name}.
+You have the following capabilities:
+1. Execute terminal commands: `run: <command>`
+2. List running processes: `run: list_processes [--fields pid,name,username,cpu,memory,rss,cmdline] [--name <regex>] [--user <name>] [--min-cpu <percent>] [--sort <field>] [--limit <n>]`
+3. If you run a command, I will show you the output, and you can decide what to do next.
+
+To execute a command, your response must start with "run:". Do not put any explanation before the command.
+Example:
+run: ls -la
+
+When the user asks you to perform a task, use these capabilities to achieve the goal.
+If the user asks a question that requires information from the system, run a command to get it."""
+
+
+def system_prompt(os_name: str, native_tools: bool = True) -> str:
+    """
+    The system prompt, identical for every conversation on this machine so
+    Ollama can reuse its KV cache for it (and the tool schemas sent with it).
+    Nothing that changes per turn, like the time, may go in here.
+    """
+    return (TOOL_SYSTEM_PROMPT if native_tools else COMMAND_SYSTEM_PROMPT).format(os_name=os_name)
+
+
+def context_from_config(config, os_name: str, native_tools: bool = True,
+                        summarize: Optional[Callable[[List[dict]], str]] = None) -> ContextWindow:
+    """
+    A conversation for the CLI, a web chat or a batch task. All of them
+    start with the same prefix and trim old turns at the same points, so
+    requests from any of them share cached prompt prefixes.
+    """
+    return ContextWindow(
+        system_prompt(os_name, native_tools),
+        max_tokens=config.context_max_tokens,
+        keep_recent=config.context_keep_recent,
+        max_tool_output_chars=config.max_tool_output_chars,
+        page_tokens=config.context_page_tokens,
+        summarize=summarize,
+    )
+
+
+@dataclass
+class PrefixCacheStats:
+    """
+    How much of each prompt Ollama took from its KV cache instead of
+    evaluating it again. Ollama reports the tokens it evaluated
+    (`prompt_eval_count`); the prompt's total is estimated, so the rate is
+    approximate. Pass `hook` to an Agent to collect its requests.
+    """
+    requests: int = 0
+    prompt_tokens: int = 0
+    evaluated_tokens: int = 0
+
+    def record(self, prompt_tokens: int, evaluated_tokens: int) -> None:
+        self.requests += 1
+        self.prompt_tokens += prompt_tokens
+        self.evaluated_tokens += min(evaluated_tokens, prompt_tokens)
+
+    def hook(self, event: str, data: dict) -> None:
+        if event == 'usage' and data.get('prompt_eval_count') is not None:
+            self.record(data['prompt_tokens'], data['prompt_eval_count'])
+
+    @property
+    def hit_rate(self) -> float:
+        if not self.prompt_tokens:
+            return 0.0
+        return 1 - self.evaluated_tokens / self.prompt_tokens
+
+    def as_dict(self) -> dict:
+        return {
+            'requests': self.requests,
+            'prompt_tokens': self.prompt_tokens,
+            'evaluated_tokens': self.evaluated_tokens,
+            'hit_rate': round(self.hit_rate, 3),
+        }
+
+    def summary(self) -> str:
+        return (f"Prompt cache: {self.hit_rate:.0%} of ~{self.prompt_tokens} prompt tokens reused "
+                f"over {self.requests} requests")
@@ -3,50 +3,202 @@
 import sys
 import time
 import argparse
+import asyncio
 import os
-from entityAgent.ollama_utils import setup_ollama_cli, ensure_ollama_ready
-from entityAgent.platform_interaction import execute_command, get_operating_system, list_processes
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from entityAgent.agent import Agent
+from entityAgent.backends import BackendPool, PoolClient
+from entityAgent.command_cache import command_cache_from_config
+from entityAgent.llm import CachingClient, close_client, make_client
+from entityAgent.ollama_utils import setup_ollama_cli, ensure_ollama_ready, ensure_python_package, port_is_open, wait_until
+from entityAgent.platform_interaction import CommandStream, execute_command, get_operating_system, list_processes
+from entityAgent.prompt import PrefixCacheStats, context_from_config
+from entityAgent.serialize import compact_text
+from entityAgent.tools import (
+    default_registry, format_probe, format_processes, is_cached_result, parse_process_query,
+)
+from entityAgent.warmup import heartbeat_from_config, warm_up
+from entityAgent.web.sessions import SessionStore
 
 
-def runtime():
+SUMMARY_PROMPT = """Summarize the following conversation between a user and Entity, an AI assistant that runs commands on their computer.
+Keep facts about the system, commands already run and their key results, and anything the user asked to remember. Be concise."""
+
+def make_summarizer(model, client=None):
+    """Return a callable that condenses dropped messages with the chat model."""
+    def summarize(messages):
+        import ollama
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        response = (client or ollama).chat(model=model, messages=[
+            {'role': 'system', 'content': SUMMARY_PROMPT},
+            {'role': 'user', 'content': transcript},
+        ])
+        return response['message']['content']
+    return summarize
+
+
+def run_tool_command(command, config):
     """
-    Main function to run the Entity agent.
+    Command runner for the agent's tools: streams output like run_command on
+    the main thread, and runs quietly on the worker threads that execute
+    concurrent calls, whose results are printed once they are all done.
     """
-    print("Entity Agent: Initializing...")
+    if threading.current_thread() is threading.main_thread():
+        return run_command(command, config)
+    return execute_command(command, **config.command_limits(unattended=True))
 
-    # Ensure ollama Python package, CLI, and model are installed and ready
-    ensure_ollama_ready()
-    import ollama
-    print("Ollama connection successful.")
 
-    os_name = get_operating_system()
-    print(f"Running on: {os_name}. Welcome to Entity.")
-    print("You can ask me questions, run terminal commands (e.g., 'run: ls -l'), or list processes (e.g., 'run: list_processes').")
+def run_command(command, config):
+    """
+    Run a shell command, printing its output as it is produced.
+    Ctrl+C kills the command's whole process group and returns to the prompt.
+    Returns (stdout, stderr, return_code) with output capped per the config.
+    """
+    stream = CommandStream(command, **config.command_limits())
+    lines = iter(stream)
+    print("Output:")
+    try:
+        for _, line in lines:
+            print(line, flush=True)
+    except KeyboardInterrupt:
+        stream.cancel()
+        lines.close()
+        print("\nCommand cancelled.")
+    if stream.returncode != 0:
+        print(f"Error: command exited with code {stream.returncode}")
+        if stream.timed_out:
+            print(f"Timed out after {config.command_timeout} seconds.")
+    return stream.stdout, stream.stderr, stream.returncode
+
 
-    system_prompt = f"""You are Entity, an AI assistant running on {os_name}.
-You have the following capabilities:
-1. Execute terminal commands: `run: <command>`
-2. List running processes: `run: list_processes`
-3. If you run a command, I will show you the output, and you can decide what to do next.
+def print_event(event, data):
+    """Agent hook that shows the agent's progress in the terminal."""
+    if event == 'message':
+        message = data['message']
+        if message['role'] == 'assistant' and message['content'].strip():
+            print(message['content'])
+    elif event == 'tool_call':
+        print(f"Entity is calling {data['name']}: {data['arguments']}")
+    elif event == 'tool_result':
+        # A command run on this thread has already streamed its output
+        if data['concurrent'] or data['name'] != 'execute_command' or is_cached_result(data['result']):
+            print(data['result'])
+    elif event == 'warning':
+        print(f"[WARN] {data['message']}")
 
-To execute a command, your response must start with "run:". Do not put any explanation before the command.
-Example:
-run: ls -la
 
-When the user asks you to perform a task, use these capabilities to achieve the goal.
-If the user asks a question that requires information from the system, run a command to get it."""
+def run_list_processes(arguments, config):
+    """
+    Run the `list_processes` built-in; returns its output formatted for the
+    terminal and, more compactly, for the model.
+    """
+    options = parse_process_query(arguments)
+    options.setdefault('limit', config.process_list_limit)
+    processes = list_processes(**options)
+    return format_processes(processes), format_probe(processes)
+
+
+def print_sessions(config, limit=20):
+    """List the saved sessions, most recent first (the `--sessions` CLI mode)."""
+    if not config.session_db:
+        print("[WARN] Sessions are only saved when session_db is set in the configuration.")
+        return
+    store = SessionStore(**config.session_store_options())
+    for session in store.list_sessions(limit):
+        updated = time.strftime('%Y-%m-%d %H:%M', time.localtime(session['updated']))
+        print(f"{session['id']}  {updated}  {session['messages']:>4} messages  {session['title'] or ''}")
+    store.close()
+
 
-    messages = [{'role': 'system', 'content': system_prompt}]
+def runtime(resume=None):
+    """
+    Main function to run the Entity agent; `resume` continues a saved session.
+    """
+    print("Entity Agent: Initializing...")
 
     # Get the LLM model from configuration
     from entityAgent.config import load_config
     config = load_config()
     llm_model = config.model
+
+    pool = BackendPool.from_config(config)
+    if pool:
+        # Remote backends manage their own servers and models
+        ensure_python_package("ollama")
+        pool.start()
+        chat_client, load_client = PoolClient(pool), PoolClient(pool, broadcast=True)
+        print(f"Using {len(pool.backends)} Ollama backends.")
+    else:
+        # Ensure ollama Python package, CLI, and model are installed and ready
+        ensure_ollama_ready(llm_model)
+        # One client for every request, reusing its keep-alive connection
+        chat_client = load_client = make_client(config)
+        print("Ollama connection successful.")
+
+    if config.model_warmup:
+        # Load the model into memory while the user types the first request
+        threading.Thread(target=warm_up, args=(load_client, llm_model, config.keep_alive), daemon=True).start()
+    heartbeat = heartbeat_from_config(load_client, config)
+    if heartbeat:
+        heartbeat.start()
+
+    os_name = get_operating_system()
+    print(f"Running on: {os_name}. Welcome to Entity.")
+    print("You can ask me questions, run terminal commands (e.g., 'run: ls -l'), or list processes (e.g., 'run: list_processes').")
+
+    # Tools go through Ollama's native tool calling; models without it fall
+    # back to replies starting with "run:".
+    command_cache = command_cache_from_config(config)
+    tools = default_registry(config, run=lambda command: run_tool_command(command, config), cache=command_cache)
+    # Read-only tool calls requested together run concurrently on these workers
+    tool_executor = ThreadPoolExecutor(max_workers=config.tool_workers, thread_name_prefix="entity-tool")
+
     print(f"Using LLM model: {llm_model}", flush=True)
 
+    llm = CachingClient.from_config(chat_client, config)
+    context = context_from_config(config, os_name, config.native_tools,
+                                  summarize=make_summarizer(llm_model, chat_client))
+    # With session_db, each message is appended to the session log as it is
+    # added, so the conversation survives a restart and can be continued
+    # with --resume. Without it nothing is kept beyond the context window.
+    sessions = session_id = None
+    if config.session_db:
+        sessions = SessionStore(**config.session_store_options())
+        session_id, history = sessions.get_or_create(resume)
+        if resume and session_id != resume:
+            print(f"[WARN] Session {resume} not found or expired; starting a new one.")
+        for message in history:
+            context.append(message)
+        if history:
+            print(f"[INFO] Resumed session {session_id} with its last {len(history)} messages.")
+        else:
+            print(f"[INFO] Session {session_id}; continue it later with --resume {session_id}")
+    elif resume:
+        print("[WARN] --resume needs session_db set in the configuration; starting a new session.")
+
+    def save(message):
+        if sessions:
+            sessions.append(session_id, message)
+
+    def record(event, data):
+        if event == 'message':
+            save(data['message'])
+
+    prefix_cache = PrefixCacheStats()
+    # Tools that run alone stay on the main thread, where Ctrl+C reaches them
+    agent = Agent(llm, llm_model, context, tools=tools, native_tools=config.native_tools, os_name=os_name,
+                  executor=tool_executor, offload=False, hooks=[print_event, prefix_cache.hook])
+    if sessions:
+        agent.hooks.append(record)
+    # A plain loop rather than asyncio.run, which would defer Ctrl+C to the next await
+    loop = asyncio.new_event_loop()
+
     while True:
         try:
             user_input = input("> ")
+            if heartbeat:
+                heartbeat.touch()
             if user_input.lower() in ["exit", "quit"]:
                 print("Exiting Entity Agent.")
                 break
@@ -54,64 +206,23 @@ If the user asks a question that requires information from the system, run a com
             if user_input.lower().startswith("run:"):
                 command_full = user_input[4:].strip()
 
-                if command_full == "list_processes":
+                if command_full.split(" ", 1)[0] == "list_processes":
                     print("Listing running processes...")
-                    processes = list_processes()
-                    process_list_str = "\n".join([f"PID: {p['pid']}, Name: {p['name']}, User: {p['username']}" for p in processes])
+                    process_list_str, process_table = run_list_processes(command_full[len("list_processes"):], config)
                     print(process_list_str)
-                    messages.append({'role': 'assistant', 'content': f"Executed command: 'list_processes'\nOutput:\n{process_list_str}"})
+                    context.append_tool_output(f"Executed command: 'list_processes'\nOutput:\n{process_table}", role='assistant')
+                    save(context.messages[-1])
                 else:
                     command = command_full
                     print(f"Executing command: '{command}'")
-                    stdout, stderr, return_code = execute_command(command)
-
-                    if return_code == 0:
-                        print("Output:")
-                        print(stdout)
-                    else:
-                        print("Error:")
-                        print(stderr)
-                    messages.append({'role': 'assistant', 'content': f"Executed command: '{command}'\nOutput:\n{stdout}\nError:\n{stderr}"})
+                    stdout, stderr, return_code = run_command(command, config)
+                    if command_cache:
+                        command_cache.invalidate(command)
+                    output = compact_text(f"Output:\n{stdout}\nError:\n{stderr}", config.max_tool_output_tokens)
+                    context.append_tool_output(f"Executed command: '{command}'\n{output}", role='assistant')
+                    save(context.messages[-1])
             else:
-                messages.append({'role': 'user', 'content': user_input})
-
-                while True:
-                    response = ollama.chat(model=llm_model, messages=messages)
-                    assistant_response = response['message']['content']
-
-                    # Check if the response is a command
-                    if assistant_response.strip().lower().startswith("run:"):
-                        print(assistant_response) # Show the thought/command to the user
-                        messages.append({'role': 'assistant', 'content': assistant_response})
-                        
-                        command_to_run = assistant_response.strip()[4:].strip()
-                        
-                        if command_to_run == "list_processes":
-                            print("Entity is listing running processes...")
-                            processes = list_processes()
-                            process_list_str = "\n".join([f"PID: {p['pid']}, Name: {p['name']}, User: {p['username']}" for p in processes])
-                            print(process_list_str)
-                            messages.append({'role': 'system', 'content': f"Command execution result:\n{process_list_str}"})
-                        else:
-                            print(f"Entity is executing: {command_to_run}")
-                            stdout, stderr, return_code = execute_command(command_to_run)
-                            
-                            output_msg = ""
-                            if return_code == 0:
-                                print(f"Output:\n{stdout}")
-                                output_msg = f"Command execution result:\n{stdout}"
-                            else:
-                                print(f"Error:\n{stderr}")
-                                output_msg = f"Command failed with error:\n{stderr}"
-                                
-                            messages.append({'role': 'system', 'content': output_msg})
-                        
-                        # Loop continues to let the agent respond to the output
-                    else:
-                        # Final response to user
-                        print(assistant_response)
-                        messages.append({'role': 'assistant', 'content': assistant_response})
-                        break
+                loop.run_until_complete(agent.run(user_input))
 
         except KeyboardInterrupt:
             print("\nExiting Entity Agent.")
@@ -119,6 +230,20 @@ If the user asks a question that requires information from the system, run a com
         except Exception as e:
             print(f"An error occurred: {e}")
 
+    if prefix_cache.requests:
+        print(f"[INFO] {prefix_cache.summary()}")
+    if heartbeat:
+        heartbeat.stop()
+    tool_executor.shutdown(wait=False)
+    loop.close()
+    context.close()
+    if sessions:
+        sessions.close()
+    if pool:
+        pool.close()
+    else:
+        close_client(chat_client)
+
 
 def main():
     parser = argparse.ArgumentParser(description="Entity Agent CLI")
@@ -126,6 +251,11 @@ def main():
     parser.add_argument("--llm-model", type=str, help="Specify the LLM model to use.")
     parser.add_argument("--web", action="store_true", help="Start the Web Interface.")
     parser.add_argument("--gui", action="store_true", help="Start the Native GUI.")
+    parser.add_argument("--batch", type=str, metavar="TASKS.jsonl", help="Run the prompts in a JSONL file and exit.")
+    parser.add_argument("--workers", type=int, default=4, help="Tasks run at once in --batch mode (default: 4).")
+    parser.add_argument("--output", type=str, help="Results file for --batch (default: <tasks>.results.jsonl).")
+    parser.add_argument("--resume", type=str, metavar="SESSION_ID", help="Continue a saved CLI or web session.")
+    parser.add_argument("--sessions", action="store_true", help="List saved sessions and exit.")
     args = parser.parse_args()
 
     if args.install_ollama:
@@ -147,6 +277,15 @@ def main():
     # Update environment variable for compatibility
     os.environ["ENTITY_LLM_MODEL"] = config.model
 
+    if args.sessions:
+        print_sessions(config)
+        sys.exit(0)
+
+    if args.batch:
+        from entityAgent.batch import run_batch
+        stats = run_batch(config, args.batch, output_path=args.output, workers=args.workers)
+        sys.exit(1 if stats.failed else 0)
+
     if args.web or args.gui:
         import uvicorn
         import threading
@@ -171,8 +310,10 @@ def main():
             t = threading.Thread(target=start_server, daemon=True)
             t.start()
             
-            # Wait a bit for the server to start
-            time.sleep(1)
+            # Wait until the server accepts connections
+            if not wait_until(lambda: port_is_open(host, port), timeout=30, abort=lambda: not t.is_alive()):
+                print(f"Error: Web Interface did not start at {url}")
+                sys.exit(1)
             
             print("Starting Native GUI...")
             webview.create_window('Entity Agent', url)
@@ -190,7 +331,7 @@ def main():
             # Standard web mode
             start_server()
     else:
-        runtime()
+        runtime(resume=args.resume)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,118 @@
+from typing import Any, Dict, List, Optional
+
+from entityAgent.context import CHARS_PER_TOKEN, elide, estimate_tokens
+
+# Identical consecutive lines kept as they are; longer runs are collapsed.
+MAX_REPEATED_LINES = 2
+
+
+def compact_number(value: float) -> str:
+    """A number in as few characters as stay meaningful: 40.0 -> "40", 12.345 -> "12.3"."""
+    if isinstance(value, bool) or not isinstance(value, float):
+        return str(value)
+    if value.is_integer() or abs(value) >= 1000:
+        return str(int(round(value)))
+    return f"{value:.3g}"
+
+
+def format_value(value: Any) -> str:
+    """One table cell or record value on a single line."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    if isinstance(value, (int, float)):
+        return compact_number(value)
+    if isinstance(value, (list, tuple)):
+        return ",".join(format_value(item) for item in value)
+    return str(value).replace("\t", " ").replace("\n", " ")
+
+
+def format_table(rows: List[Dict[str, Any]]) -> str:
+    """
+    Rows as tab-separated columns under a single header line, instead of
+    repeating every key on every row. Missing values are left empty.
+    """
+    columns: List[str] = []
+    for row in rows:
+        columns.extend(key for key in row if key not in columns)
+    lines = ["\t".join(columns)]
+    lines.extend("\t".join(format_value(row.get(column)) for column in columns) for row in rows)
+    return "\n".join(lines)
+
+
+def serialize(value: Any) -> str:
+    """
+    Structured tool output as compact text: lists of records become a
+    table, a record becomes `key: value` lines, numbers are shortened.
+    """
+    if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+        return format_table(value)
+    if isinstance(value, dict):
+        lines = []
+        for key, item in value.items():
+            if isinstance(item, dict) or (isinstance(item, list) and item and isinstance(item[0], dict)):
+                lines.append(f"{key}:\n{serialize(item)}")
+            else:
+                lines.append(f"{key}: {format_value(item)}")
+        return "\n".join(lines)
+    return format_value(value)
+
+
+def dedupe_lines(text: str) -> str:
+    """Collapse runs of identical lines into the line and a repeat count."""
+    lines = text.split("\n")
+    result = []
+    start = 0
+    while start < len(lines):
+        end = start
+        while end + 1 < len(lines) and lines[end + 1] == lines[start]:
+            end += 1
+        count = end - start + 1
+        if count > MAX_REPEATED_LINES and lines[start].strip():
+            result.extend([lines[start], f"… [previous line repeated {count - 1} more times]"])
+        elif count > MAX_REPEATED_LINES:
+            result.append(lines[start])  # A run of blank lines is just spacing
+        else:
+            result.extend(lines[start:end + 1])
+        start = end + 1
+    return "\n".join(result)
+
+
+def elide_lines(text: str, max_tokens: Optional[int]) -> str:
+    """
+    Keep whole lines from the head and tail of `text` within about
+    `max_tokens`, and say how much of the middle was left out.
+    """
+    if max_tokens is None or estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens * CHARS_PER_TOKEN
+    lines = text.split("\n")
+    head: List[str] = []
+    used = 0
+    for line in lines:
+        if used + len(line) + 1 > budget * 2 // 3:
+            break
+        head.append(line)
+        used += len(line) + 1
+    tail: List[str] = []
+    for line in reversed(lines[len(head):]):
+        if used + len(line) + 1 > budget:
+            break
+        tail.insert(0, line)
+        used += len(line) + 1
+    if not head and not tail:
+        return elide(text, budget)  # A few very long lines
+    omitted = "\n".join(lines[len(head):len(lines) - len(tail)])
+    marker = f"… [{omitted.count(chr(10)) + 1} lines (~{estimate_tokens(omitted)} tokens) elided] …"
+    return "\n".join(head + [marker] + tail)
+
+
+def compact_text(text: str, max_tokens: Optional[int] = None) -> str:
+    """
+    Shell or tool output as sent to the model: trailing whitespace
+    stripped, repeated lines collapsed and the middle elided beyond
+    `max_tokens`.
+    """
+    text = "\n".join(line.rstrip() for line in text.rstrip().split("\n"))
+    return elide_lines(dedupe_lines(text), max_tokens)
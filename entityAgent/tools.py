@@ -0,0 +1,352 @@
+import json
+import os
+import shlex
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from entityAgent.command_cache import CommandCache
+from entityAgent.context import estimate_tokens
+from entityAgent.platform_interaction import (
+    PROCESS_FIELDS, cpu_info, disk_usage, execute_command, file_info, is_read_only_command, list_processes,
+    memory_info, network_interfaces, system_info,
+)
+from entityAgent.serialize import compact_text, serialize
+
+# Runs a shell command and returns (stdout, stderr, return_code).
+CommandRunner = Callable[[str], Tuple[str, str, int]]
+
+# First words of an execute_command result served from the CommandCache.
+CACHED_RESULT_NOTE = "(Cached result"
+
+# Options accepted by the `list_processes` built-in, with their parsers.
+PROCESS_QUERY_OPTIONS = {
+    'fields': lambda value: [f.strip() for f in value.split(',') if f.strip()],
+    'name': str,
+    'user': str,
+    'min_cpu': float,
+    'sort': str,
+    'limit': int,
+}
+PROCESS_LABELS = {'pid': 'PID', 'username': 'User'}
+# Keys of probe results holding a number of bytes, shown as e.g. "15.6G".
+SIZE_KEYS = {'total', 'available', 'used', 'free', 'swap_total', 'swap_used', 'size', 'rss'}
+
+
+def parse_process_query(arguments):
+    """
+    Parse `--sort cpu --limit 10 --name python ...` into keyword arguments
+    for list_processes. Raises ValueError on unknown or incomplete options.
+    """
+    tokens = shlex.split(arguments)
+    options = {}
+    for option, value in zip(tokens[::2], tokens[1::2] + [None]):
+        key = option.lstrip('-').replace('-', '_')
+        if not option.startswith('--') or key not in PROCESS_QUERY_OPTIONS:
+            raise ValueError(f"Unknown list_processes option '{option}'. Use: " + ", ".join(
+                f"--{name.replace('_', '-')}" for name in PROCESS_QUERY_OPTIONS))
+        if value is None:
+            raise ValueError(f"Missing value for list_processes option '{option}'")
+        options[key] = PROCESS_QUERY_OPTIONS[key](value)
+    return options
+
+
+def format_processes(processes: List[dict]) -> str:
+    """Processes as `PID: 1, Name: init` lines, for the terminal; the model gets format_probe's table."""
+    return "\n".join(
+        ", ".join(f"{PROCESS_LABELS.get(field, field.capitalize())}: {value}" for field, value in p.items())
+        for p in processes
+    )
+
+
+def human_size(size: float) -> str:
+    for unit in ('B', 'K', 'M', 'G', 'T'):
+        if abs(size) < 1024 or unit == 'T':
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+
+
+def format_probe(result: Any) -> str:
+    """
+    A system probe's or process listing's result as compact text for the
+    model (see serialize), with byte counts made readable.
+    """
+    def readable(value):
+        if isinstance(value, dict):
+            return {key: human_size(item) if key in SIZE_KEYS and isinstance(item, (int, float)) else readable(item)
+                    for key, item in value.items()}
+        if isinstance(value, list):
+            return [readable(item) for item in value]
+        return value
+
+    return serialize(readable(result))
+
+
+def tool_call_parts(tool_call: dict) -> Tuple[str, Any]:
+    """The tool name and raw arguments of one entry of a message's `tool_calls`."""
+    function = tool_call['function']
+    return function['name'], function.get('arguments')
+
+
+def is_cached_result(result: str) -> bool:
+    """True for execute_command output reused from the cache rather than produced by running it."""
+    return result.startswith(CACHED_RESULT_NOTE)
+
+
+def tools_unsupported(error: BaseException) -> bool:
+    """True when Ollama rejected a request because the model cannot call tools."""
+    return getattr(error, "status_code", None) == 400 and "does not support tools" in str(error)
+
+
+@dataclass
+class Tool:
+    """
+    A function the model can call. `parameters` maps each argument name to
+    its JSON schema; the ones listed in `required` must always be given.
+    `read_only` marks calls that cannot change the system, either always
+    or, given a callable, depending on the call's arguments.
+    """
+    name: str
+    description: str
+    function: Callable[..., str]
+    parameters: Dict[str, dict] = field(default_factory=dict)
+    required: List[str] = field(default_factory=list)
+    read_only: Union[bool, Callable[[dict], bool]] = False
+
+    def is_read_only(self, arguments: dict) -> bool:
+        if callable(self.read_only):
+            return bool(self.read_only(arguments))
+        return self.read_only
+
+    def schema(self) -> dict:
+        """The tool in the format of Ollama's `tools` chat parameter."""
+        return {
+            'type': 'function',
+            'function': {
+                'name': self.name,
+                'description': self.description,
+                'parameters': {
+                    'type': 'object',
+                    'properties': self.parameters,
+                    'required': self.required,
+                },
+            },
+        }
+
+
+class ToolRegistry:
+    """
+    The tools offered to the model, and dispatch of the calls it makes.
+    Results are compacted (see compact_text) to about `max_output_tokens`.
+    """
+
+    def __init__(self, tools: Optional[List[Tool]] = None, max_output_tokens: Optional[int] = None):
+        self.max_output_tokens = max_output_tokens
+        self.tools: Dict[str, Tool] = {}
+        self._schemas: Optional[List[dict]] = None
+        for tool in tools or []:
+            self.register(tool)
+
+    def register(self, tool: Tool) -> None:
+        self.tools[tool.name] = tool
+        self._schemas = None
+
+    def schemas(self) -> List[dict]:
+        """
+        The `tools` chat parameter. Built once, so every request sends the
+        same schemas in the same order and the prompt prefix stays cacheable.
+        """
+        if self._schemas is None:
+            self._schemas = [tool.schema() for tool in self.tools.values()]
+        return self._schemas
+
+    def schema_tokens(self) -> int:
+        """Estimated prompt tokens the schemas take up."""
+        return estimate_tokens(json.dumps(self.schemas()))
+
+    def call(self, name: str, arguments: Union[dict, str, None] = None) -> str:
+        """
+        Run tool `name` with the arguments from a model's tool call (a dict
+        or a JSON string). Failures are returned as text for the model to
+        read instead of being raised.
+        """
+        tool = self.tools.get(name)
+        if tool is None:
+            return f"Unknown tool '{name}'. Available tools: {', '.join(self.tools)}"
+        try:
+            arguments = self._arguments(tool, arguments)
+            result = tool.function(**arguments)
+        except (TypeError, ValueError, OSError) as e:
+            result = f"{name} failed: {e}"
+        return compact_text(result, self.max_output_tokens)
+
+    def batches(self, tool_calls: List[dict]) -> List[List[dict]]:
+        """
+        Split a reply's tool calls, in order, into batches that may run
+        concurrently: consecutive read-only calls share a batch, and any
+        other call runs alone so later calls see its effects.
+        """
+        batches: List[List[dict]] = []
+        shared = False
+        for tool_call in tool_calls:
+            read_only = self._read_only(tool_call)
+            if read_only and shared:
+                batches[-1].append(tool_call)
+            else:
+                batches.append([tool_call])
+            shared = read_only
+        return batches
+
+    def _read_only(self, tool_call: dict) -> bool:
+        name, arguments = tool_call_parts(tool_call)
+        tool = self.tools.get(name)
+        try:
+            return tool is not None and tool.is_read_only(self._arguments(tool, arguments))
+        except (TypeError, ValueError):
+            return False
+
+    @staticmethod
+    def _arguments(tool: Tool, arguments: Union[dict, str, None]) -> dict:
+        if isinstance(arguments, str):
+            arguments = json.loads(arguments) if arguments.strip() else {}
+        arguments = dict(arguments or {})
+        missing = [name for name in tool.required if arguments.get(name) is None]
+        if missing:
+            raise ValueError(f"missing required argument(s): {', '.join(missing)}")
+        # Models sometimes invent extra arguments; pass on only the declared ones.
+        return {name: value for name, value in arguments.items() if name in tool.parameters and value is not None}
+
+
+def default_registry(config, run: Optional[CommandRunner] = None,
+                     cache: Optional[CommandCache] = None) -> ToolRegistry:
+    """
+    The built-in tools: shell commands, process listing, file access and
+    system probes.
+    Commands go through `run`, or execute_command with the config's limits;
+    with a `cache`, repeated read-only commands reuse recent results.
+    """
+    if run is None:
+        def run(command):
+            return execute_command(command, **config.command_limits(unattended=True))
+
+    def execute(command: str, fresh: bool = False) -> str:
+        note = ""
+        if cache is None:
+            stdout, stderr, return_code = run(command)
+        else:
+            (stdout, stderr, return_code), age = cache.run(command, run, fresh=bool(fresh))
+            if age is not None:
+                note = f"{CACHED_RESULT_NOTE} from {age:.0f}s ago; call again with fresh=true to re-run.)\n"
+        if return_code == 0:
+            return note + stdout
+        return f"Command exited with code {return_code}.\nOutput:\n{stdout}\nError:\n{stderr}"
+
+    def processes(fields=None, name=None, user=None, min_cpu=None, sort=None, limit=None) -> str:
+        if isinstance(fields, str):
+            fields = [f.strip() for f in fields.split(',') if f.strip()]
+        options = {'name': name, 'user': user, 'sort': sort,
+                   'min_cpu': float(min_cpu) if min_cpu is not None else None,
+                   'limit': int(limit) if limit is not None else config.process_list_limit}
+        if fields:
+            options['fields'] = fields
+        return format_probe(list_processes(**options))
+
+    def read_file(path: str) -> str:
+        limit = config.max_command_output_bytes
+        with open(os.path.expanduser(path), 'rb') as f:
+            data = f.read(limit + 1)
+        text = data[:limit].decode('utf-8', errors='replace')
+        if len(data) > limit:
+            text += f"\n... [file truncated at {limit} bytes]"
+        return text
+
+    def list_directory(path: str = '.') -> str:
+        entries = []
+        with os.scandir(os.path.expanduser(path)) as it:
+            for entry in sorted(it, key=lambda e: e.name):
+                entries.append(entry.name + ('/' if entry.is_dir() else ''))
+        return "\n".join(entries)
+
+    return ToolRegistry([
+        Tool(
+            'execute_command',
+            "Run a shell command on the user's computer and return its output.",
+            execute,
+            {
+                'command': {'type': 'string', 'description': 'The shell command to run.'},
+                'fresh': {'type': 'boolean',
+                          'description': 'Re-run even if a recent result of this read-only command is cached.'},
+            },
+            ['command'],
+            read_only=lambda arguments: is_read_only_command(arguments['command']),
+        ),
+        Tool(
+            'list_processes',
+            "List running processes, optionally filtered and sorted.",
+            processes,
+            {
+                'fields': {'type': 'array', 'items': {'type': 'string', 'enum': list(PROCESS_FIELDS)},
+                           'description': 'Columns to return (default: pid, name, username).'},
+                'name': {'type': 'string', 'description': 'Regular expression matched against the process name.'},
+                'user': {'type': 'string', 'description': 'Only processes owned by this user.'},
+                'min_cpu': {'type': 'number', 'description': 'Only processes using at least this CPU percentage.'},
+                'sort': {'type': 'string', 'enum': list(PROCESS_FIELDS), 'description': 'Field to sort by.'},
+                'limit': {'type': 'integer', 'description': 'Maximum number of processes to return.'},
+            },
+            read_only=True,
+        ),
+        Tool(
+            'read_file',
+            "Read a text file.",
+            read_file,
+            {'path': {'type': 'string', 'description': 'Path of the file to read.'}},
+            ['path'],
+            read_only=True,
+        ),
+        Tool(
+            'list_directory',
+            "List the entries of a directory; subdirectories end with '/'.",
+            list_directory,
+            {'path': {'type': 'string', 'description': 'Directory to list (default: current directory).'}},
+            read_only=True,
+        ),
+        # In-process probes: much cheaper than the equivalent shell commands.
+        Tool(
+            'system_info',
+            "Operating system, kernel release, architecture, hostname, logged-in users and uptime in seconds.",
+            lambda: format_probe(system_info()),
+            read_only=True,
+        ),
+        Tool(
+            'cpu_usage',
+            "CPU count, current usage in percent overall and per CPU, load average and frequency.",
+            lambda: format_probe(cpu_info()),
+            read_only=True,
+        ),
+        Tool(
+            'memory_usage',
+            "Total, available and used RAM and swap.",
+            lambda: format_probe(memory_info()),
+            read_only=True,
+        ),
+        Tool(
+            'disk_usage',
+            "Size, used and free space of every mounted filesystem, or of the one holding a path.",
+            lambda path=None: format_probe(disk_usage(path)),
+            {'path': {'type': 'string', 'description': 'Only the filesystem containing this path.'}},
+            read_only=True,
+        ),
+        Tool(
+            'network_interfaces',
+            "Network interfaces with their state, speed, MTU and IPv4, IPv6 and MAC addresses.",
+            lambda: format_probe(network_interfaces()),
+            read_only=True,
+        ),
+        Tool(
+            'file_info',
+            "Type, size, permissions, owner and modification time of a file or directory.",
+            lambda path: format_probe(file_info(path)),
+            {'path': {'type': 'string', 'description': 'Path to inspect.'}},
+            ['path'],
+            read_only=True,
+        ),
+    ], max_output_tokens=config.max_tool_output_tokens)
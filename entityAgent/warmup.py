@@ -0,0 +1,99 @@
+import threading
+import time
+from typing import Any, Optional, Union
+
+KeepAlive = Optional[Union[str, float]]
+
+
+def _load_params(keep_alive: KeepAlive) -> dict:
+    # A chat request with no messages makes Ollama load the model and return
+    # without generating anything.
+    params = {"messages": []}
+    if keep_alive is not None:
+        params["keep_alive"] = keep_alive
+    return params
+
+
+def warm_up(client: Any, model: str, keep_alive: KeepAlive = None) -> Optional[float]:
+    """
+    Load `model` into memory through `client` (an ollama Client or the
+    `ollama` module). Returns the seconds it took, or None if it failed.
+    """
+    started = time.monotonic()
+    try:
+        client.chat(model=model, **_load_params(keep_alive))
+    except Exception as e:
+        print(f"[WARN] Could not preload model '{model}': {e}")
+        return None
+    return time.monotonic() - started
+
+
+async def warm_up_async(client: Any, model: str, keep_alive: KeepAlive = None) -> Optional[float]:
+    """`warm_up` for an `ollama.AsyncClient`."""
+    started = time.monotonic()
+    try:
+        await client.chat(model=model, **_load_params(keep_alive))
+    except Exception as e:
+        print(f"[WARN] Could not preload model '{model}': {e}")
+        return None
+    return time.monotonic() - started
+
+
+def heartbeat_from_config(client: Any, config) -> Optional["ModelHeartbeat"]:
+    if not config.model_heartbeat_interval:
+        return None
+    return ModelHeartbeat(
+        client,
+        config.model,
+        interval=config.model_heartbeat_interval,
+        idle_timeout=config.model_idle_timeout,
+        keep_alive=config.keep_alive,
+    )
+
+
+class ModelHeartbeat:
+    """
+    Keeps a model resident while it is in use. Every `interval` seconds a
+    background thread re-sends the empty load request, which resets Ollama's
+    keep-alive timer, as long as `touch()` was called within the last
+    `idle_timeout` seconds. Once idle, Ollama unloads the model as usual.
+    """
+
+    def __init__(self, client: Any, model: str, interval: float,
+                 idle_timeout: float = 1800, keep_alive: KeepAlive = None):
+        self.client = client
+        self.model = model
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.keep_alive = keep_alive
+        self.beats = 0
+        self._last_used = time.monotonic()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="entity-model-heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def touch(self) -> None:
+        """Record that the model was just used."""
+        self._last_used = time.monotonic()
+
+    def active(self) -> bool:
+        return time.monotonic() - self._last_used <= self.idle_timeout
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            if self.active():
+                try:
+                    self.client.chat(model=self.model, **_load_params(self.keep_alive))
+                    self.beats += 1
+                except Exception as e:
+                    print(f"[WARN] Model keep-alive failed: {e}")
@@ -0,0 +1,175 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Dict, Optional
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a request cannot be queued. `status` is 429 when the client
+    already has too many requests waiting and 503 when the whole queue is
+    full; `retry_after` is a whole-second estimate of when to try again.
+    """
+
+    def __init__(self, message: str, status: int, retry_after: int):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Slot:
+    """A request's place in a model's queue; see `AdmissionController.enter`."""
+
+    def __init__(self, queue: "_ModelQueue", client: str):
+        self.queue = queue
+        self.client = client
+        self.admitted = asyncio.Event()
+        self.started = 0.0
+        self.released = False
+
+    async def wait(self) -> AsyncIterator[int]:
+        """Yield this request's 1-based queue position whenever it changes, until admitted."""
+        last = None
+        while not self.admitted.is_set():
+            # Taken before yielding, so a change made meanwhile is not missed.
+            changed = self.queue.changed
+            position = self.queue.position(self)
+            if position != last:
+                last = position
+                yield position
+            await changed.wait()
+
+    async def ready(self) -> None:
+        """Wait until admitted, ignoring position updates."""
+        await self.admitted.wait()
+
+    def release(self) -> None:
+        """Give the place back; later calls do nothing."""
+        if not self.released:
+            self.released = True
+            self.queue.leave(self)
+
+    async def __aenter__(self) -> "Slot":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.release()
+
+
+class _ModelQueue:
+    """Running requests and per-client waiting lines for one model."""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.running = 0
+        # client -> its waiting slots; the first client is served next.
+        self.waiting: "OrderedDict[str, deque]" = OrderedDict()
+        self.changed = asyncio.Event()
+        # Moving average of seconds a request holds its slot.
+        self.service_time = 5.0
+
+    def depth(self) -> int:
+        return sum(len(line) for line in self.waiting.values())
+
+    def position(self, slot: Slot) -> int:
+        """Requests served before `slot` under round-robin, plus one."""
+        clients = list(self.waiting)
+        if slot.client not in self.waiting:
+            return 0
+        index = self.waiting[slot.client].index(slot)
+        mine = clients.index(slot.client)
+        ahead = 0
+        for order, client in enumerate(clients):
+            turns = index + 1 if order < mine else index
+            ahead += min(len(self.waiting[client]), turns)
+        return ahead + 1
+
+    def enqueue(self, slot: Slot) -> None:
+        if self.running < self.concurrency and not self.waiting:
+            self._admit(slot)
+        else:
+            self.waiting.setdefault(slot.client, deque()).append(slot)
+
+    def leave(self, slot: Slot) -> None:
+        if slot.admitted.is_set():
+            self.running -= 1
+            elapsed = time.monotonic() - slot.started
+            self.service_time = 0.8 * self.service_time + 0.2 * elapsed
+        else:
+            line = self.waiting.get(slot.client)
+            if line is not None and slot in line:
+                line.remove(slot)
+                if not line:
+                    del self.waiting[slot.client]
+        self._dispatch()
+
+    def _admit(self, slot: Slot) -> None:
+        self.running += 1
+        slot.started = time.monotonic()
+        slot.admitted.set()
+
+    def _dispatch(self) -> None:
+        # Serve clients in rotation so one busy client cannot starve others,
+        # then wake every waiter to re-read its position.
+        while self.running < self.concurrency and self.waiting:
+            client, line = next(iter(self.waiting.items()))
+            self._admit(line.popleft())
+            if line:
+                self.waiting.move_to_end(client)
+            else:
+                del self.waiting[client]
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class AdmissionController:
+    """
+    Bounded queue in front of the LLM. Each model runs at most
+    `concurrency` requests at once (or its entry in `per_model`); the rest
+    wait in per-client lines served round-robin. A request is rejected
+    when its client already has `max_per_client` waiting, or when
+    `max_queue` requests are waiting for the model.
+    """
+
+    def __init__(self, concurrency: int = 2, max_queue: int = 64, max_per_client: int = 4,
+                 per_model: Optional[Dict[str, int]] = None):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_per_client = max_per_client
+        self.per_model = per_model or {}
+        self._queues: Dict[str, _ModelQueue] = {}
+
+    @classmethod
+    def from_config(cls, config) -> "AdmissionController":
+        return cls(
+            concurrency=config.chat_concurrency,
+            max_queue=config.chat_queue_size,
+            max_per_client=config.chat_queue_per_client,
+            per_model=config.model_concurrency,
+        )
+
+    def enter(self, model: str, client: str) -> Slot:
+        """
+        Queue a request for `model` from `client` and return its Slot, to be
+        used as `async with` so the place is always given back. Raises
+        QueueFullError instead of queueing when over a limit.
+        """
+        queue = self._queues.get(model)
+        if queue is None:
+            queue = self._queues[model] = _ModelQueue(self.per_model.get(model, self.concurrency))
+        has_capacity = queue.running < queue.concurrency and not queue.waiting
+        if not has_capacity:
+            if len(queue.waiting.get(client, ())) >= self.max_per_client:
+                raise QueueFullError("Too many requests from this client are already waiting.", 429,
+                                     self._retry_after(queue, len(queue.waiting[client])))
+            if queue.depth() >= self.max_queue:
+                raise QueueFullError("The server is busy; try again shortly.", 503,
+                                     self._retry_after(queue, queue.depth()))
+        slot = Slot(queue, client)
+        queue.enqueue(slot)
+        return slot
+
+    @staticmethod
+    def _retry_after(queue: _ModelQueue, ahead: int) -> int:
+        return max(1, math.ceil(queue.service_time * (ahead + 1) / max(queue.concurrency, 1)))
@@ -1,22 +1,114 @@
 import os
-from fastapi import FastAPI, HTTPException
+import json
+import uuid
+import asyncio
+import functools
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
-import ollama
+from typing import List, Optional, Tuple
+from entityAgent.agent import Agent
+from entityAgent.backends import AsyncPoolClient, BackendPool, PoolClient
+from entityAgent.command_cache import command_cache_from_config
 from entityAgent.config import load_config
-from entityAgent.platform_interaction import execute_command, list_processes
+from entityAgent.llm import AsyncCachingClient, close_client, make_async_client, make_client
+from entityAgent.platform_interaction import (
+    AsyncCommandStream, DEFAULT_PROCESS_FIELDS, PROCESS_FIELDS, execute_command_async, get_operating_system,
+    list_processes, query_processes,
+)
+from entityAgent.process_sampler import ProcessSampler, SNAPSHOT_FIELDS
+from entityAgent.prompt import PrefixCacheStats, context_from_config
+from entityAgent.tools import default_registry
+from entityAgent.warmup import heartbeat_from_config, warm_up_async
+from entityAgent.web.admission import AdmissionController, QueueFullError
+from entityAgent.web.sessions import SessionStore
 
-app = FastAPI()
 config = load_config()
 
+# Handlers must never block the event loop: the LLM is reached through the
+# async client, shell commands run as asyncio subprocesses, and psutil scans
+# and session-store reads and writes are pushed onto small, bounded thread pools.
+# Ollama clients keep pooled connections open between requests. The async
+# one is created in `lifespan`, on the server's event loop, and every client
+# is closed on shutdown. With several backends configured, chats are
+# balanced across them and the model is loaded and kept alive on each.
+backend_pool = BackendPool.from_config(config)
+if backend_pool:
+    llm_client = AsyncCachingClient.from_config(AsyncPoolClient(backend_pool), config)
+    load_client = PoolClient(backend_pool, broadcast=True)
+else:
+    llm_client = AsyncCachingClient.from_config(None, config)
+    load_client = make_client(config)
+# Chats wait here for a free model slot, so bursts queue instead of piling onto Ollama.
+admission = AdmissionController.from_config(config)
+# Limits commands running at once; created in `lifespan`, on the server's
+# event loop (before Python 3.10 a semaphore binds to the loop it is made on).
+command_slots: Optional[asyncio.Semaphore] = None
+process_pool = ThreadPoolExecutor(max_workers=config.max_concurrency, thread_name_prefix="entity-psutil")
+sessions = SessionStore(**config.session_store_options())
+# With session_db every session call may touch SQLite; one thread keeps them in order.
+store_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="entity-sessions")
+# Commands streaming to a client, by job ID, so they can be cancelled.
+running_commands = {}
+# One shared process table for every /api/processes poller, started on first use.
+process_sampler = ProcessSampler(interval=config.process_sample_interval)
+# Keeps the model loaded while chats keep coming; pings run on their own thread.
+heartbeat = heartbeat_from_config(load_client, config)
+# Read-only command results reused by chats; any other command clears them.
+command_cache = command_cache_from_config(config)
+# Chats run the same agent as the CLI; its tool calls run on these workers.
+tools = default_registry(config, cache=command_cache)
+tool_pool = ThreadPoolExecutor(max_workers=config.tool_workers, thread_name_prefix="entity-tool")
+os_name = get_operating_system()
+# Cleared once the model turns out not to support tool calling.
+native_tools = config.native_tools
+# Share of prompt tokens Ollama reused from its KV cache, over all chats.
+prefix_cache = PrefixCacheStats()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global command_slots
+    command_slots = asyncio.Semaphore(config.max_concurrency)
+    if backend_pool:
+        async_load_client = AsyncPoolClient(backend_pool, broadcast=True)
+    else:
+        async_load_client = llm_client.client = make_async_client(config)
+    warmup = None
+    if config.model_warmup:
+        # Preload in the background so the server accepts requests right away
+        warmup = asyncio.create_task(warm_up_async(async_load_client, config.model, config.keep_alive))
+    if heartbeat:
+        heartbeat.start()
+    if backend_pool:
+        backend_pool.start()
+    yield
+    process_sampler.stop()
+    if heartbeat:
+        heartbeat.stop()
+    if warmup:
+        warmup.cancel()
+    if backend_pool:
+        await backend_pool.aclose()
+    else:
+        await close_client(async_load_client)
+        close_client(load_client)
+
+
+app = FastAPI(lifespan=lifespan)
+
 # Serve static files
 app.mount("/static", StaticFiles(directory=os.path.join(os.path.dirname(__file__), "static")), name="static")
 
 class ChatRequest(BaseModel):
     message: str
-    history: List[dict]
+    # Clients send only the new message plus the session ID returned by the
+    # previous turn. `history` is still accepted to seed a new session.
+    session_id: Optional[str] = None
+    history: Optional[List[dict]] = None
 
 class CommandRequest(BaseModel):
     command: str
@@ -25,19 +117,147 @@ class CommandRequest(BaseModel):
 async def read_root():
     return FileResponse(os.path.join(os.path.dirname(__file__), "static", "index.html"))
 
+def _admit(http_request: Request):
+    """Queue a chat for the model, or refuse it with 429/503 and Retry-After."""
+    client = http_request.client.host if http_request.client else "unknown"
+    try:
+        return admission.enter(config.model, client)
+    except QueueFullError as e:
+        raise HTTPException(status_code=e.status, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+def _agent(history: List[dict], stream: bool = False) -> Tuple[Agent, List[dict]]:
+    """An agent continuing `history`, and the list its new messages are collected in."""
+    if llm_client.client is None:
+        raise RuntimeError("The Ollama client is not set up: the app's lifespan hook has not run. "
+                           "Serve it with an ASGI server such as uvicorn.")
+    context = context_from_config(config, os_name, native_tools)
+    for message in history:
+        context.append(message)
+    agent = Agent(llm_client, config.model, context, tools=tools, native_tools=native_tools, os_name=os_name,
+                  executor=tool_pool, stream=stream, hooks=[prefix_cache.hook])
+    added = []
+    agent.hooks.append(lambda event, data: added.append(data["message"]) if event == "message" else None)
+    return agent, added
+
+async def _store(function, *args):
+    """Run a SessionStore call on `store_pool`, off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(store_pool, functools.partial(function, *args))
+
+async def _finish(agent: Agent, added: List[dict], session_id: str) -> None:
+    """Save the turn to its session and remember if the model lacks tool calling."""
+    global native_tools
+    if not agent.native_tools:
+        native_tools = False
+    await _store(sessions.append, session_id, *added)
+
 @app.post("/api/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
+    if heartbeat:
+        heartbeat.touch()
+    slot = _admit(http_request)
     try:
-        messages = request.history + [{"role": "user", "content": request.message}]
-        response = ollama.chat(model=config.model, messages=messages)
-        return {"response": response['message']['content']}
+        async with slot:
+            await slot.ready()
+            session_id, history = await _store(sessions.get_or_create, request.session_id, request.history)
+            agent, added = _agent(history)
+            reply = await agent.run(request.message)
+            await _finish(agent, added, session_id)
+            return {"response": reply, "session_id": session_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+class AdmittedStream(StreamingResponse):
+    """
+    A streamed reply holding an admission slot. The slot is given back when
+    the response ends however it ends, including when the client went away
+    before the body (and so the generator that normally releases it) started.
+    """
+
+    def __init__(self, content, slot, **kwargs):
+        super().__init__(content, **kwargs)
+        self.slot = slot
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.slot.release()
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """
+    Stream the reply as newline-delimited JSON: {"session_id": "..."} first,
+    {"queued": n} whenever the request's place in the queue changes, then
+    {"token": "..."} per Ollama chunk, {"tool_call": {"name", "arguments"}}
+    and {"tool_result": {"name", "result"}} around each tool the model
+    runs, then {"done": true}. Errors raised mid-stream are reported as
+    {"error": "..."}.
+    """
+    if heartbeat:
+        heartbeat.touch()
+    slot = _admit(http_request)
+    try:
+        session_id, history = await _store(sessions.get_or_create, request.session_id, request.history)
+    except Exception:
+        slot.release()
+        raise
+
+    async def generate():
+        async with slot:
+            yield json.dumps({"session_id": session_id}) + "\n"
+            async for position in slot.wait():
+                yield json.dumps({"queued": position}) + "\n"
+            agent, added = _agent(history, stream=True)
+            try:
+                async for event, data in agent.events(request.message):
+                    if event == "token":
+                        yield json.dumps({"token": data["token"]}) + "\n"
+                    elif event == "tool_call":
+                        yield json.dumps({"tool_call": data}) + "\n"
+                    elif event == "tool_result":
+                        yield json.dumps({"tool_result": {"name": data["name"], "result": data["result"]}}) + "\n"
+                await _finish(agent, added, session_id)
+                yield json.dumps({"done": True}) + "\n"
+            except Exception as e:
+                yield json.dumps({"error": str(e)}) + "\n"
+
+    return AdmittedStream(generate(), slot, media_type="application/x-ndjson")
+
+@app.get("/api/stats")
+async def stats():
+    """How much of the chats' prompts Ollama reused from its KV cache (`hit_rate`, estimated)."""
+    return {"prefix_cache": prefix_cache.as_dict()}
+
+@app.get("/api/sessions")
+async def list_sessions(limit: int = 20):
+    """The most recently active sessions, newest first."""
+    return {"sessions": await _store(sessions.list_sessions, limit)}
+
+@app.get("/api/sessions/{session_id}/messages")
+async def session_messages(session_id: str, limit: int = 50, before: Optional[int] = None):
+    """
+    A page of a session's messages for redisplaying it: the latest `limit`
+    before position `before` (each message carries its position as `seq`),
+    and whether older ones remain. Pages are fetched from the newest back.
+    """
+    page = await _store(sessions.messages, session_id, limit, before)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    messages, more = page
+    return {"session_id": session_id, "messages": messages, "more": more}
+
+@app.delete("/api/sessions/{session_id}")
+async def delete_session(session_id: str):
+    await _store(sessions.delete, session_id)
+    return {"deleted": session_id}
+
 @app.post("/api/execute")
 async def execute(request: CommandRequest):
     try:
-        stdout, stderr, return_code = execute_command(request.command)
+        async with command_slots:
+            stdout, stderr, return_code = await execute_command_async(request.command, **config.command_limits(unattended=True))
+        if command_cache:
+            command_cache.invalidate(request.command)
         return {
             "stdout": stdout,
             "stderr": stderr,
@@ -46,10 +266,112 @@ async def execute(request: CommandRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/execute/stream")
+async def execute_stream(request: CommandRequest):
+    """
+    Stream command output as newline-delimited JSON: {"job_id": "..."} first,
+    then {"stream": "stdout"|"stderr", "line": "..."} per line, then
+    {"return_code": ..., "truncated": ..., "timed_out": ..., "cancelled": ...}.
+    Lines stop once `max_command_output_bytes` have been streamed; the
+    command still runs to the end and `truncated` is set.
+    The command is killed if the client disconnects or cancels the job.
+    """
+    job_id = uuid.uuid4().hex
+    stream = AsyncCommandStream(request.command, **config.command_limits(unattended=True))
+
+    async def generate():
+        running_commands[job_id] = stream
+        try:
+            yield json.dumps({"job_id": job_id}) + "\n"
+            streamed, dropped = 0, False
+            async with command_slots:
+                async for name, line in stream:
+                    streamed += len(line.encode()) + 1
+                    if streamed > config.max_command_output_bytes:
+                        dropped = True  # Past the cap: keep draining, stop sending
+                        continue
+                    yield json.dumps({"stream": name, "line": line}) + "\n"
+            yield json.dumps({
+                "return_code": stream.returncode,
+                "truncated": stream.truncated or dropped,
+                "timed_out": stream.timed_out,
+                "cancelled": stream.cancelled,
+            }) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+        finally:
+            running_commands.pop(job_id, None)
+            if command_cache:
+                command_cache.invalidate(request.command)
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.post("/api/execute/{job_id}/cancel")
+async def cancel_execution(job_id: str):
+    stream = running_commands.get(job_id)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="No running command with that job ID")
+    stream.cancel()
+    return {"cancelled": job_id}
+
+async def _process_snapshot():
+    if not process_sampler.running:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(process_pool, process_sampler.start)
+    return process_sampler.snapshot()
+
 @app.get("/api/processes")
-async def get_processes():
+async def get_processes(
+    request: Request,
+    fields: Optional[str] = None,
+    name: Optional[str] = None,
+    user: Optional[str] = None,
+    min_cpu: Optional[float] = None,
+    sort: Optional[str] = None,
+    limit: Optional[int] = None,
+):
+    """
+    List processes. `fields` is a comma-separated list of PROCESS_FIELDS;
+    the other parameters filter, sort and limit as in list_processes.
+
+    Results come from the background sampler's snapshot and carry its version
+    as an ETag, so pollers sending If-None-Match get 304 until the next change.
+    Fields the sampler does not track (e.g. cmdline) fall back to a live scan.
+    """
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(DEFAULT_PROCESS_FIELDS)
+    unknown = set(field_list) - PROCESS_FIELDS.keys()
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown process field(s): {', '.join(sorted(unknown))}")
+    options = {"fields": field_list, "name": name, "user": user, "min_cpu": min_cpu, "sort": sort, "limit": limit}
+
+    try:
+        if not set(field_list + ([sort] if sort else [])) <= set(SNAPSHOT_FIELDS):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(process_pool, functools.partial(list_processes, **options))
+
+        version, processes = await _process_snapshot()
+        etag = f'"{version}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return JSONResponse(query_processes(processes, **options), headers={"ETag": etag})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/processes/delta")
+async def get_process_delta(request: Request, since: int = 0):
+    """
+    Changes to the sampled process table since version `since`: full rows for
+    `started` and `updated` processes plus `exited` PIDs. Clients that are too
+    far behind get `full: true` and the whole table under `processes`.
+    """
     try:
-        processes = list_processes()
-        return processes
+        await _process_snapshot()
+        delta = process_sampler.delta(since)
+        etag = f'"{delta["version"]}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return JSONResponse(delta, headers={"ETag": etag})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
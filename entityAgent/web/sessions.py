@@ -0,0 +1,223 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+# Characters of a session's first user message used as its title.
+TITLE_LENGTH = 80
+
+
+def session_title(history: List[dict]) -> Optional[str]:
+    """A session's title: the start of its first user message."""
+    for message in history:
+        if message.get('role') == 'user':
+            return " ".join((message.get('content') or '').split())[:TITLE_LENGTH]
+    return None
+
+
+class SessionStore:
+    """
+    Server-side chat history keyed by session ID.
+
+    Sessions live in an in-memory LRU that holds at most `max_sessions`
+    entries and drops any session idle for longer than `ttl` seconds.
+    When `db_path` is given, every message is also appended to a SQLite log
+    (in WAL mode, one row per message, never rewritten), so sessions pushed
+    out of memory or lost in a restart can be reloaded on demand for
+    `retention` seconds after their last message (default: `ttl`). A
+    reloaded session holds only its last `load_limit` messages; older ones
+    stay on disk, readable a page at a time with `messages`.
+    """
+
+    # Minimum seconds between sweeps of expired rows in SQLite.
+    DB_SWEEP_INTERVAL = 60
+
+    def __init__(self, max_sessions: int = 256, ttl: float = 3600, db_path: Optional[str] = None,
+                 retention: Optional[float] = None, load_limit: Optional[int] = None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.retention = retention if retention is not None else ttl
+        self.load_limit = load_limit
+        self._sessions: "OrderedDict[str, Tuple[float, List[dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._db = None
+        if db_path:
+            db_path = os.path.expanduser(db_path)
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            # Appends go to the write-ahead log instead of rewriting pages in place
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, updated REAL NOT NULL, created REAL, title TEXT);"
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "session_id TEXT NOT NULL, seq INTEGER NOT NULL, message TEXT NOT NULL, "
+                "PRIMARY KEY (session_id, seq));"
+            )
+            # Databases written before the session index had only `updated`
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(sessions)")}
+            for column in ("created REAL", "title TEXT"):
+                if column.split()[0] not in columns:
+                    self._db.execute(f"ALTER TABLE sessions ADD COLUMN {column}")
+            self._db.commit()
+
+    # ── Public API ───────────────────────────────────────────────────────────
+    def get_or_create(self, session_id: Optional[str] = None, seed: Optional[List[dict]] = None) -> Tuple[str, List[dict]]:
+        """
+        Return `(session_id, history)` for an existing session, or start a new
+        one (optionally seeded with `seed`) when the ID is unknown or expired.
+        The returned history is a copy; use `append` to extend it.
+        """
+        with self._lock:
+            self._evict_expired()
+            if session_id:
+                history = self._load(session_id)
+                if history is not None:
+                    return session_id, list(history)
+
+            session_id = uuid.uuid4().hex
+            self._store(session_id, [])
+            self._append(session_id, list(seed or []))
+            return session_id, list(seed or [])
+
+    def append(self, session_id: str, *messages: dict) -> None:
+        """Append messages to a session, creating it if it has expired meanwhile."""
+        with self._lock:
+            if self._load(session_id) is None:
+                self._store(session_id, [])
+            self._append(session_id, list(messages))
+
+    def messages(self, session_id: str, limit: int = 50,
+                 before: Optional[int] = None) -> Optional[Tuple[List[dict], bool]]:
+        """
+        Up to `limit` of a session's messages, newest last, that come before
+        position `before` (default: the end), each with its position as
+        `seq`; and whether older ones remain. None for an unknown session.
+        """
+        with self._lock:
+            if self._db:
+                if not self._known(session_id):
+                    return None
+                rows = self._db.execute(
+                    "SELECT seq, message FROM messages WHERE session_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+                    (session_id, before if before is not None else 2 ** 62, limit + 1),
+                ).fetchall()
+                page = [{**json.loads(message), 'seq': seq} for seq, message in reversed(rows[:limit])]
+                return page, len(rows) > limit
+
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            history = entry[1]
+            end = len(history) if before is None else max(0, min(before, len(history)))
+            start = max(0, end - limit)
+            return [{**message, 'seq': seq} for seq, message in enumerate(history[start:end], start)], start > 0
+
+    def list_sessions(self, limit: int = 20) -> List[dict]:
+        """The most recently updated sessions: `id`, `title`, `created`, `updated` and `messages` (a count)."""
+        with self._lock:
+            if self._db:
+                rows = self._db.execute(
+                    "SELECT id, title, created, updated, "
+                    "(SELECT COUNT(*) FROM messages WHERE session_id = sessions.id) "
+                    "FROM sessions WHERE updated >= ? ORDER BY updated DESC LIMIT ?",
+                    (time.time() - self.retention, limit),
+                ).fetchall()
+                return [dict(zip(('id', 'title', 'created', 'updated', 'messages'), row)) for row in rows]
+
+            offset = time.time() - time.monotonic()
+            return [
+                {'id': session_id, 'title': session_title(history), 'created': None,
+                 'updated': last_used + offset, 'messages': len(history)}
+                for session_id, (last_used, history) in reversed(list(self._sessions.items())[-limit:])
+            ]
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            if self._db:
+                self._db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+                self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+                self._db.commit()
+
+    def close(self) -> None:
+        if self._db:
+            self._db.close()
+            self._db = None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    # ── Internals (caller holds the lock) ────────────────────────────────────
+    def _known(self, session_id: str) -> bool:
+        row = self._db.execute("SELECT updated FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return bool(row) and time.time() - row[0] <= self.retention
+
+    def _load(self, session_id: str) -> Optional[List[dict]]:
+        entry = self._sessions.get(session_id)
+        if entry is not None:
+            self._store(session_id, entry[1])
+            return entry[1]
+
+        if self._db and self._known(session_id):
+            # Newest messages first, so a long session is cut at its start
+            rows = self._db.execute(
+                "SELECT message FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+                (session_id, self.load_limit if self.load_limit is not None else -1),
+            ).fetchall()
+            history = [json.loads(message) for (message,) in reversed(rows)]
+            if self.load_limit is not None and len(history) == self.load_limit:
+                # Start at a user turn rather than in the middle of a tool call
+                first = next((i for i, m in enumerate(history) if m.get('role') == 'user'), 0)
+                history = history[first:]
+            self._store(session_id, history)
+            return history
+        return None
+
+    def _store(self, session_id: str, history: List[dict]) -> None:
+        self._sessions[session_id] = (time.monotonic(), history)
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def _append(self, session_id: str, messages: List[dict]) -> None:
+        self._sessions[session_id][1].extend(messages)
+        if self._db:
+            now = time.time()
+            self._db.execute(
+                "INSERT INTO sessions (id, updated, created, title) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET updated = excluded.updated, "
+                "title = COALESCE(sessions.title, excluded.title)",
+                (session_id, now, now, session_title(messages)),
+            )
+            # Positions continue from the log, which may hold more than memory does
+            self._db.executemany(
+                "INSERT INTO messages (session_id, seq, message) VALUES "
+                "(?, (SELECT COALESCE(MAX(seq), -1) + 1 FROM messages WHERE session_id = ?), ?)",
+                [(session_id, session_id, json.dumps(m)) for m in messages],
+            )
+            self._db.commit()
+
+    def _evict_expired(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        while self._sessions:
+            session_id, (last_used, _) = next(iter(self._sessions.items()))
+            if last_used >= cutoff:
+                break  # LRU order: every remaining session is newer
+            del self._sessions[session_id]
+
+        if self._db and time.monotonic() - self._last_sweep >= self.DB_SWEEP_INTERVAL:
+            self._last_sweep = time.monotonic()
+            db_cutoff = time.time() - self.retention
+            self._db.execute(
+                "DELETE FROM messages WHERE session_id IN (SELECT id FROM sessions WHERE updated < ?)",
+                (db_cutoff,),
+            )
+            self._db.execute("DELETE FROM sessions WHERE updated < ?", (db_cutoff,))
+            self._db.commit()
@@ -2,7 +2,18 @@ const chatContainer = document.getElementById('chat-container');
 const userInput = document.getElementById('user-input');
 const sendBtn = document.getElementById('send-btn');
 
-let history = [];
+const newChatBtn = document.getElementById('new-chat-btn');
+
+// The server keeps the conversation; we only remember which one is ours,
+// across reloads too.
+const SESSION_KEY = 'entitySessionId';
+// Stored messages fetched per request when redisplaying a session.
+const HISTORY_PAGE = 20;
+// Characters of command output kept and rendered; the server stops sending
+// lines at its own byte cap, this bounds the page however that is set.
+const MAX_OUTPUT_CHARS = 200000;
+let sessionId = localStorage.getItem(SESSION_KEY);
+let loadMoreBtn = null;
 
 // Auto-resize textarea
 userInput.addEventListener('input', function() {
@@ -20,6 +31,77 @@ userInput.addEventListener('keydown', function(e) {
 
 sendBtn.addEventListener('click', sendMessage);
 
+newChatBtn.addEventListener('click', () => {
+    localStorage.removeItem(SESSION_KEY);
+    location.reload();
+});
+
+if (sessionId) loadHistory();
+
+function setSession(id) {
+    sessionId = id;
+    localStorage.setItem(SESSION_KEY, id);
+}
+
+// The error a failed request should show: the server's `detail` (a message,
+// or FastAPI's list of validation errors) and when to retry, if it says.
+async function responseError(response) {
+    let detail = `${response.status} ${response.statusText}`.trim();
+    try {
+        const body = await response.json();
+        if (typeof body.detail === 'string') detail = body.detail;
+        else if (Array.isArray(body.detail)) detail = body.detail.map(error => error.msg).join('; ');
+    } catch (e) {
+        // Not JSON, e.g. a proxy's error page: keep the status line
+    }
+    const retryAfter = response.headers.get('Retry-After');
+    return new Error(`${detail}${retryAfter ? ` (retry in ${retryAfter}s)` : ''}`);
+}
+
+// Show a page of the session's stored messages above those already shown,
+// newest page first, so a long conversation appears without loading it all.
+async function loadHistory(before) {
+    const query = before === undefined ? '' : `&before=${before}`;
+    const response = await fetch(`/api/sessions/${sessionId}/messages?limit=${HISTORY_PAGE}${query}`);
+    if (!response.ok) {
+        // Expired or deleted on the server: the next message starts a new session
+        sessionId = null;
+        localStorage.removeItem(SESSION_KEY);
+        return;
+    }
+    const { messages, more } = await response.json();
+    if (loadMoreBtn) loadMoreBtn.remove();
+    if (!messages.length) return;
+
+    const welcome = document.querySelector('.welcome-message');
+    if (welcome) welcome.remove();
+    const anchor = chatContainer.firstChild;
+    for (const message of messages) addStoredMessage(message, anchor);
+
+    if (more) {
+        loadMoreBtn = document.createElement('button');
+        loadMoreBtn.className = 'load-more-btn';
+        loadMoreBtn.textContent = 'Load earlier messages';
+        loadMoreBtn.addEventListener('click', () => loadHistory(messages[0].seq));
+        chatContainer.insertBefore(loadMoreBtn, chatContainer.firstChild);
+    }
+}
+
+function addStoredMessage(message, before) {
+    if (message.role === 'user') {
+        addMessage(message.content, 'user', before);
+    } else if (message.role === 'assistant') {
+        if (message.content) addMessage(message.content, 'assistant', before);
+        for (const call of message.tool_calls || []) {
+            const { name, arguments: args } = call.function;
+            addMessage(`Running \`${name}\` ${JSON.stringify(args || {})}`, 'assistant', before);
+        }
+    } else {
+        // Tool results and command output
+        addMessage(`\`\`\`\n${message.content}\n\`\`\``, 'assistant', before);
+    }
+}
+
 async function sendMessage() {
     const text = userInput.value.trim();
     if (!text) return;
@@ -44,7 +126,7 @@ async function sendMessage() {
     }
 }
 
-function addMessage(content, role) {
+function addMessage(content, role, before = null) {
     const div = document.createElement('div');
     div.className = `message ${role}`;
     
@@ -58,8 +140,9 @@ function addMessage(content, role) {
     }
     
     div.appendChild(contentDiv);
-    chatContainer.appendChild(div);
-    chatContainer.scrollTop = chatContainer.scrollHeight;
+    chatContainer.insertBefore(div, before);
+    if (!before) chatContainer.scrollTop = chatContainer.scrollHeight;
+    return contentDiv;
 }
 
 async function sendChat(message) {
@@ -69,21 +152,70 @@ async function sendChat(message) {
     loadingDiv.innerHTML = '<div class="message-content">Typing...</div>';
     chatContainer.appendChild(loadingDiv);
 
+    let contentDiv = null;
+    let reply = '';
+
     try {
-        const response = await fetch('/api/chat', {
+        const response = await fetch('/api/chat/stream', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ message, history })
+            body: JSON.stringify({ message, session_id: sessionId })
         });
-        
-        const data = await response.json();
-        loadingDiv.remove();
-        
-        if (data.response) {
-            addMessage(data.response, 'assistant');
-            history.push({ role: 'user', content: message });
-            history.push({ role: 'assistant', content: data.response });
+
+        // Refused by admission control (429/503, with Retry-After), invalid, or failed
+        if (!response.ok) throw await responseError(response);
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+
+            for (const line of lines) {
+                if (!line.trim()) continue;
+                const event = JSON.parse(line);
+
+                if (event.error) throw new Error(event.error);
+                if (event.session_id) setSession(event.session_id);
+                if (event.queued) {
+                    loadingDiv.firstChild.textContent = `Waiting in queue (position ${event.queued})...`;
+                    continue;
+                }
+                if (event.tool_call) {
+                    // Tokens after a tool call start a new reply bubble
+                    contentDiv = null;
+                    reply = '';
+                    loadingDiv.remove();
+                    addMessage(`Running \`${event.tool_call.name}\` ${JSON.stringify(event.tool_call.arguments || {})}`, 'assistant');
+                    continue;
+                }
+                if (event.tool_result) {
+                    addMessage(`\`\`\`\n${event.tool_result.result}\n\`\`\``, 'assistant');
+                    // Show the indicator again while the model reads the result
+                    loadingDiv.firstChild.textContent = 'Typing...';
+                    chatContainer.appendChild(loadingDiv);
+                    continue;
+                }
+                if (!event.token) continue;
+
+                // Swap the loading indicator for the reply bubble on the first token
+                if (!contentDiv) {
+                    loadingDiv.remove();
+                    contentDiv = addMessage('', 'assistant');
+                }
+                reply += event.token;
+                contentDiv.innerHTML = marked.parse(reply);
+                chatContainer.scrollTop = chatContainer.scrollHeight;
+            }
         }
+
+        loadingDiv.remove();
     } catch (error) {
         loadingDiv.remove();
         addMessage(`Error: ${error.message}`, 'assistant');
@@ -96,25 +228,102 @@ async function executeCommand(command) {
     loadingDiv.innerHTML = '<div class="message-content">Executing...</div>';
     chatContainer.appendChild(loadingDiv);
 
+    let contentDiv = null;
+    let output = '';
+    let jobId = null;
+
+    // Cancelling kills the command's whole process group on the server
+    const cancelBtn = document.createElement('button');
+    cancelBtn.className = 'cancel-btn';
+    cancelBtn.textContent = 'Cancel';
+    cancelBtn.addEventListener('click', () => {
+        if (jobId) fetch(`/api/execute/${jobId}/cancel`, { method: 'POST' });
+    });
+    loadingDiv.appendChild(cancelBtn);
+
+    let capped = false;
+    let frame = null;
+
+    const append = (text) => {
+        if (capped) return;
+        if (output.length + text.length > MAX_OUTPUT_CHARS) {
+            text = text.slice(0, MAX_OUTPUT_CHARS - output.length) + '\n[output truncated]\n';
+            capped = true;
+        }
+        output += text;
+    };
+
+    const render = () => {
+        frame = null;
+        if (!contentDiv) {
+            loadingDiv.remove();
+            contentDiv = addMessage('', 'assistant');
+            contentDiv.parentElement.appendChild(cancelBtn);
+        }
+        contentDiv.innerHTML = marked.parse(`\`\`\`bash\n${output}\n\`\`\``);
+        chatContainer.scrollTop = chatContainer.scrollHeight;
+    };
+
+    // Lines arrive far faster than the screen refreshes: render at most once a frame
+    const scheduleRender = () => {
+        if (frame === null) frame = requestAnimationFrame(render);
+    };
+    const flush = () => {
+        if (frame === null) return;
+        cancelAnimationFrame(frame);
+        render();
+    };
+
     try {
-        const response = await fetch('/api/execute', {
+        const response = await fetch('/api/execute/stream', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ command })
         });
-        
-        const data = await response.json();
+        if (!response.ok) throw await responseError(response);
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+
+            for (const line of lines) {
+                if (!line.trim()) continue;
+                const event = JSON.parse(line);
+
+                if (event.error) throw new Error(event.error);
+                if (event.job_id) {
+                    jobId = event.job_id;
+                    continue;
+                }
+                if (event.line !== undefined) {
+                    append((event.stream === 'stderr' ? '[stderr] ' : '') + event.line + '\n');
+                } else if ('return_code' in event) {
+                    // Status notes go after the output even when it was capped
+                    if (event.truncated && !capped) output += '[output truncated]\n';
+                    if (event.timed_out) output += '[timed out]\n';
+                    if (event.cancelled) output += '[cancelled]\n';
+                    if (event.return_code !== 0) output += `[exit code ${event.return_code}]\n`;
+                    if (!output) output = 'Command executed successfully (no output).';
+                }
+                scheduleRender();
+            }
+        }
+
+        flush();
         loadingDiv.remove();
-        
-        let output = '';
-        if (data.stdout) output += data.stdout;
-        if (data.stderr) output += `\nError:\n${data.stderr}`;
-        if (!output) output = 'Command executed successfully (no output).';
-
-        addMessage(`\`\`\`bash\n${output}\n\`\`\``, 'assistant');
-        
     } catch (error) {
+        flush();
         loadingDiv.remove();
         addMessage(`Error: ${error.message}`, 'assistant');
+    } finally {
+        cancelBtn.remove();
     }
 }
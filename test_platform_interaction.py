@@ -1,9 +1,19 @@
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+import asyncio
+import re
+import threading
+import time
+import tempfile
 import unittest
 import platform
-from entityAgent.platform_interaction import get_operating_system, execute_command, list_processes
+import psutil
+from unittest.mock import patch
+from entityAgent.platform_interaction import (
+    get_operating_system, execute_command, execute_command_async, list_processes, query_processes,
+    CommandStream, AsyncCommandStream, OutputBuffer, CANCELLED_BEFORE_START, kill_process_tree,
+)
 
 class TestPlatformInteraction(unittest.TestCase):
 
@@ -25,6 +35,188 @@ class TestPlatformInteraction(unittest.TestCase):
         self.assertEqual(stdout, "hello")
         self.assertEqual(stderr, "")
 
+    def test_execute_command_async(self):
+        """
+        Tests that execute_command_async matches execute_command.
+        """
+        stdout, stderr, return_code = asyncio.run(execute_command_async("echo hello"))
+        self.assertEqual(return_code, 0)
+        self.assertEqual(stdout, "hello")
+        self.assertEqual(stderr, "")
+
+    @unittest.skipIf(sys.platform == 'win32', 'POSIX shell syntax')
+    def test_command_stream_yields_lines(self):
+        """
+        Tests that CommandStream yields stdout and stderr lines as they arrive.
+        """
+        stream = CommandStream("echo one && echo two >&2 && echo three")
+        lines = list(stream)
+        self.assertIn(('stdout', 'one'), lines)
+        self.assertIn(('stderr', 'two'), lines)
+        self.assertEqual(stream.returncode, 0)
+        self.assertEqual(stream.stdout, "one\nthree")
+
+    @unittest.skipIf(sys.platform == 'win32', 'POSIX shell syntax')
+    def test_command_stream_caps_retained_output(self):
+        """
+        Tests that only the head and tail of large output are retained.
+        """
+        stream = CommandStream("for i in $(seq 1 2000); do echo line$i; done", max_output_bytes=100)
+        self.assertEqual(len(list(stream)), 2000)
+        self.assertTrue(stream.truncated)
+        self.assertTrue(stream.stdout.startswith("line1\n"))
+        self.assertTrue(stream.stdout.endswith("line2000"))
+        self.assertIn("bytes omitted", stream.stdout)
+
+    @unittest.skipIf(sys.platform == 'win32', 'POSIX shell syntax')
+    def test_command_stream_timeout(self):
+        """
+        Tests that a command outliving its timeout is killed.
+        """
+        stdout, stderr, return_code = execute_command("echo started; sleep 10", timeout=0.3)
+        self.assertEqual(stdout, "started")
+        self.assertNotEqual(return_code, 0)
+        self.assertIn("timed out", stderr)
+
+    @unittest.skipIf(sys.platform == 'win32', 'POSIX shell syntax')
+    def test_timeout_kills_whole_process_group(self):
+        """
+        Tests that a timeout also kills grandchildren holding the pipes open.
+        """
+        started = time.monotonic()
+        stdout, stderr, return_code = execute_command("sleep 10 | cat", timeout=0.3)
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertIn("timed out", stderr)
+
+    @unittest.skipIf(sys.platform == 'win32', 'POSIX shell syntax')
+    def test_timeout_after_pipes_close(self):
+        """
+        Tests that the timeout still applies once a command closes its output.
+        """
+        command = "exec >/dev/null 2>&1; sleep 10"
+        for run in (lambda: execute_command(command, timeout=0.3),
+                    lambda: asyncio.run(execute_command_async(command, timeout=0.3))):
+            started = time.monotonic()
+            stdout, stderr, return_code = run()
+            self.assertLess(time.monotonic() - started, 5)
+            self.assertNotEqual(return_code, 0)
+            self.assertIn("timed out", stderr)
+
+    @unittest.skipIf(sys.platform == 'win32', 'POSIX shell syntax')
+    def test_cancel_from_another_thread(self):
+        """
+        Tests that cancel() stops a running command.
+        """
+        stream = CommandStream("sleep 10 | cat")
+        threading.Timer(0.2, stream.cancel).start()
+        started = time.monotonic()
+        list(stream)
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertTrue(stream.cancelled)
+        self.assertNotEqual(stream.returncode, 0)
+        self.assertIn("cancelled", stream.stderr)
+
+    @unittest.skipIf(sys.platform == 'win32', 'POSIX shell syntax')
+    def test_cancel_before_start(self):
+        """
+        Tests that a command cancelled before it started is never started.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            marker = os.path.join(tmp, "ran")
+            stream = CommandStream(f"touch {marker}")
+            stream.cancel()
+            self.assertEqual(list(stream), [])
+            self.assertEqual(stream.returncode, CANCELLED_BEFORE_START)
+            self.assertEqual(stream.stderr, "Command was cancelled.")
+            self.assertFalse(os.path.exists(marker))
+
+    @unittest.skipIf(sys.platform == 'win32', 'POSIX shell syntax')
+    def test_async_cancel_before_start(self):
+        """
+        Tests that AsyncCommandStream does not start a cancelled command either.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            marker = os.path.join(tmp, "ran")
+
+            async def collect():
+                stream = AsyncCommandStream(f"touch {marker}")
+                stream.cancel()
+                return [event async for event in stream], stream.returncode
+
+            self.assertEqual(asyncio.run(collect()), ([], CANCELLED_BEFORE_START))
+            self.assertFalse(os.path.exists(marker))
+
+    @unittest.skipIf(sys.platform == 'win32', 'POSIX shell syntax')
+    def test_cancel_during_spawn(self):
+        """
+        Tests that a cancel() landing while the command is spawned kills it.
+        """
+        stream = CommandStream("sleep 30")
+        real_started = stream._started
+
+        def started(pid):
+            stream.cancelled = True  # cancel() ran after the check but before the pid was known
+            real_started(pid)
+
+        started_at = time.monotonic()
+        with patch.object(stream, "_started", side_effect=started):
+            list(stream)
+        self.assertLess(time.monotonic() - started_at, 5)
+        self.assertNotEqual(stream.returncode, 0)
+
+    def test_kill_process_tree_ignores_exited_process(self):
+        """
+        Tests that killing a process that already exited is not an error.
+        """
+        with patch("entityAgent.platform_interaction.os.name", "nt"), \
+                patch("psutil.Process", side_effect=psutil.NoSuchProcess(12345)):
+            kill_process_tree(12345)
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'rlimits are applied on Linux only')
+    def test_memory_limit(self):
+        """
+        Tests that the memory rlimit stops a command from allocating past it.
+        """
+        command = f'"{sys.executable}" -c "bytearray(512 * 1024 * 1024)"'
+        stdout, stderr, return_code = execute_command(command, memory_limit=256 * 1024 * 1024)
+        self.assertNotEqual(return_code, 0)
+        self.assertIn("MemoryError", stderr)
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'rlimits are applied on Linux only')
+    def test_limits_applied_without_preexec_fn(self):
+        """
+        Tests that rlimits are set on the started process, not through a preexec_fn.
+        """
+        with patch("subprocess.Popen", wraps=__import__("subprocess").Popen) as popen:
+            stdout, stderr, return_code = execute_command("sleep 0.2; ulimit -t", cpu_limit=7)
+        self.assertEqual(stdout, "7")
+        self.assertNotIn('preexec_fn', popen.call_args.kwargs)
+
+    @unittest.skipIf(sys.platform == 'win32', 'POSIX shell syntax')
+    def test_async_command_stream(self):
+        """
+        Tests that AsyncCommandStream yields the same events.
+        """
+        async def collect():
+            stream = AsyncCommandStream("echo one && echo two >&2; exit 4")
+            return [event async for event in stream], stream.returncode
+
+        lines, return_code = asyncio.run(collect())
+        self.assertIn(('stdout', 'one'), lines)
+        self.assertIn(('stderr', 'two'), lines)
+        self.assertEqual(return_code, 4)
+
+    def test_output_buffer_keeps_head_and_tail(self):
+        """
+        Tests OutputBuffer byte accounting.
+        """
+        buffer = OutputBuffer(max_bytes=10)
+        for chunk in (b"abc", b"defgh", b"ijklmnop"):
+            buffer.add(chunk)
+        self.assertEqual(buffer.dropped_bytes, 6)
+        self.assertTrue(buffer.text().startswith("abcde"))
+        self.assertTrue(buffer.text().endswith("lmnop"))
+
     def test_list_processes(self):
         """
         Tests that the list_processes function returns a list of processes.
@@ -36,5 +228,32 @@ class TestPlatformInteraction(unittest.TestCase):
             self.assertIn('pid', processes[0])
             self.assertIn('name', processes[0])
 
+    def test_list_processes_query(self):
+        """
+        Tests field selection, filtering, sorting and limiting.
+        """
+        processes = list_processes(fields=['pid', 'cpu', 'rss'], sort='rss', limit=3, cpu_interval=0)
+        self.assertLessEqual(len(processes), 3)
+        for proc in processes:
+            self.assertEqual(set(proc), {'pid', 'cpu', 'rss'})
+        rss = [p['rss'] for p in processes if p['rss'] is not None]
+        self.assertEqual(rss, sorted(rss, reverse=True))
+
+        own = list_processes(fields=['pid'], name=re.escape(psutil.Process().name()))
+        self.assertIn({'pid': os.getpid()}, own)
+
+        self.assertEqual(list_processes(name='^no-such-process-name$'), [])
+        with self.assertRaises(ValueError):
+            list_processes(fields=['bogus'])
+
+    def test_list_processes_invalid_name_pattern(self):
+        """
+        Tests that a malformed name pattern is reported as a ValueError.
+        """
+        with self.assertRaisesRegex(ValueError, "invalid name pattern"):
+            list_processes(fields=['pid'], name='*init')
+        with self.assertRaisesRegex(ValueError, "invalid name pattern"):
+            query_processes([{'pid': 1, 'name': 'init'}], name='[init')
+
 if __name__ == '__main__':
     unittest.main()
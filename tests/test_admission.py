@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+from entityAgent.config import Config
+from entityAgent.web.admission import AdmissionController, QueueFullError
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_requests_beyond_concurrency_wait():
+    async def scenario():
+        admission = AdmissionController(concurrency=2)
+        first, second, third = (admission.enter("llama3", "a") for _ in range(3))
+        assert first.admitted.is_set() and second.admitted.is_set()
+        assert not third.admitted.is_set()
+        await first.__aexit__(None, None, None)
+        assert third.admitted.is_set()
+
+    run(scenario())
+
+
+def test_models_have_separate_limits():
+    async def scenario():
+        admission = AdmissionController(concurrency=1, per_model={"big": 1, "small": 3})
+        assert admission.enter("big", "a").admitted.is_set()
+        assert not admission.enter("big", "a").admitted.is_set()
+        assert all(admission.enter("small", "a").admitted.is_set() for _ in range(3))
+        assert admission.enter("other", "a").admitted.is_set()
+
+    run(scenario())
+
+
+def test_clients_are_served_round_robin():
+    async def scenario():
+        admission = AdmissionController(concurrency=1, max_per_client=10)
+        running = admission.enter("llama3", "busy")
+        busy = [admission.enter("llama3", "busy") for _ in range(3)]
+        quiet = admission.enter("llama3", "quiet")
+        # The quiet client's only request is second in line, not fifth
+        assert [slot.queue.position(slot) for slot in busy + [quiet]] == [1, 3, 4, 2]
+
+        order = []
+        current = running
+        for _ in range(4):
+            await current.__aexit__(None, None, None)
+            current = next(slot for slot in busy + [quiet] if slot.admitted.is_set() and slot not in order)
+            order.append(current)
+        assert order == [busy[0], quiet, busy[1], busy[2]]
+
+    run(scenario())
+
+
+def test_wait_reports_positions_until_admitted():
+    async def scenario():
+        admission = AdmissionController(concurrency=1)
+        running = admission.enter("llama3", "a")
+        ahead = admission.enter("llama3", "b")
+        slot = admission.enter("llama3", "c")
+        positions = []
+
+        async def follow():
+            async with slot:
+                async for position in slot.wait():
+                    positions.append(position)
+
+        task = asyncio.ensure_future(follow())
+        await asyncio.sleep(0)
+        await running.__aexit__(None, None, None)
+        await asyncio.sleep(0)
+        await ahead.__aexit__(None, None, None)
+        await asyncio.wait_for(task, 1)
+        assert positions == [2, 1]
+
+    run(scenario())
+
+
+def test_waiter_that_leaves_gives_up_its_place():
+    async def scenario():
+        admission = AdmissionController(concurrency=1)
+        running = admission.enter("llama3", "a")
+        leaving = admission.enter("llama3", "b")
+        staying = admission.enter("llama3", "c")
+        await leaving.__aexit__(None, None, None)
+        assert staying.queue.position(staying) == 1
+        await running.__aexit__(None, None, None)
+        assert staying.admitted.is_set()
+        assert not leaving.admitted.is_set()
+
+    run(scenario())
+
+
+def test_per_client_limit_returns_429():
+    async def scenario():
+        admission = AdmissionController(concurrency=1, max_per_client=2)
+        admission.enter("llama3", "a")
+        admission.enter("llama3", "a")
+        admission.enter("llama3", "a")
+        with pytest.raises(QueueFullError) as exc:
+            admission.enter("llama3", "a")
+        assert exc.value.status == 429
+        assert exc.value.retry_after >= 1
+        # Other clients can still queue
+        admission.enter("llama3", "b")
+
+    run(scenario())
+
+
+def test_full_queue_returns_503():
+    async def scenario():
+        admission = AdmissionController(concurrency=1, max_queue=2)
+        for client in "abc":
+            admission.enter("llama3", client)
+        with pytest.raises(QueueFullError) as exc:
+            admission.enter("llama3", "d")
+        assert exc.value.status == 503
+        # 5 s default service time, 2 waiting plus this one, one slot
+        assert exc.value.retry_after == 15
+
+    run(scenario())
+
+
+def test_from_config():
+    admission = AdmissionController.from_config(
+        Config(chat_concurrency=3, chat_queue_size=10, chat_queue_per_client=1, model_concurrency={"big": 1})
+    )
+    assert (admission.concurrency, admission.max_queue, admission.max_per_client) == (3, 10, 1)
+    assert admission.per_model == {"big": 1}
+
+
+def test_release_is_idempotent():
+    async def main():
+        admission = AdmissionController(concurrency=1)
+        slot = admission.enter("llama3", "a")
+        waiting = admission.enter("llama3", "b")
+        async with slot:
+            slot.release()
+        assert waiting.admitted.is_set()
+        assert waiting.queue.running == 1
+
+    asyncio.run(main())
@@ -0,0 +1,195 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from entityAgent.agent import Agent
+from entityAgent.config import Config
+from entityAgent.context import ContextWindow
+from entityAgent.prompt import COMMAND_SYSTEM_PROMPT, PrefixCacheStats, system_prompt
+from entityAgent.tools import Tool, ToolRegistry, default_registry
+
+
+def _tools(log=None):
+    def uptime():
+        if log is not None:
+            log.append('uptime')
+        return "up 3 days"
+
+    def touch(path):
+        return f"touched {path}"
+
+    return ToolRegistry([
+        Tool('uptime', "Uptime.", uptime, read_only=True),
+        Tool('touch', "Create a file.", touch, {'path': {'type': 'string'}}, ['path']),
+    ])
+
+
+def _call(name, **arguments):
+    return {'function': {'name': name, 'arguments': arguments}}
+
+
+def _agent(client, tools=None, **kwargs):
+    return Agent(client, 'test-model', ContextWindow(system_prompt('Linux')), tools=tools or _tools(),
+                 os_name='Linux', **kwargs)
+
+
+def test_run_returns_plain_reply():
+    client = MagicMock()
+    client.chat.return_value = {'message': {'role': 'assistant', 'content': 'Hello!'}}
+    agent = _agent(client)
+
+    assert asyncio.run(agent.run("hi")) == "Hello!"
+    assert [m['role'] for m in agent.context.messages] == ['system', 'user', 'assistant']
+    assert client.chat.call_args.kwargs['tools'] == agent.tools.schemas()
+
+
+def test_run_executes_tool_calls_and_reports_events():
+    client = MagicMock()
+    client.chat = AsyncMock(side_effect=[
+        {'message': {'role': 'assistant', 'content': '', 'tool_calls': [_call('uptime'), _call('touch', path='x')]}},
+        {'message': {'role': 'assistant', 'content': 'Done.'}},
+    ])
+    events = []
+    agent = _agent(client, hooks=[lambda event, data: events.append(event)])
+
+    assert asyncio.run(agent.run("check")) == "Done."
+    assert [m['role'] for m in agent.context.messages] == ['system', 'user', 'assistant', 'tool', 'tool', 'assistant']
+    assert agent.context.messages[3] == {'role': 'tool', 'content': 'up 3 days', 'tool_name': 'uptime'}
+    assert agent.context.messages[4]['content'] == 'touched x'
+    assert events == ['message', 'usage', 'message', 'tool_call', 'tool_result', 'message',
+                      'tool_call', 'tool_result', 'message', 'usage', 'message', 'reply']
+
+
+def test_usage_feeds_prefix_cache_stats():
+    client = MagicMock()
+    client.chat = AsyncMock(side_effect=[
+        {'message': {'role': 'assistant', 'content': '', 'tool_calls': [_call('uptime')]},
+         'prompt_eval_count': 400, 'eval_count': 5},
+        {'message': {'role': 'assistant', 'content': 'Up 3 days.'}, 'prompt_eval_count': 10, 'eval_count': 4},
+        {'message': {'role': 'assistant', 'content': 'Bye.'}},  # Nothing reported
+    ])
+    usage = []
+    stats = PrefixCacheStats()
+    agent = _agent(client, hooks=[lambda event, data: usage.append(data) if event == 'usage' else None, stats.hook])
+    asyncio.run(agent.run("uptime?"))
+    asyncio.run(agent.run("bye"))
+
+    assert [u['prompt_eval_count'] for u in usage] == [400, 10, None]
+    assert usage[1]['prompt_tokens'] > usage[0]['prompt_tokens'] > agent.tools.schema_tokens()
+    assert stats.requests == 2
+    assert stats.evaluated_tokens == min(400, usage[0]['prompt_tokens']) + 10
+    assert 0 < stats.hit_rate < 1
+
+
+def test_tool_schemas_are_built_once():
+    tools = _tools()
+    assert tools.schemas() is tools.schemas()
+    tools.register(Tool('noop', "Nothing.", lambda: ""))
+    assert [s['function']['name'] for s in tools.schemas()] == ['uptime', 'touch', 'noop']
+
+
+def test_async_hooks_are_awaited():
+    client = MagicMock()
+    client.chat = AsyncMock(return_value={'message': {'role': 'assistant', 'content': 'Hi'}})
+    seen = []
+
+    async def hook(event, data):
+        seen.append(event)
+
+    asyncio.run(_agent(client, hooks=[hook]).run("hi"))
+    assert seen[-1] == 'reply'
+
+
+def test_events_stream_tokens():
+    async def chunks():
+        for token in ("Hel", "lo"):
+            yield {'message': {'role': 'assistant', 'content': token}}
+
+    client = MagicMock()
+    client.chat = AsyncMock(side_effect=lambda **kw: chunks())
+    agent = _agent(client, stream=True)
+
+    async def collect():
+        return [(event, data) async for event, data in agent.events("hi")]
+
+    events = asyncio.run(collect())
+    assert [data['token'] for event, data in events if event == 'token'] == ["Hel", "lo"]
+    assert events[-1] == ('reply', {'content': 'Hello'})
+    assert client.chat.call_args.kwargs['stream'] is True
+
+
+def test_events_reraise_errors():
+    client = MagicMock()
+    client.chat = AsyncMock(side_effect=RuntimeError("model not found"))
+
+    async def collect():
+        return [event async for event in _agent(client).events("hi")]
+
+    with pytest.raises(RuntimeError, match="model not found"):
+        asyncio.run(collect())
+
+
+def test_falls_back_to_run_commands():
+    class ResponseError(Exception):
+        status_code = 400
+
+    client = MagicMock()
+    client.chat = AsyncMock(side_effect=[
+        ResponseError("test-model does not support tools"),
+        {'message': {'role': 'assistant', 'content': 'run: uname'}},
+        {'message': {'role': 'assistant', 'content': 'Linux it is.'}},
+    ])
+    tools = _tools()
+    tools.register(Tool('execute_command', "Run.", lambda command: f"ran {command}",
+                        {'command': {'type': 'string'}}, ['command']))
+    agent = _agent(client, tools=tools)
+
+    assert asyncio.run(agent.run("which os?")) == "Linux it is."
+    assert not agent.native_tools
+    assert agent.context.messages[0]['content'] == COMMAND_SYSTEM_PROMPT.format(os_name='Linux')
+    assert 'tools' not in client.chat.call_args_list[1].kwargs
+    assert agent.context.messages[-2]['content'] == "Command execution result:\nran uname"
+
+
+def test_read_only_tool_calls_run_concurrently_in_order():
+    # Every call must be running at once for any of them to return
+    barrier = threading.Barrier(3, timeout=5)
+
+    def run(command):
+        barrier.wait()
+        return command.upper(), "", 0
+
+    client = MagicMock()
+    client.chat = AsyncMock(side_effect=[
+        {'message': {'role': 'assistant', 'content': '', 'tool_calls': [
+            _call('execute_command', command=command) for command in ("df", "free", "uptime")]}},
+        {'message': {'role': 'assistant', 'content': 'Done.'}},
+    ])
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        agent = _agent(client, tools=default_registry(Config(), run=run), executor=executor, offload=False)
+        assert asyncio.run(agent.run("check")) == "Done."
+    assert [m['content'] for m in agent.context.messages[3:6]] == ["DF", "FREE", "UPTIME"]
+
+
+def test_agents_share_one_event_loop():
+    # Both agents must be waiting on the model at once for either to finish
+    both_waiting = asyncio.Barrier(2) if hasattr(asyncio, 'Barrier') else None
+    if both_waiting is None:
+        pytest.skip("asyncio.Barrier needs Python 3.11")
+
+    async def chat(**kwargs):
+        await both_waiting.wait()
+        return {'message': {'role': 'assistant', 'content': 'ok'}}
+
+    async def main():
+        agents = []
+        for _ in range(2):
+            client = MagicMock()
+            client.chat = chat
+            agents.append(_agent(client))
+        return await asyncio.wait_for(asyncio.gather(*(a.run("hi") for a in agents)), 5)
+
+    assert asyncio.run(main()) == ['ok', 'ok']
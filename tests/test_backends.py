@@ -0,0 +1,231 @@
+import asyncio
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import ollama
+import pytest
+
+from entityAgent.backends import AsyncPoolClient, Backend, BackendPool, BackendUnavailableError, PoolClient
+from entityAgent.config import Config
+
+
+class StubOllama:
+    """A minimal Ollama HTTP API answering /api/chat with its own name."""
+
+    def __init__(self, name):
+        self.name = name
+        self.status = 200
+        self.chats = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload, content_type="application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                if stub.status != 200:
+                    self._send(stub.status, b'{"error": "down"}')
+                else:
+                    self._send(200, b'{"version": "0.6.3"}')
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.chats += 1
+                if stub.status != 200:
+                    self._send(stub.status, json.dumps({"error": f"{stub.name} failed"}).encode())
+                    return
+                message = {"role": "assistant", "content": f"from {stub.name}"}
+                if body.get("stream"):
+                    lines = [
+                        {"model": body["model"], "message": {"role": "assistant", "content": "from "}, "done": False},
+                        {"model": body["model"], "message": {"role": "assistant", "content": stub.name}, "done": True},
+                    ]
+                    payload = b"".join(json.dumps(line).encode() + b"\n" for line in lines)
+                    self._send(200, payload, "application/x-ndjson")
+                else:
+                    self._send(200, json.dumps({"model": body["model"], "message": message, "done": True}).encode())
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stubs():
+    servers = [StubOllama("a"), StubOllama("b")]
+    yield servers
+    for server in servers:
+        server.close()
+
+
+def _closed_port_url():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}"
+
+
+def _chat(pool, **kwargs):
+    return pool.chat(model="llama3", messages=[{"role": "user", "content": "hi"}], **kwargs)
+
+
+def test_least_outstanding_respects_weights():
+    light, heavy = Backend("http://a", weight=1), Backend("http://b", weight=4)
+    pool = BackendPool([light, heavy])
+    assert [pool.acquire() for _ in range(3)] == [heavy, heavy, heavy]
+    pool.release(heavy)
+    pool.release(heavy)
+    pool.release(heavy)
+    assert heavy.outstanding == 0
+
+
+def test_fails_over_to_another_backend(stubs):
+    a, b = stubs
+    a.status = 500
+    pool = BackendPool([Backend(a.url, weight=10), Backend(b.url)])
+    assert _chat(pool)["message"]["content"] == "from b"
+    assert (a.chats, b.chats) == (1, 1)
+    assert pool.backends[0].failures == 1
+    assert [backend.outstanding for backend in pool.backends] == [0, 0]
+
+
+def test_unreachable_backend_is_retried():
+    stub = StubOllama("b")
+    try:
+        pool = BackendPool([Backend(_closed_port_url(), weight=10), Backend(stub.url)])
+        assert _chat(pool)["message"]["content"] == "from b"
+    finally:
+        stub.close()
+
+
+def test_circuit_opens_after_repeated_failures(stubs):
+    a, b = stubs
+    a.status = 500
+    pool = BackendPool([Backend(a.url, weight=10), Backend(b.url)], failure_threshold=2, cooldown=60)
+    for _ in range(4):
+        assert _chat(pool)["message"]["content"] == "from b"
+    # Two failures tripped the breaker; later requests skip the backend
+    assert a.chats == 2
+    assert b.chats == 4
+
+
+def test_circuit_half_opens_after_cooldown(stubs):
+    a, b = stubs
+    pool = BackendPool([Backend(a.url, weight=10), Backend(b.url)], failure_threshold=1, cooldown=0)
+    a.status = 500
+    _chat(pool)
+    a.status = 200
+    assert _chat(pool)["message"]["content"] == "from a"
+    assert pool.backends[0].open_until == 0.0
+
+
+def test_client_errors_are_not_retried(stubs):
+    a, b = stubs
+    a.status = 404
+    pool = BackendPool([Backend(a.url, weight=10), Backend(b.url)])
+    with pytest.raises(ollama.ResponseError):
+        _chat(pool)
+    assert b.chats == 0
+    assert pool.backends[0].failures == 0
+
+
+def test_all_backends_failing(stubs):
+    for stub in stubs:
+        stub.status = 503
+    pool = BackendPool([Backend(stub.url) for stub in stubs], failure_threshold=1, cooldown=60)
+    with pytest.raises(ollama.ResponseError):
+        _chat(pool)
+    with pytest.raises(BackendUnavailableError):
+        _chat(pool)
+
+
+def test_streaming_fails_over_and_releases(stubs):
+    a, b = stubs
+    a.status = 500
+    pool = BackendPool([Backend(a.url, weight=10), Backend(b.url)])
+    chunks = list(_chat(pool, stream=True))
+    assert "".join(chunk["message"]["content"] for chunk in chunks) == "from b"
+    assert [backend.outstanding for backend in pool.backends] == [0, 0]
+
+
+def test_unread_stream_holds_no_reservation(stubs):
+    pool = BackendPool([Backend(stub.url) for stub in stubs])
+    unread = _chat(pool, stream=True)
+    assert [backend.outstanding for backend in pool.backends] == [0, 0]
+
+    partly_read = _chat(pool, stream=True)
+    next(partly_read)
+    assert sum(backend.outstanding for backend in pool.backends) == 1
+    partly_read.close()
+    assert [backend.outstanding for backend in pool.backends] == [0, 0]
+    del unread
+
+    async def run():
+        await AsyncPoolClient(pool).chat(model="llama3", messages=[{"role": "user", "content": "hi"}], stream=True)
+
+    asyncio.run(run())
+    assert [backend.outstanding for backend in pool.backends] == [0, 0]
+
+
+def test_async_client(stubs):
+    a, b = stubs
+    a.status = 500
+    pool = BackendPool([Backend(a.url, weight=10), Backend(b.url)])
+    client = AsyncPoolClient(pool)
+    messages = [{"role": "user", "content": "hi"}]
+
+    async def run():
+        reply = await client.chat(model="llama3", messages=messages)
+        streamed = [chunk async for chunk in await client.chat(model="llama3", messages=messages, stream=True)]
+        return reply, streamed
+
+    reply, streamed = asyncio.run(run())
+    assert reply["message"]["content"] == "from b"
+    assert "".join(chunk["message"]["content"] for chunk in streamed) == "from b"
+    assert [backend.outstanding for backend in pool.backends] == [0, 0]
+
+
+def test_broadcast_reaches_every_backend(stubs):
+    pool = BackendPool([Backend(stub.url) for stub in stubs])
+    PoolClient(pool, broadcast=True).chat(model="llama3", messages=[])
+    assert [stub.chats for stub in stubs] == [1, 1]
+
+
+def test_health_checks_open_and_close_circuits(stubs):
+    a, b = stubs
+    pool = BackendPool([Backend(a.url), Backend(b.url)], cooldown=60)
+    a.status = 500
+    pool.check_health()
+    assert [backend.open_until > 0 for backend in pool.backends] == [True, False]
+    assert pool.acquire().url == b.url
+
+    a.status = 200
+    pool.check_health()
+    assert pool.backends[0].open_until == 0.0
+
+
+def test_from_config():
+    assert BackendPool.from_config(Config()) is None
+    pool = BackendPool.from_config(Config(backends=["http://a:11434", {"url": "http://b:11434", "weight": 3}]))
+    assert [(b.url, b.weight) for b in pool.backends] == [("http://a:11434", 1.0), ("http://b:11434", 3.0)]
+
+
+def test_close_releases_clients(stubs):
+    pool = BackendPool([Backend(stub.url) for stub in stubs])
+    _chat(pool)
+    http = [backend._client._client for backend in pool.backends if backend._client is not None]
+    pool.close()
+    assert http and all(client.is_closed for client in http)
+    assert all(backend._client is None for backend in pool.backends)
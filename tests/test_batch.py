@@ -0,0 +1,136 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from entityAgent.batch import BatchRunner, BatchStats, completed_ids, drop_partial_line, load_tasks, run_batch
+from entityAgent.config import Config
+
+
+def _write(path, lines):
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines))
+
+
+def _client(reply=lambda messages: "ok"):
+    async def chat(model, messages, **kwargs):
+        return {'message': {'role': 'assistant', 'content': reply(messages)}}
+
+    client = MagicMock()
+    client.chat = AsyncMock(side_effect=chat)
+    return client
+
+
+def test_load_tasks(tmp_path):
+    path = tmp_path / "tasks.jsonl"
+    path.write_text('{"id": "a", "prompt": "first"}\n\n"second"\n{"prompt": "third", "tag": 1}\n')
+    assert load_tasks(str(path)) == [
+        {'id': 'a', 'prompt': 'first'},
+        {'id': '3', 'prompt': 'second'},
+        {'id': '4', 'prompt': 'third', 'tag': 1},
+    ]
+
+
+def test_load_tasks_rejects_entries_without_prompt(tmp_path):
+    path = tmp_path / "tasks.jsonl"
+    _write(path, [{"id": 1}])
+    with pytest.raises(ValueError, match="prompt"):
+        load_tasks(str(path))
+
+
+def test_runner_writes_results_and_stats(tmp_path):
+    output = tmp_path / "out.jsonl"
+    tasks = [{'id': str(i), 'prompt': f"task {i}"} for i in range(5)]
+    runner = BatchRunner(_client(lambda messages: messages[-1]['content'].upper()), Config(), workers=3)
+
+    stats = asyncio.run(runner.run(tasks, str(output)))
+
+    results = [json.loads(line) for line in output.read_text().splitlines()]
+    assert sorted((r['id'], r['response']) for r in results) == [(str(i), f"TASK {i}") for i in range(5)]
+    assert all(r['tool_calls'] == [] and r['seconds'] >= 0 for r in results)
+    assert (stats.total, stats.completed, stats.failed, stats.skipped) == (5, 5, 0, 0)
+    assert "5 completed, 0 failed, 0 skipped of 5 tasks" in stats.summary()
+
+
+def test_runner_runs_tasks_concurrently(tmp_path):
+    both_waiting = asyncio.Event()
+    waiting = []
+
+    async def chat(model, messages, **kwargs):
+        waiting.append(1)
+        if len(waiting) == 2:
+            both_waiting.set()
+        await asyncio.wait_for(both_waiting.wait(), 5)
+        return {'message': {'role': 'assistant', 'content': 'ok'}}
+
+    client = MagicMock()
+    client.chat = chat
+    tasks = [{'id': '1', 'prompt': 'a'}, {'id': '2', 'prompt': 'b'}]
+    stats = asyncio.run(BatchRunner(client, Config(), workers=2).run(tasks, str(tmp_path / "out.jsonl")))
+    assert stats.completed == 2
+
+
+def test_runner_resumes_and_retries_failures(tmp_path):
+    output = tmp_path / "out.jsonl"
+    _write(output, [{'id': '1', 'response': 'done'}, {'id': '2', 'error': 'boom'}])
+    with open(output, 'a') as f:
+        f.write('{"id": "3", "resp')  # cut short by an interruption
+    assert completed_ids(str(output)) == {'1'}
+
+    client = _client()
+    tasks = [{'id': str(i), 'prompt': str(i)} for i in (1, 2, 3)]
+    stats = asyncio.run(BatchRunner(client, Config()).run(tasks, str(output)))
+
+    assert (stats.completed, stats.skipped) == (2, 1)
+    assert sorted(call.kwargs['messages'][1]['content'] for call in client.chat.call_args_list) == ['2', '3']
+    # The cut-off line is gone and every new result is a whole line of its own
+    ids = [json.loads(line)['id'] for line in output.read_text().splitlines()]
+    assert ids[:2] == ['1', '2'] and sorted(ids[2:]) == ['2', '3']
+    assert completed_ids(str(output)) == {'1', '2', '3'}
+
+
+def test_drop_partial_line(tmp_path):
+    output = tmp_path / "out.jsonl"
+    output.write_text('{"id": "1"}\n' + 'x' * 10_000)
+    drop_partial_line(str(output))
+    assert output.read_text() == '{"id": "1"}\n'
+    drop_partial_line(str(output))
+    assert output.read_text() == '{"id": "1"}\n'
+    output.write_text('{"id": "cut')
+    drop_partial_line(str(output))
+    assert output.read_text() == ''
+
+
+def test_runner_records_errors(tmp_path):
+    client = MagicMock()
+    client.chat = AsyncMock(side_effect=ConnectionError("Ollama is down"))
+    output = tmp_path / "out.jsonl"
+    stats = asyncio.run(BatchRunner(client, Config()).run([{'id': 'x', 'prompt': 'hi'}], str(output)))
+
+    assert stats.failed == 1
+    assert json.loads(output.read_text())['error'] == "Ollama is down"
+
+
+def test_batch_stats_percentiles():
+    stats = BatchStats(latencies=[4.0, 1.0, 2.0, 3.0])
+    assert stats.percentile(0.5) == 3.0
+    assert stats.percentile(0.95) == 4.0
+
+
+def test_run_batch_sets_up_and_closes_client(tmp_path):
+    tasks = tmp_path / "tasks.jsonl"
+    _write(tasks, [{"id": "1", "prompt": "hi"}])
+    ollama_client = MagicMock()
+    ollama_client.chat = AsyncMock(return_value={'message': {'role': 'assistant', 'content': 'hello'}})
+    ollama_client.close = AsyncMock()
+
+    with patch("entityAgent.batch.ensure_ollama_ready") as mock_ready, \
+            patch("entityAgent.batch.make_async_client", return_value=ollama_client):
+        stats = run_batch(Config(model="test-model"), str(tasks), workers=2)
+
+    mock_ready.assert_called_once_with("test-model")
+    assert stats.completed == 1
+    # The warm-up request, then the task
+    assert ollama_client.chat.await_count == 2
+    ollama_client.close.assert_awaited_once()
+    assert json.loads((tmp_path / "tasks.results.jsonl").read_text())['response'] == 'hello'
@@ -0,0 +1,123 @@
+import os
+from unittest.mock import MagicMock, patch
+
+from entityAgent.command_cache import CommandCache, command_cache_from_config, command_ttl, DEFAULT_COMMAND_TTLS
+from entityAgent.config import Config
+from entityAgent.tools import default_registry, is_cached_result
+
+
+def test_command_ttl():
+    assert command_ttl("uname -a", DEFAULT_COMMAND_TTLS) == 86400
+    # A pipeline is kept for its shortest-lived program
+    assert command_ttl("uname -a | df -h", DEFAULT_COMMAND_TTLS) == 30
+    assert command_ttl("free -m | head -2", {**DEFAULT_COMMAND_TTLS, 'head': 60}) == 5
+    # Read-only but volatile or file contents, or not read-only at all
+    assert command_ttl("ps aux", DEFAULT_COMMAND_TTLS) == 0
+    assert command_ttl("cat notes.txt", DEFAULT_COMMAND_TTLS) == 0
+    assert command_ttl("echo hi", DEFAULT_COMMAND_TTLS) == 0
+    assert command_ttl("uname -a > out.txt", DEFAULT_COMMAND_TTLS) == 0
+    assert command_ttl("rm -rf build", DEFAULT_COMMAND_TTLS) == 0
+
+
+def test_repeated_command_runs_once():
+    cache = CommandCache()
+    runner = MagicMock(return_value=("Linux\n", "", 0))
+
+    assert cache.run("uname -a", runner) == (("Linux\n", "", 0), None)
+    result, age = cache.run("uname -a", runner)
+    assert result == ("Linux\n", "", 0)
+    assert age is not None and age >= 0
+    runner.assert_called_once()
+
+
+def test_fresh_bypasses_cache():
+    cache = CommandCache()
+    runner = MagicMock(side_effect=[("1", "", 0), ("2", "", 0)])
+    cache.run("uptime", runner)
+    assert cache.run("uptime", runner, fresh=True) == (("2", "", 0), None)
+    # The fresh result replaces the old one
+    assert cache.run("uptime", runner)[0] == ("2", "", 0)
+
+
+def test_failures_and_uncacheable_commands_are_not_stored():
+    cache = CommandCache()
+    failing = MagicMock(return_value=("", "No such file", 1))
+    cache.run("cat /missing", failing)
+    cache.run("cat /missing", failing)
+    assert failing.call_count == 2
+
+    runner = MagicMock(return_value=("", "", 0))
+    cache.run("touch x", runner)
+    cache.run("touch x", runner)
+    assert runner.call_count == 2
+
+
+def test_entries_expire_per_command():
+    cache = CommandCache(ttls={'uptime': 5})
+    runner = MagicMock(return_value=("up", "", 0))
+    with patch("entityAgent.command_cache.time.time", return_value=1000.0):
+        cache.run("uptime", runner)
+    with patch("entityAgent.command_cache.time.time", return_value=1004.0):
+        assert cache.get("uptime") is not None
+    with patch("entityAgent.command_cache.time.time", return_value=1006.0):
+        assert cache.get("uptime") is None
+
+
+def test_key_includes_cwd_and_env(tmp_path, monkeypatch):
+    cache = CommandCache(ttls={'ls': 30})
+    runner = MagicMock(return_value=("files", "", 0))
+    cache.run("ls", runner)
+    monkeypatch.chdir(tmp_path)
+    assert cache.get("ls") is None
+    monkeypatch.chdir(os.path.dirname(__file__))
+    monkeypatch.setenv("LANG", "de_DE.UTF-8")
+    assert cache.get("ls") is None
+
+
+def test_command_with_side_effects_clears_cache():
+    cache = CommandCache(ttls={'cat': 60})
+    runner = MagicMock(side_effect=[("old", "", 0), ("", "", 0), ("new", "", 0)])
+    cache.run("cat notes.txt", runner)
+    cache.run("echo new > notes.txt", runner)
+    assert cache.run("cat notes.txt", runner) == (("new", "", 0), None)
+
+    cache.invalidate("uname")  # Read-only: nothing is dropped
+    assert cache.get("cat notes.txt") is not None
+    cache.invalidate("rm notes.txt")
+    assert cache.get("cat notes.txt") is None
+
+
+def test_command_cache_is_opt_in():
+    assert command_cache_from_config(Config()) is None
+    assert isinstance(command_cache_from_config(Config(command_cache=True)), CommandCache)
+
+
+def test_ttl_override_disables_program():
+    cache = CommandCache(ttls={'uname': 0})
+    runner = MagicMock(return_value=("Linux", "", 0))
+    cache.run("uname", runner)
+    cache.run("uname", runner)
+    assert runner.call_count == 2
+
+
+def test_results_persist_in_sqlite(tmp_path):
+    db = str(tmp_path / "commands.db")
+    CommandCache(db_path=db).run("nproc", MagicMock(return_value=("8", "", 0)))
+    runner = MagicMock()
+    assert CommandCache(db_path=db).run("nproc", runner)[0] == ("8", "", 0)
+    runner.assert_not_called()
+
+
+def test_execute_command_tool_uses_cache():
+    runner = MagicMock(return_value=("Linux\n", "", 0))
+    registry = default_registry(Config(), run=runner, cache=CommandCache())
+
+    assert registry.call('execute_command', {'command': 'uname'}) == "Linux"
+    cached = registry.call('execute_command', {'command': 'uname'})
+    assert is_cached_result(cached) and cached.endswith("Linux")
+    assert registry.call('execute_command', {'command': 'uname', 'fresh': True}) == "Linux"
+    assert runner.call_count == 2
+    # A command that may change the system makes the next uname run again
+    registry.call('execute_command', {'command': 'touch x'})
+    assert not is_cached_result(registry.call('execute_command', {'command': 'uname'}))
+    assert runner.call_count == 4
@@ -70,3 +70,42 @@ def test_env_priority_over_yaml(clean_env, tmp_path):
         assert config.model == "env-model"
     finally:
         os.chdir(original_cwd)
+
+def test_max_concurrency(clean_env, tmp_path):
+    config_file = tmp_path / "config.yaml"
+    with open(config_file, "w") as f:
+        yaml.dump({"max_concurrency": 8}, f)
+
+    original_cwd = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        assert load_config().max_concurrency == 8
+        os.environ["ENTITY_MAX_CONCURRENCY"] = "2"
+        assert load_config().max_concurrency == 2
+    finally:
+        os.chdir(original_cwd)
+
+def test_unattended_commands_get_a_default_timeout():
+    assert Config().command_limits()["timeout"] is None
+    assert Config().command_limits(unattended=True)["timeout"] == 300
+    assert Config(command_timeout=10).command_limits(unattended=True)["timeout"] == 10
+    assert Config(unattended_command_timeout=None).command_limits(unattended=True)["timeout"] is None
+
+@pytest.mark.parametrize("value", ["many", "0", "-2", "1.5"])
+def test_invalid_max_concurrency_env_is_rejected(clean_env, value):
+    os.environ["ENTITY_MAX_CONCURRENCY"] = value
+    with pytest.raises(ValueError, match="ENTITY_MAX_CONCURRENCY must be a whole number of at least 1"):
+        load_config()
+
+def test_invalid_max_concurrency_in_yaml_is_rejected(clean_env, tmp_path):
+    os.environ.pop("ENTITY_MAX_CONCURRENCY", None)
+    with open(tmp_path / "config.yaml", "w") as f:
+        yaml.dump({"max_concurrency": 0}, f)
+
+    original_cwd = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        with pytest.raises(ValueError, match="max_concurrency must be a whole number"):
+            load_config()
+    finally:
+        os.chdir(original_cwd)
@@ -0,0 +1,116 @@
+import threading
+from entityAgent.context import ContextWindow, elide, estimate_tokens, SUMMARY_PREFIX
+
+def test_elide_short_text_unchanged():
+    assert elide("hello", 10) == "hello"
+
+def test_elide_keeps_head_and_tail():
+    text = "".join(str(i % 10) for i in range(1000))
+    result = elide(text, 90)
+    assert result.startswith(text[:60])
+    assert result.endswith(text[-30:])
+    assert "[910 characters elided]" in result
+
+def test_tool_output_is_elided():
+    context = ContextWindow("system", max_tool_output_chars=100)
+    context.append_tool_output("x" * 10_000)
+    assert len(context.messages[-1]["content"]) < 200
+    assert context.messages[-1]["role"] == "system"
+
+def test_prepare_returns_same_list_within_budget():
+    context = ContextWindow("system", max_tokens=1000)
+    context.append({"role": "user", "content": "hi"})
+    assert context.prepare() is context.messages
+    assert len(context.messages) == 2
+
+def test_prepare_drops_oldest_but_keeps_system_and_recent():
+    context = ContextWindow("system", max_tokens=45, keep_recent=2)
+    for i in range(10):
+        context.append({"role": "user", "content": f"message {i} " + "x" * 40})
+    messages = context.prepare()
+    assert messages[0]["content"] == "system"
+    assert [m["content"][:9] for m in messages[1:]] == ["message 8", "message 9"]
+
+def test_recent_messages_kept_even_when_over_budget():
+    context = ContextWindow("system", max_tokens=1, keep_recent=3)
+    for i in range(3):
+        context.append({"role": "user", "content": "x" * 100})
+    assert len(context.prepare()) == 4
+
+def test_dropped_turns_are_summarized_in_background():
+    release = threading.Event()
+    seen = []
+
+    def summarize(messages):
+        release.wait(5)
+        seen.append([m["content"] for m in messages])
+        return "the user said hello"
+
+    context = ContextWindow("system", max_tokens=40, keep_recent=1, summarize=summarize)
+    context.append({"role": "user", "content": "hello " + "x" * 80})
+    context.append({"role": "assistant", "content": "hi " + "y" * 80})
+
+    # Dropping happens immediately; the summary is a placeholder until ready.
+    messages = context.prepare()
+    assert messages[1]["content"].startswith(SUMMARY_PREFIX)
+    assert "the user said hello" not in messages[1]["content"]
+    assert messages[-1]["content"].startswith("hi ")
+
+    release.set()
+    context.wait_for_summary()
+    assert context.prepare()[1]["content"] == SUMMARY_PREFIX + "the user said hello"
+    assert seen[0][0].startswith("hello ")
+    context.close()
+
+def test_summaries_build_on_previous_summary():
+    calls = []
+
+    def summarize(messages):
+        calls.append(messages)
+        return f"summary {len(calls)}"
+
+    context = ContextWindow("system", max_tokens=30, keep_recent=1, summarize=summarize)
+    for i in range(2):
+        context.append({"role": "user", "content": "x" * 100})
+        context.append({"role": "user", "content": "y" * 100})
+        context.prepare()
+        context.wait_for_summary()
+    assert calls[1][0]["content"] == SUMMARY_PREFIX + "summary 1"
+    assert context.prepare()[1]["content"] == SUMMARY_PREFIX + "summary 2"
+    context.close()
+
+def test_failed_summary_keeps_conversation_going(capsys):
+    def summarize(messages):
+        raise RuntimeError("model unavailable")
+
+    context = ContextWindow("system", max_tokens=10, keep_recent=1, summarize=summarize)
+    context.append({"role": "user", "content": "x" * 100})
+    context.append({"role": "user", "content": "y" * 100})
+    context.prepare()
+    context.wait_for_summary()
+    assert len(context.prepare()) == 3
+    assert "model unavailable" in capsys.readouterr().out
+    context.close()
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("x" * 400) == 101
+
+def test_page_tokens_cut_old_turns_at_stable_points():
+    def conversation(turns):
+        return [{"role": "user", "content": f"turn {i} " + "x" * 36} for i in range(turns)]
+
+    context = ContextWindow("system", max_tokens=100, keep_recent=1, page_tokens=50)
+    cuts = []
+    for message in conversation(20):
+        context.append(message)
+        cuts.append(context.prepare()[1]["content"][:7])
+    # Dropping a whole page at a time leaves room for several appends before the next cut
+    assert len(set(cuts)) < len(cuts) // 2
+    assert context.token_count() <= 100
+
+    # A window rebuilt from the same history starts at the same message
+    rebuilt = ContextWindow("system", max_tokens=100, keep_recent=1, page_tokens=50)
+    for message in conversation(20):
+        rebuilt.append(message)
+    assert rebuilt.prepare() == context.messages
@@ -0,0 +1,153 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+from entityAgent.config import Config
+from entityAgent.llm import AsyncCachingClient, CachingClient, merge_chunks
+from entityAgent.llm_cache import ResponseCache
+
+MESSAGES = [{"role": "user", "content": "how much disk is free?"}]
+REPLY = {"message": {"role": "assistant", "content": "12 GB"}}
+
+def test_repeated_deterministic_request_is_served_from_cache():
+    backend = MagicMock()
+    backend.chat.return_value = REPLY
+    client = CachingClient(backend, cache=ResponseCache(), options={"temperature": 0})
+
+    assert client.chat(model="llama3", messages=MESSAGES) == REPLY
+    assert client.chat(model="llama3", messages=MESSAGES) == REPLY
+    backend.chat.assert_called_once()
+    assert backend.chat.call_args.kwargs["options"] == {"temperature": 0}
+
+def test_nondeterministic_request_bypasses_cache():
+    backend = MagicMock()
+    backend.chat.return_value = REPLY
+    client = CachingClient(backend, cache=ResponseCache())
+
+    client.chat(model="llama3", messages=MESSAGES)
+    client.chat(model="llama3", messages=MESSAGES, options={"temperature": 0.7})
+    assert backend.chat.call_count == 2
+
+def test_nondeterministic_caching_can_be_enabled():
+    backend = MagicMock()
+    backend.chat.return_value = REPLY
+    client = CachingClient(backend, cache=ResponseCache(), cache_nondeterministic=True)
+
+    client.chat(model="llama3", messages=MESSAGES)
+    client.chat(model="llama3", messages=MESSAGES)
+    backend.chat.assert_called_once()
+
+def test_keep_alive_does_not_affect_key():
+    backend = MagicMock()
+    backend.chat.return_value = REPLY
+    client = CachingClient(backend, cache=ResponseCache(), options={"temperature": 0})
+
+    client.chat(model="llama3", messages=MESSAGES, keep_alive="5m")
+    client.chat(model="llama3", messages=MESSAGES, keep_alive="1h")
+    backend.chat.assert_called_once()
+
+def test_configured_keep_alive_is_sent():
+    backend = MagicMock()
+    backend.chat.return_value = REPLY
+    client = CachingClient.from_config(backend, Config(keep_alive="30m"))
+
+    client.chat(model="llama3", messages=MESSAGES)
+    assert backend.chat.call_args.kwargs["keep_alive"] == "30m"
+    client.chat(model="llama3", messages=MESSAGES, keep_alive=-1)
+    assert backend.chat.call_args.kwargs["keep_alive"] == -1
+
+def test_streamed_reply_is_cached_once_complete():
+    backend = MagicMock()
+    backend.chat.return_value = iter([
+        {"message": {"role": "assistant", "content": "12"}},
+        {"message": {"role": "assistant", "content": " GB"}, "done": True},
+    ])
+    client = CachingClient(backend, cache=ResponseCache(), options={"temperature": 0})
+
+    assert [c["message"]["content"] for c in client.chat(model="llama3", messages=MESSAGES, stream=True)] == ["12", " GB"]
+    replay = list(client.chat(model="llama3", messages=MESSAGES, stream=True))
+    assert [c["message"]["content"] for c in replay] == ["12 GB"]
+    backend.chat.assert_called_once()
+
+def test_without_cache_passes_through():
+    backend = MagicMock()
+    backend.chat.return_value = REPLY
+    client = CachingClient.from_config(backend, Config())
+    client.chat(model="llama3", messages=MESSAGES)
+    client.chat(model="llama3", messages=MESSAGES)
+    assert backend.chat.call_count == 2
+
+def test_from_config():
+    client = CachingClient.from_config(MagicMock(), Config(llm_cache=True, llm_temperature=0))
+    assert client.cache is not None
+    assert client.options == {"temperature": 0}
+
+def test_merge_chunks_collects_tool_calls():
+    merged = merge_chunks([
+        {"message": {"role": "assistant", "content": "", "tool_calls": [{"function": {"name": "a"}}]}},
+        {"message": {"role": "assistant", "content": "done"}, "done": True},
+    ])
+    assert merged["message"] == {"role": "assistant", "content": "done", "tool_calls": [{"function": {"name": "a"}}]}
+    assert merged["done"] is True
+
+def test_async_client_caches_and_replays_streams():
+    async def chunks():
+        yield {"message": {"role": "assistant", "content": "12"}}
+        yield {"message": {"role": "assistant", "content": " GB"}}
+
+    backend = MagicMock()
+    backend.chat = AsyncMock(side_effect=[REPLY, chunks()])
+    client = AsyncCachingClient(backend, cache=ResponseCache(), options={"temperature": 0})
+
+    async def run():
+        first = await client.chat(model="llama3", messages=MESSAGES)
+        second = await client.chat(model="llama3", messages=MESSAGES)
+        streamed = [c async for c in await client.chat(model="llama3", messages=MESSAGES + [{"role": "user", "content": "?"}], stream=True)]
+        replayed = [c async for c in await client.chat(model="llama3", messages=MESSAGES + [{"role": "user", "content": "?"}], stream=True)]
+        return first, second, streamed, replayed
+
+    first, second, streamed, replayed = asyncio.run(run())
+    assert first == second == REPLY
+    assert len(streamed) == 2
+    assert replayed[0]["message"]["content"] == "12 GB"
+    assert backend.chat.call_count == 2
+
+def test_client_options():
+    from entityAgent.llm import client_options
+
+    options = client_options(Config(llm_max_connections=8, llm_max_keepalive_connections=4, llm_keepalive_expiry=30))
+    assert (options["limits"].max_connections, options["limits"].max_keepalive_connections) == (8, 4)
+    assert options["limits"].keepalive_expiry == 30
+
+def test_make_client_uses_configured_timeouts():
+    from entityAgent.llm import close_client, make_async_client, make_client
+
+    config = Config(server_url="http://gpu1:11434", llm_connect_timeout=2, llm_read_timeout=60,
+                    llm_max_connections=8, llm_max_keepalive_connections=4)
+    client = make_client(config)
+    http = client._client
+    assert str(http.base_url).startswith("http://gpu1:11434")
+    assert (http.timeout.connect, http.timeout.read) == (2, 60)
+    close_client(client)
+    assert http.is_closed
+
+    async_client = make_async_client(config, host="http://gpu2:11434")
+    assert str(async_client._client.base_url).startswith("http://gpu2:11434")
+    asyncio.run(close_client(async_client))
+    assert async_client._client.is_closed
+
+def test_async_client_reads_sqlite_cache_off_the_event_loop(tmp_path):
+    import threading
+    cache = ResponseCache(db_path=str(tmp_path / "cache.db"))
+    threads = []
+    get, put = cache.get, cache.put
+    cache.get = lambda *args: threads.append(threading.current_thread()) or get(*args)
+    cache.put = lambda *args: threads.append(threading.current_thread()) or put(*args)
+    backend = MagicMock()
+    backend.chat = AsyncMock(return_value=REPLY)
+    client = AsyncCachingClient(backend, cache=cache, options={"temperature": 0})
+
+    async def run():
+        await client.chat(model="llama3", messages=MESSAGES)
+        return await client.chat(model="llama3", messages=MESSAGES)
+
+    assert asyncio.run(run()) == REPLY
+    assert len(threads) == 3 and threading.main_thread() not in threads
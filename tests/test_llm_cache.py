@@ -0,0 +1,49 @@
+import time
+from unittest.mock import patch
+from entityAgent.llm_cache import ResponseCache, cache_key
+
+MESSAGES = [{"role": "user", "content": "what OS is this?"}]
+RESPONSE = {"message": {"role": "assistant", "content": "Linux"}}
+
+def test_cache_key_is_stable_and_sensitive():
+    key = cache_key("llama3", MESSAGES, {"temperature": 0})
+    assert key == cache_key("llama3", [dict(m) for m in MESSAGES], {"temperature": 0})
+    assert key != cache_key("mistral", MESSAGES, {"temperature": 0})
+    assert key != cache_key("llama3", MESSAGES, {"temperature": 0, "seed": 1})
+    assert key != cache_key("llama3", MESSAGES + [{"role": "user", "content": "?"}], {"temperature": 0})
+    assert key != cache_key("llama3", MESSAGES, {"temperature": 0}, tools=[{"name": "x"}])
+
+def test_memory_hit_and_miss():
+    cache = ResponseCache()
+    assert cache.get("k") is None
+    cache.put("k", RESPONSE)
+    assert cache.get("k") == RESPONSE
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_lru_eviction():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", RESPONSE)
+    cache.put("b", RESPONSE)
+    cache.get("a")
+    cache.put("c", RESPONSE)
+    assert cache.get("b") is None
+    assert cache.get("a") == RESPONSE
+
+def test_ttl_expiry():
+    cache = ResponseCache(ttl=10)
+    cache.put("k", RESPONSE)
+    with patch("entityAgent.llm_cache.time.time", return_value=time.time() + 11):
+        assert cache.get("k") is None
+
+def test_sqlite_persists_across_instances(tmp_path):
+    db_path = str(tmp_path / "cache" / "responses.db")
+    ResponseCache(db_path=db_path).put("k", RESPONSE)
+    assert ResponseCache(db_path=db_path).get("k") == RESPONSE
+
+def test_sqlite_size_eviction(tmp_path):
+    cache = ResponseCache(max_entries=1, db_path=str(tmp_path / "responses.db"), max_db_entries=2)
+    cache.DB_TRIM_EVERY = 1
+    for key in ("a", "b", "c"):
+        cache.put(key, RESPONSE)
+    assert cache.get("a") is None
+    assert cache.get("c") == RESPONSE
@@ -0,0 +1,109 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from entityAgent.model_registry import ModelRegistry, ModelRegistryError, normalize_model_name
+
+TAGS = {"models": [
+    {"name": "llama3.1:latest", "model": "llama3.1:latest", "digest": "sha256:111"},
+    {"name": "mistral:7b", "model": "mistral:7b", "digest": "sha256:222"},
+]}
+
+
+class FakeOllama(BaseHTTPRequestHandler):
+    pulls = []
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._reply(200, TAGS)
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path == "/api/show":
+            if body["model"] == "mistral:7b":
+                self._reply(200, {"details": {"family": "llama", "parameter_size": "7B"}})
+            else:
+                self._reply(404, {"error": f"model '{body['model']}' not found"})
+        elif self.path == "/api/pull":
+            FakeOllama.pulls.append(body)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            if body["model"] == "missing":
+                updates = [{"status": "pulling manifest"}, {"error": "pull model manifest: file does not exist"}]
+            else:
+                updates = [
+                    {"status": "pulling manifest"},
+                    {"status": "pulling abc", "digest": "sha256:abc", "total": 200, "completed": 100},
+                    {"status": "pulling abc", "digest": "sha256:abc", "total": 200, "completed": 200},
+                    {"status": "success"},
+                ]
+            for update in updates:
+                self.wfile.write(json.dumps(update).encode() + b"\n")
+
+
+@pytest.fixture
+def registry():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllama)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    FakeOllama.pulls = []
+    yield ModelRegistry(f"http://127.0.0.1:{server.server_address[1]}")
+    server.shutdown()
+    server.server_close()
+
+
+def test_normalize_model_name():
+    assert normalize_model_name("llama3") == "llama3:latest"
+    assert normalize_model_name("llama3:8b") == "llama3:8b"
+    assert normalize_model_name("registry.ollama.ai/library/llama3") == "llama3:latest"
+    assert normalize_model_name("hf.co/org/model") == "hf.co/org/model:latest"
+    assert normalize_model_name("localhost:5000/org/model") == "localhost:5000/org/model:latest"
+
+
+def test_find_matches_tags_exactly(registry):
+    assert registry.find("llama3") is None  # not llama3.1
+    assert registry.find("llama3.1")["digest"] == "sha256:111"
+    assert registry.find("mistral") is None  # only the 7b tag is installed
+    assert registry.find("mistral:7b")["digest"] == "sha256:222"
+    assert registry.find("sha256:222")["model"] == "mistral:7b"
+
+
+def test_show(registry):
+    assert registry.show("mistral:7b")["details"]["parameter_size"] == "7B"
+    assert registry.show("llama3") is None
+
+
+def test_pull_reports_progress(registry):
+    updates = []
+    registry.pull("llama3", progress=updates.append)
+    assert FakeOllama.pulls == [{"model": "llama3", "stream": True}]
+    assert [u["status"] for u in updates][-1] == "success"
+    assert updates[1]["completed"] == 100
+
+
+def test_pull_error(registry):
+    with pytest.raises(ModelRegistryError) as exc:
+        registry.pull("missing", progress=None)
+    assert "file does not exist" in str(exc.value)
+
+
+def test_unreachable_server():
+    with pytest.raises(ModelRegistryError) as exc:
+        ModelRegistry("http://127.0.0.1:9", timeout=1).list()
+    assert "Cannot reach Ollama" in str(exc.value)
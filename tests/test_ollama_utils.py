@@ -1,7 +1,10 @@
+import json
 import sys
 import subprocess
+import time
 import pytest
 from unittest.mock import MagicMock, patch, call
+from entityAgent.model_registry import ModelRegistryError
 from entityAgent.ollama_utils import (
     _run,
     ensure_python_package,
@@ -9,6 +12,9 @@ from entityAgent.ollama_utils import (
     OllamaSetupError,
     setup_ollama_cli,
     ensure_ollama_ready,
+    ollama_host,
+    port_is_open,
+    wait_until,
 )
 
 # -----------------------------------------------------------------------------
@@ -90,44 +96,182 @@ def test_verify_cli(ollama_cli):
         mock_run.assert_called_once_with(["/bin/ollama", "--version"])
 
 def test_ensure_model_already_present(ollama_cli):
-    ollama_cli.executable = "/bin/ollama"
-    with patch("entityAgent.ollama_utils._run") as mock_run:
-        mock_run.return_value.stdout = "model1\ntest-model\nmodel2"
-        ollama_cli._ensure_model()
-        # Should list but not pull
-        mock_run.assert_called_once_with(["/bin/ollama", "list"], check=False)
+    with patch("entityAgent.ollama_utils.ModelRegistry") as MockRegistry:
+        registry = MockRegistry.return_value
+        registry.find.return_value = {"model": "test-model:latest", "digest": "sha256:abc"}
+        assert ollama_cli._ensure_model() == "sha256:abc"
+        # Should look up but not pull
+        registry.find.assert_called_once_with("test-model")
+        registry.pull.assert_not_called()
 
 def test_ensure_model_missing(ollama_cli):
-    ollama_cli.executable = "/bin/ollama"
-    with patch("entityAgent.ollama_utils._run") as mock_run:
-        mock_run.return_value.stdout = "model1\nmodel2"
-        ollama_cli._ensure_model()
-        # Should list AND pull
-        assert mock_run.call_count == 2
-        mock_run.assert_has_calls([
-            call(["/bin/ollama", "list"], check=False),
-            call(["/bin/ollama", "pull", "test-model"])
-        ])
+    with patch("entityAgent.ollama_utils.ModelRegistry") as MockRegistry:
+        registry = MockRegistry.return_value
+        registry.find.side_effect = [None, {"model": "test-model:latest", "digest": "sha256:abc"}]
+        assert ollama_cli._ensure_model() == "sha256:abc"
+        registry.pull.assert_called_once_with("test-model")
+
+def test_ensure_model_still_missing_after_pull(ollama_cli):
+    with patch("entityAgent.ollama_utils.ModelRegistry") as MockRegistry:
+        registry = MockRegistry.return_value
+        registry.find.return_value = None
+        registry.show.return_value = None
+        with pytest.raises(OllamaSetupError):
+            ollama_cli._ensure_model()
+
+def test_ensure_model_pull_error(ollama_cli):
+    with patch("entityAgent.ollama_utils.ModelRegistry") as MockRegistry:
+        registry = MockRegistry.return_value
+        registry.find.return_value = None
+        registry.pull.side_effect = ModelRegistryError("Pulling 'test-model' failed: file does not exist")
+        with pytest.raises(OllamaSetupError) as exc:
+            ollama_cli._ensure_model()
+        assert "file does not exist" in str(exc.value)
 
 def test_ensure_server_running_already_up(ollama_cli):
-    with patch.dict(sys.modules, {"ollama": MagicMock()}):
-        import ollama
-        ollama_cli._ensure_server_running()
-        ollama.list.assert_called_once()
+    with patch("entityAgent.ollama_utils.ollama_is_up", return_value=True) as mock_up:
+        with patch("subprocess.Popen") as mock_popen:
+            ollama_cli._ensure_server_running()
+            mock_up.assert_called_once()
+            mock_popen.assert_not_called()
+
+def test_ensure_server_running_start_server(ollama_cli, tmp_path):
+    ollama_cli.executable = "/bin/ollama"
+    ollama_cli.server_log = str(tmp_path / "serve.log")
+    # Down on the first two probes, then ready
+    with patch("entityAgent.ollama_utils.ollama_is_up", side_effect=[False, False, True]) as mock_up:
+        with patch("subprocess.Popen") as mock_popen:
+            mock_popen.return_value.poll.return_value = None
+            with patch("time.sleep") as mock_sleep:
+                ollama_cli._ensure_server_running()
 
-def test_ensure_server_running_start_server(ollama_cli):
+                assert mock_popen.call_args.args[0] == ["/bin/ollama", "serve"]
+                assert mock_up.call_count == 3
+                assert [c.args[0] for c in mock_sleep.call_args_list] == [0.05]
+    ollama_cli.server_process = None
+
+def test_ensure_server_running_fails_fast_when_server_exits(ollama_cli, tmp_path):
     ollama_cli.executable = "/bin/ollama"
-    mock_ollama = MagicMock()
-    # First call raises exception, second succeeds
-    mock_ollama.list.side_effect = [Exception("down"), ["model"]]
-    
-    with patch.dict(sys.modules, {"ollama": mock_ollama}):
+    ollama_cli.server_log = str(tmp_path / "serve.log")
+    with patch("entityAgent.ollama_utils.ollama_is_up", return_value=False):
         with patch("subprocess.Popen") as mock_popen:
-            with patch("time.sleep"): # skip sleep
+            mock_popen.return_value.poll.return_value = 1
+            mock_popen.return_value.returncode = 1
+            with patch("time.sleep") as mock_sleep:
+                with pytest.raises(OllamaSetupError) as exc:
+                    ollama_cli._ensure_server_running()
+                assert "exited with code 1" in str(exc.value)
+                mock_sleep.assert_not_called()
+
+def test_ensure_server_running_times_out(ollama_cli, tmp_path):
+    ollama_cli.executable = "/bin/ollama"
+    ollama_cli.server_log = str(tmp_path / "serve.log")
+    ollama_cli.startup_timeout = 0.2
+    with patch("entityAgent.ollama_utils.ollama_is_up", return_value=False):
+        with patch("subprocess.Popen") as mock_popen:
+            process = mock_popen.return_value
+            process.poll.return_value = None
+            with pytest.raises(OllamaSetupError) as exc:
                 ollama_cli._ensure_server_running()
-                
-                mock_popen.assert_called_once_with(["/bin/ollama", "run", "test-model"])
-                assert mock_ollama.list.call_count == 2
+            assert "did not become ready" in str(exc.value)
+            process.terminate.assert_called_once()
+            assert ollama_cli.server_process is None
+
+# -----------------------------------------------------------------------------
+# Test cached startup checks
+# -----------------------------------------------------------------------------
+
+@pytest.fixture
+def cached_cli(tmp_path):
+    executable = tmp_path / "ollama"
+    executable.write_text("#!/bin/sh\n")
+    cli = OllamaCLI(model="test-model")
+    cli.fingerprint_path = str(tmp_path / "startup.json")
+    with patch.object(cli, "_locate_or_install_cli", side_effect=lambda: setattr(cli, "executable", str(executable))):
+        with patch.object(cli, "_ensure_server_running") as mock_server:
+            with patch.object(cli, "_ensure_model", return_value="sha256:abc") as mock_model:
+                with patch("entityAgent.ollama_utils._run") as mock_run:
+                    mock_run.return_value = MagicMock(stdout="ollama version is 0.6.3\n")
+                    yield cli, executable, mock_run, mock_server, mock_model
+
+def test_ensure_ready_caches_fingerprint(cached_cli):
+    cli, executable, mock_run, mock_server, mock_model = cached_cli
+    cli.ensure_ready()
+    mock_run.assert_called_once_with([str(executable), "--version"])
+    with open(cli.fingerprint_path) as f:
+        fingerprint = json.load(f)
+    assert fingerprint["executable"] == str(executable)
+    assert fingerprint["version"] == "ollama version is 0.6.3"
+    assert fingerprint["model_digest"] == "sha256:abc"
+
+    # Second launch skips the CLI subprocess but still checks server and model
+    cli.ensure_ready()
+    mock_run.assert_called_once()
+    assert mock_server.call_count == 2
+    assert mock_model.call_count == 2
+
+def test_fingerprint_updated_when_model_digest_changes(cached_cli):
+    cli, _, mock_run, _, mock_model = cached_cli
+    cli.ensure_ready()
+    mock_model.return_value = "sha256:def"
+    cli.ensure_ready()
+    mock_run.assert_called_once()
+    with open(cli.fingerprint_path) as f:
+        assert json.load(f)["model_digest"] == "sha256:def"
+
+def test_fingerprint_invalidated_by_new_cli(cached_cli):
+    cli, executable, mock_run, _, _ = cached_cli
+    cli.ensure_ready()
+    executable.write_text("#!/bin/sh\n# upgraded\n")
+    cli.ensure_ready()
+    assert mock_run.call_count == 2
+
+def test_fingerprint_invalidated_by_model_change(cached_cli):
+    cli, _, mock_run, _, _ = cached_cli
+    cli.ensure_ready()
+    cli.model = "other-model"
+    cli.ensure_ready()
+    assert mock_run.call_count == 2
+
+def test_fingerprint_expires(cached_cli):
+    cli, _, mock_run, _, _ = cached_cli
+    cli.ensure_ready()
+    cli.fingerprint_ttl = 0
+    with patch("entityAgent.ollama_utils.time.time", return_value=time.time() + 1):
+        cli.ensure_ready()
+    assert mock_run.call_count == 2
+
+# -----------------------------------------------------------------------------
+# Test readiness probes
+# -----------------------------------------------------------------------------
+
+def test_wait_until_backs_off_exponentially():
+    with patch("time.sleep") as mock_sleep:
+        assert wait_until(MagicMock(side_effect=[False] * 6 + [True]), timeout=60, max_delay=0.5)
+        assert [c.args[0] for c in mock_sleep.call_args_list] == [0.05, 0.1, 0.2, 0.4, 0.5, 0.5]
+
+def test_wait_until_abort():
+    with patch("time.sleep") as mock_sleep:
+        assert not wait_until(lambda: False, timeout=60, abort=lambda: True)
+        mock_sleep.assert_not_called()
+
+def test_wait_until_timeout():
+    assert not wait_until(lambda: False, timeout=0.1)
+
+def test_ollama_host_adds_scheme(monkeypatch):
+    monkeypatch.setenv("OLLAMA_HOST", "0.0.0.0:11434")
+    assert ollama_host() == "http://0.0.0.0:11434"
+    monkeypatch.delenv("OLLAMA_HOST")
+    assert ollama_host() == "http://127.0.0.1:11434"
+
+def test_port_is_open():
+    import socket
+    with socket.socket() as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        port = server.getsockname()[1]
+        assert port_is_open("127.0.0.1", port)
+    assert not port_is_open("127.0.0.1", port)
 
 # -----------------------------------------------------------------------------
 # Test Wrappers
@@ -0,0 +1,105 @@
+import subprocess
+import sys
+import time
+from unittest.mock import patch
+
+import psutil
+
+from entityAgent.process_sampler import ProcessSampler, SNAPSHOT_FIELDS
+
+def test_refresh_builds_snapshot():
+    sampler = ProcessSampler()
+    sampler.refresh()
+    version, processes = sampler.snapshot()
+    assert version == 1
+    assert processes
+    assert set(processes[0]) == set(SNAPSHOT_FIELDS)
+
+def test_refresh_keeps_processes_it_may_not_inspect():
+    real_cpu_percent = psutil.Process.cpu_percent
+    denied = psutil.Process().pid
+
+    def cpu_percent(proc, interval=None):
+        if proc.pid == denied:
+            raise psutil.AccessDenied(proc.pid)
+        return real_cpu_percent(proc, interval)
+
+    sampler = ProcessSampler()
+    with patch.object(psutil.Process, "cpu_percent", cpu_percent):
+        sampler.refresh()
+        sampler.refresh()
+    rows = {row["pid"]: row for row in sampler.snapshot()[1]}
+    assert len(rows) > 1
+    assert rows[denied]["cpu"] is None and rows[denied]["name"]
+
+def test_delta_reports_started_and_exited():
+    sampler = ProcessSampler()
+    sampler.refresh()
+    before_start = sampler.version
+
+    late = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        sampler.refresh()
+        delta = sampler.delta(before_start)
+        assert delta["full"] is False
+        assert late.pid in [row["pid"] for row in delta["started"]]
+    finally:
+        late.kill()
+        late.wait()
+
+    before_exit = sampler.version
+    sampler.refresh()
+    delta = sampler.delta(before_exit)
+    assert late.pid in delta["exited"]
+    assert late.pid not in [row["pid"] for row in sampler.snapshot()[1]]
+
+def test_delta_since_current_version_is_empty():
+    sampler = ProcessSampler()
+    sampler.refresh()
+    delta = sampler.delta(sampler.version)
+    assert (delta["started"], delta["exited"]) == ([], [])
+
+def test_delta_from_unknown_version_is_full():
+    sampler = ProcessSampler()
+    sampler.refresh()
+    delta = sampler.delta(sampler.version + 10)
+    assert delta["full"] is True
+    assert len(delta["processes"]) == len(sampler.snapshot()[1])
+
+def test_delta_is_full_once_exit_history_is_lost():
+    sampler = ProcessSampler(history=1)
+    sampler.refresh()
+    start = sampler.version
+    for _ in range(2):
+        proc = subprocess.Popen([sys.executable, "-c", "pass"])
+        sampler.refresh()
+        proc.wait()
+        sampler.refresh()
+    assert sampler.delta(start)["full"] is True
+
+def test_background_thread_refreshes():
+    sampler = ProcessSampler(interval=0.05)
+    sampler.start()
+    try:
+        first = sampler.version
+        proc = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(1)"])
+        deadline = time.monotonic() + 5
+        while sampler.version == first and time.monotonic() < deadline:
+            time.sleep(0.05)
+        proc.kill()
+        proc.wait()
+        assert sampler.version > first
+    finally:
+        sampler.stop()
+
+def test_stopped_sampler_can_start_again():
+    sampler = ProcessSampler(interval=0.05)
+    sampler.start()
+    thread = sampler._thread
+    sampler.stop()
+    assert not sampler.running and not thread.is_alive()
+    sampler.start()
+    try:
+        assert sampler.running and sampler._thread is not thread
+    finally:
+        sampler.stop()
@@ -0,0 +1,25 @@
+from entityAgent.config import Config
+from entityAgent.prompt import PrefixCacheStats, context_from_config, system_prompt
+
+
+def test_system_prompt_is_stable():
+    assert system_prompt("Linux") == system_prompt("Linux")
+    assert "run:" in system_prompt("Linux", native_tools=False)
+
+
+def test_context_from_config():
+    config = Config(context_max_tokens=1000, context_keep_recent=3, context_page_tokens=200)
+    context = context_from_config(config, "Linux")
+    assert context.messages == [{'role': 'system', 'content': system_prompt("Linux")}]
+    assert (context.max_tokens, context.keep_recent, context.page_tokens) == (1000, 3, 200)
+
+
+def test_prefix_cache_stats():
+    stats = PrefixCacheStats()
+    assert stats.hit_rate == 0.0
+    stats.hook('usage', {'prompt_tokens': 1000, 'prompt_eval_count': 1000})
+    stats.hook('usage', {'prompt_tokens': 1000, 'prompt_eval_count': 100})
+    stats.hook('usage', {'prompt_tokens': 1000, 'prompt_eval_count': None})
+    stats.hook('reply', {'content': 'ignored'})
+    assert stats.as_dict() == {'requests': 2, 'prompt_tokens': 2000, 'evaluated_tokens': 1100, 'hit_rate': 0.45}
+    assert stats.summary() == "Prompt cache: 45% of ~2000 prompt tokens reused over 2 requests"
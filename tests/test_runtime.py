@@ -1,8 +1,11 @@
 import os
 import sys
+import threading
 import pytest
 from unittest.mock import MagicMock, patch, call
-from entityAgent.runtime import main, runtime
+from entityAgent.config import Config
+from entityAgent.runtime import main, runtime, run_command, parse_process_query
+from entityAgent.web.sessions import SessionStore
 
 # -----------------------------------------------------------------------------
 # Test main()
@@ -10,7 +13,7 @@ from entityAgent.runtime import main, runtime
 
 def test_main_install_ollama():
     with patch("argparse.ArgumentParser.parse_args") as mock_args:
-        mock_args.return_value = MagicMock(install_ollama=True, llm_model=None, web=False)
+        mock_args.return_value = MagicMock(install_ollama=True, llm_model=None, web=False, gui=False)
         with patch("entityAgent.runtime.setup_ollama_cli") as mock_setup:
             with pytest.raises(SystemExit) as exc:
                 main()
@@ -19,16 +22,45 @@ def test_main_install_ollama():
 
 def test_main_web_interface():
     with patch("argparse.ArgumentParser.parse_args") as mock_args:
-        mock_args.return_value = MagicMock(install_ollama=False, llm_model=None, web=True)
+        mock_args.return_value = MagicMock(install_ollama=False, llm_model=None, web=True, gui=False, batch=None, sessions=False)
         with patch("entityAgent.config.load_config") as mock_config:
             mock_config.return_value = MagicMock(server_url=None, model="default-model")
             with patch("uvicorn.run") as mock_uvicorn:
                 main()
                 mock_uvicorn.assert_called_once()
 
+def test_main_gui_waits_for_web_server():
+    with patch("argparse.ArgumentParser.parse_args") as mock_args:
+        mock_args.return_value = MagicMock(install_ollama=False, llm_model=None, web=False, gui=True, batch=None, sessions=False)
+        with patch("entityAgent.config.load_config") as mock_config:
+            mock_config.return_value = MagicMock(server_url=None, model="default-model")
+            server_started = threading.Event()
+            with patch("uvicorn.run", side_effect=lambda *a, **kw: server_started.set()), \
+                    patch.dict(sys.modules, {"webview": MagicMock()}):
+                import webview
+                with patch("entityAgent.runtime.port_is_open", side_effect=[False, True]) as mock_probe:
+                    with patch("entityAgent.ollama_utils.time.sleep"):
+                        main()
+                assert server_started.wait(5)
+                assert mock_probe.call_count == 2
+                webview.create_window.assert_called_once_with("Entity Agent", "http://127.0.0.1:8000")
+
+def test_main_gui_fails_fast_when_web_server_dies():
+    with patch("argparse.ArgumentParser.parse_args") as mock_args:
+        mock_args.return_value = MagicMock(install_ollama=False, llm_model=None, web=False, gui=True, batch=None, sessions=False)
+        with patch("entityAgent.config.load_config") as mock_config:
+            mock_config.return_value = MagicMock(server_url=None, model="default-model")
+            with patch("uvicorn.run"), patch.dict(sys.modules, {"webview": MagicMock()}):
+                import webview
+                with patch("entityAgent.runtime.port_is_open", return_value=False):
+                    with pytest.raises(SystemExit) as exc:
+                        main()
+                assert exc.value.code == 1
+                webview.create_window.assert_not_called()
+
 def test_main_runtime_execution():
     with patch("argparse.ArgumentParser.parse_args") as mock_args:
-        mock_args.return_value = MagicMock(install_ollama=False, llm_model="custom-model", web=False)
+        mock_args.return_value = MagicMock(install_ollama=False, llm_model="custom-model", web=False, gui=False, batch=None, sessions=False)
         with patch("entityAgent.config.load_config") as mock_config:
             mock_config.return_value = MagicMock(server_url="http://custom-host", model="default-model")
             with patch("entityAgent.runtime.runtime") as mock_runtime:
@@ -37,6 +69,20 @@ def test_main_runtime_execution():
                 assert os.environ["OLLAMA_HOST"] == "http://custom-host"
                 assert os.environ["ENTITY_LLM_MODEL"] == "custom-model"
 
+def test_main_batch_mode():
+    with patch("argparse.ArgumentParser.parse_args") as mock_args:
+        mock_args.return_value = MagicMock(install_ollama=False, llm_model=None, web=False, gui=False,
+                                           batch="tasks.jsonl", workers=8, output=None, sessions=False)
+        with patch("entityAgent.config.load_config") as mock_config:
+            mock_config.return_value = MagicMock(server_url=None, model="default-model")
+            with patch("entityAgent.batch.run_batch") as mock_batch, patch("entityAgent.runtime.runtime") as mock_runtime:
+                mock_batch.return_value.failed = 0
+                with pytest.raises(SystemExit) as exc:
+                    main()
+            assert exc.value.code == 0
+            mock_batch.assert_called_once_with(mock_config.return_value, "tasks.jsonl", output_path=None, workers=8)
+            mock_runtime.assert_not_called()
+
 # -----------------------------------------------------------------------------
 # Test runtime()
 # -----------------------------------------------------------------------------
@@ -54,13 +100,13 @@ def mock_ollama_module():
 def test_runtime_exit(mock_ollama_ready, mock_ollama_module):
     with patch("builtins.input", side_effect=["exit"]):
         with patch("entityAgent.config.load_config") as mock_config:
-            mock_config.return_value.model = "test-model"
+            mock_config.return_value = Config(model="test-model")
             runtime()
 
 def test_runtime_list_processes(mock_ollama_ready, mock_ollama_module):
     with patch("builtins.input", side_effect=["run: list_processes", "exit"]):
         with patch("entityAgent.config.load_config") as mock_config:
-            mock_config.return_value.model = "test-model"
+            mock_config.return_value = Config(model="test-model")
             with patch("entityAgent.runtime.list_processes") as mock_list:
                 mock_list.return_value = [{"pid": 123, "name": "test_proc", "username": "user"}]
                 runtime()
@@ -69,33 +115,195 @@ def test_runtime_list_processes(mock_ollama_ready, mock_ollama_module):
 def test_runtime_execute_command_success(mock_ollama_ready, mock_ollama_module):
     with patch("builtins.input", side_effect=["run: echo hello", "exit"]):
         with patch("entityAgent.config.load_config") as mock_config:
-            mock_config.return_value.model = "test-model"
-            with patch("entityAgent.runtime.execute_command") as mock_exec:
+            mock_config.return_value = Config(model="test-model")
+            with patch("entityAgent.runtime.run_command") as mock_exec:
                 mock_exec.return_value = ("hello\n", "", 0)
                 runtime()
-                mock_exec.assert_called_with("echo hello")
+                assert mock_exec.call_args.args[0] == "echo hello"
 
 def test_runtime_execute_command_failure(mock_ollama_ready, mock_ollama_module):
     with patch("builtins.input", side_effect=["run: fail", "exit"]):
         with patch("entityAgent.config.load_config") as mock_config:
-            mock_config.return_value.model = "test-model"
-            with patch("entityAgent.runtime.execute_command") as mock_exec:
+            mock_config.return_value = Config(model="test-model")
+            with patch("entityAgent.runtime.run_command") as mock_exec:
                 mock_exec.return_value = ("", "error\n", 1)
                 runtime()
-                mock_exec.assert_called_with("fail")
+                assert mock_exec.call_args.args[0] == "fail"
 
 def test_runtime_chat_interaction(mock_ollama_ready, mock_ollama_module):
     with patch("builtins.input", side_effect=["hello", "exit"]):
         with patch("entityAgent.config.load_config") as mock_config:
-            mock_config.return_value.model = "test-model"
+            mock_config.return_value = Config(model="test-model", model_warmup=False)
             
-            mock_ollama_module.chat.return_value = {'message': {'content': 'Hi there!'}}
+            client = mock_ollama_module.Client.return_value
+            client.chat.return_value = {'message': {'content': 'Hi there!'}}
             
             runtime()
             
-            mock_ollama_module.chat.assert_called_once()
-            call_args = mock_ollama_module.chat.call_args
+            client.chat.assert_called_once()
+            call_args = client.chat.call_args
             assert call_args.kwargs['model'] == "test-model"
             # messages is mutable and has the assistant response appended after the call
             # so we check the second to last message for the user input
             assert call_args.kwargs['messages'][-2]['content'] == "hello"
+            # The pooled client is closed on exit
+            client.close.assert_called_once()
+
+def test_run_command_prints_output_as_it_arrives(capsys):
+    stdout, stderr, return_code = run_command("echo first && echo second", Config())
+    assert return_code == 0
+    assert stdout == "first\nsecond"
+    assert "first\nsecond" in capsys.readouterr().out
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX shell syntax")
+def test_run_command_reports_failure_and_timeout(capsys):
+    stdout, stderr, return_code = run_command("sleep 5", Config(command_timeout=0.2))
+    assert return_code != 0
+    assert "timed out" in stderr
+    out = capsys.readouterr().out
+    assert "Error:" in out
+    assert "Timed out after 0.2 seconds." in out
+
+def test_run_command_ctrl_c_cancels_command(capsys):
+    class InterruptedStream:
+        returncode = None
+        timed_out = False
+        stdout, stderr = "", "Command was cancelled."
+
+        def __iter__(self):
+            try:
+                raise KeyboardInterrupt
+                yield
+            finally:
+                self.returncode = -9
+
+        cancel = MagicMock()
+
+    stream = InterruptedStream()
+    with patch("entityAgent.runtime.CommandStream", return_value=stream):
+        assert run_command("sleep 100", Config()) == ("", "Command was cancelled.", -9)
+    stream.cancel.assert_called_once()
+    assert "Command cancelled." in capsys.readouterr().out
+
+def test_parse_process_query():
+    assert parse_process_query("") == {}
+    assert parse_process_query(" --sort cpu --limit 5 --name 'py.*' --min-cpu 1.5 --fields pid,cpu") == {
+        "sort": "cpu", "limit": 5, "name": "py.*", "min_cpu": 1.5, "fields": ["pid", "cpu"],
+    }
+    with pytest.raises(ValueError):
+        parse_process_query("--bogus 1")
+    with pytest.raises(ValueError):
+        parse_process_query("--limit")
+
+def test_runtime_list_processes_with_options(mock_ollama_ready, mock_ollama_module):
+    with patch("builtins.input", side_effect=["run: list_processes --sort cpu --limit 3", "exit"]):
+        with patch("entityAgent.config.load_config") as mock_config:
+            mock_config.return_value = Config(model="test-model")
+            with patch("entityAgent.runtime.list_processes") as mock_list:
+                mock_list.return_value = [{"pid": 1, "name": "init", "cpu": 2.0}]
+                runtime()
+                mock_list.assert_called_once_with(sort="cpu", limit=3)
+
+def test_runtime_runs_every_tool_call_before_asking_again(mock_ollama_ready, mock_ollama_module):
+    with patch("builtins.input", side_effect=["how is the disk?", "exit"]):
+        with patch("entityAgent.config.load_config") as mock_config:
+            mock_config.return_value = Config(model="test-model", model_warmup=False)
+            client = mock_ollama_module.Client.return_value
+            client.chat.side_effect = [
+                {'message': {'role': 'assistant', 'content': '', 'tool_calls': [
+                    {'function': {'name': 'execute_command', 'arguments': {'command': 'df -h > disk.txt'}}},
+                    {'function': {'name': 'execute_command', 'arguments': {'command': 'touch checked'}}},
+                ]}},
+                {'message': {'role': 'assistant', 'content': 'Plenty of space.'}},
+            ]
+            with patch("entityAgent.runtime.run_command", side_effect=[("disk ok", "", 0), ("up 3 days", "", 0)]) as mock_exec:
+                runtime()
+
+            assert [c.args[0] for c in mock_exec.call_args_list] == ["df -h > disk.txt", "touch checked"]
+            assert client.chat.call_count == 2
+            first = client.chat.call_args_list[0].kwargs
+            assert 'execute_command' in [t['function']['name'] for t in first['tools']]
+            messages = client.chat.call_args_list[1].kwargs['messages']
+            assert messages[-4]['tool_calls'][0]['function']['arguments'] == {'command': 'df -h > disk.txt'}
+            assert messages[-3] == {'role': 'tool', 'content': 'disk ok', 'tool_name': 'execute_command'}
+            assert messages[-2] == {'role': 'tool', 'content': 'up 3 days', 'tool_name': 'execute_command'}
+            assert messages[-1]['content'] == 'Plenty of space.'
+
+def test_runtime_falls_back_to_run_commands_without_tool_support(mock_ollama_ready, mock_ollama_module):
+    class ResponseError(Exception):
+        status_code = 400
+
+    with patch("builtins.input", side_effect=["list files", "exit"]):
+        with patch("entityAgent.config.load_config") as mock_config:
+            mock_config.return_value = Config(model="test-model", model_warmup=False)
+            client = mock_ollama_module.Client.return_value
+            client.chat.side_effect = [
+                ResponseError("test-model does not support tools"),
+                {'message': {'content': 'run: ls'}},
+                {'message': {'content': 'Done.'}},
+            ]
+            with patch("entityAgent.runtime.run_command", return_value=("a.txt", "", 0)) as mock_exec:
+                runtime()
+
+            mock_exec.assert_called_once()
+            assert mock_exec.call_args.args[0] == "ls"
+            retry = client.chat.call_args_list[1].kwargs
+            assert 'tools' not in retry
+            assert 'run:' in retry['messages'][0]['content']
+
+def test_runtime_runs_read_only_tool_calls_concurrently(mock_ollama_ready, mock_ollama_module):
+    barrier = threading.Barrier(3, timeout=5)
+
+    def execute(command, **limits):
+        # Only returns once all three commands are running at the same time
+        barrier.wait()
+        return f"{command} ok", "", 0
+
+    with patch("builtins.input", side_effect=["check the system", "exit"]):
+        with patch("entityAgent.config.load_config") as mock_config:
+            mock_config.return_value = Config(model="test-model", model_warmup=False)
+            client = mock_ollama_module.Client.return_value
+            client.chat.side_effect = [
+                {'message': {'role': 'assistant', 'content': '', 'tool_calls': [
+                    {'function': {'name': 'execute_command', 'arguments': {'command': command}}}
+                    for command in ('df -h', 'free -m', 'uptime')
+                ]}},
+                {'message': {'role': 'assistant', 'content': 'All good.'}},
+            ]
+            with patch("entityAgent.runtime.execute_command", side_effect=execute), \
+                    patch("entityAgent.runtime.run_command") as mock_run:
+                runtime()
+
+            mock_run.assert_not_called()
+            messages = client.chat.call_args_list[1].kwargs['messages']
+            assert [m['content'] for m in messages[-4:-1]] == ['df -h ok', 'free -m ok', 'uptime ok']
+
+def test_runtime_resumes_saved_session(mock_ollama_ready, mock_ollama_module, tmp_path):
+    config = Config(model="test-model", model_warmup=False, session_db=str(tmp_path / "sessions.db"))
+    client = mock_ollama_module.Client.return_value
+    with patch("entityAgent.config.load_config", return_value=config):
+        client.chat.return_value = {'message': {'role': 'assistant', 'content': 'Hi there.'}}
+        with patch("builtins.input", side_effect=["hello", "exit"]):
+            runtime()
+        session_id = SessionStore(db_path=config.session_db).list_sessions()[0]['id']
+
+        client.chat.return_value = {'message': {'role': 'assistant', 'content': 'You said hello.'}}
+        with patch("builtins.input", side_effect=["what did I say?", "exit"]):
+            runtime(resume=session_id)
+
+    messages = client.chat.call_args.kwargs['messages']
+    assert [m['content'] for m in messages[1:4]] == ['hello', 'Hi there.', 'what did I say?']
+    history = SessionStore(db_path=config.session_db).get_or_create(session_id)[1]
+    assert [m['content'] for m in history] == ['hello', 'Hi there.', 'what did I say?', 'You said hello.']
+
+def test_runtime_keeps_no_session_without_session_db(mock_ollama_ready, mock_ollama_module, capsys):
+    config = Config(model="test-model", model_warmup=False)
+    client = mock_ollama_module.Client.return_value
+    client.chat.return_value = {'message': {'role': 'assistant', 'content': 'Hi there.'}}
+    with patch("entityAgent.config.load_config", return_value=config), \
+            patch("entityAgent.runtime.SessionStore") as mock_store, \
+            patch("builtins.input", side_effect=["hello", "exit"]):
+        runtime(resume="abc123")
+
+    mock_store.assert_not_called()
+    assert "--resume needs session_db" in capsys.readouterr().out
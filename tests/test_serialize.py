@@ -0,0 +1,56 @@
+from entityAgent.config import Config
+from entityAgent.serialize import compact_number, compact_text, dedupe_lines, elide_lines, format_table, serialize
+from entityAgent.tools import Tool, ToolRegistry
+
+
+def test_compact_number():
+    assert compact_number(40.0) == "40"
+    assert compact_number(12.345) == "12.3"
+    assert compact_number(0.01234) == "0.0123"
+    assert compact_number(123456.7) == "123457"
+    assert compact_number(7) == "7"
+
+
+def test_table_has_one_header_and_fills_missing_columns():
+    rows = [{'pid': 1, 'name': 'init', 'cpu': 0.0}, {'pid': 42, 'name': 'my\tapp', 'rss': None, 'ipv4': ['a', 'b']}]
+    assert format_table(rows) == "pid\tname\tcpu\trss\tipv4\n1\tinit\t0\t\t\n42\tmy app\t\t\ta,b"
+
+
+def test_serialize_records_and_nested_tables():
+    assert serialize({'up': True, 'load': [0.5, 1.25], 'users': [{'name': 'alice'}]}) == (
+        "up: yes\nload: 0.5,1.25\nusers:\nname\nalice")
+    assert serialize([]) == ""
+
+
+def test_dedupe_lines_collapses_long_runs_only():
+    assert dedupe_lines("a\na\nb") == "a\na\nb"
+    assert dedupe_lines("a\n" * 5 + "b") == "a\n… [previous line repeated 4 more times]\nb"
+    assert dedupe_lines("a\n\n\n\n\nb") == "a\n\nb"
+
+
+def test_elide_lines_keeps_whole_head_and_tail_lines():
+    text = "\n".join(f"line {i:03d}" for i in range(200))
+    result = elide_lines(text, 50)
+    lines = result.split("\n")
+    assert lines[0] == "line 000"
+    assert lines[-1] == "line 199"
+    assert any(line.startswith("… [") and "lines (~" in line for line in lines)
+    assert all(line.startswith("line ") or line.startswith("… [") for line in lines)
+    assert len(result) < 50 * 4 + 60
+    assert elide_lines(text, None) == text
+
+
+def test_elide_lines_falls_back_to_characters_for_one_long_line():
+    result = elide_lines("x" * 10_000, 10)
+    assert "characters elided" in result
+    assert len(result) < 100
+
+
+def test_compact_text_strips_trailing_whitespace():
+    assert compact_text("PID   \nnoise  \n\n") == "PID\nnoise"
+
+
+def test_registry_compacts_every_result():
+    registry = ToolRegistry([Tool('spam', "Repeats itself.", lambda: "same\n" * 1000)], max_output_tokens=100)
+    assert registry.call('spam') == "same\n… [previous line repeated 999 more times]"
+    assert Config().max_tool_output_tokens == 800
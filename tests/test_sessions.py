@@ -0,0 +1,142 @@
+import time
+from unittest.mock import patch
+from entityAgent.web.sessions import SessionStore
+
+def test_new_session_is_seeded():
+    store = SessionStore()
+    seed = [{"role": "user", "content": "hi"}]
+    session_id, history = store.get_or_create(None, seed)
+    assert history == seed
+    assert store.get_or_create(session_id) == (session_id, seed)
+
+def test_append_and_reload():
+    store = SessionStore()
+    session_id, _ = store.get_or_create()
+    store.append(session_id, {"role": "user", "content": "a"}, {"role": "assistant", "content": "b"})
+    _, history = store.get_or_create(session_id)
+    assert [m["content"] for m in history] == ["a", "b"]
+
+def test_returned_history_is_a_copy():
+    store = SessionStore()
+    session_id, history = store.get_or_create()
+    history.append({"role": "user", "content": "not stored"})
+    assert store.get_or_create(session_id)[1] == []
+
+def test_unknown_session_gets_new_id():
+    store = SessionStore()
+    session_id, history = store.get_or_create("missing")
+    assert session_id != "missing"
+    assert history == []
+
+def test_lru_eviction():
+    store = SessionStore(max_sessions=2)
+    first, _ = store.get_or_create()
+    second, _ = store.get_or_create()
+    store.get_or_create(first)  # touch, so `second` is now least recent
+    store.get_or_create()
+    assert len(store) == 2
+    assert store.get_or_create(first)[0] == first
+    assert store.get_or_create(second)[0] != second
+
+def test_ttl_expiry():
+    store = SessionStore(ttl=10)
+    now = time.monotonic()
+    with patch("entityAgent.web.sessions.time.monotonic", return_value=now):
+        session_id, _ = store.get_or_create()
+    with patch("entityAgent.web.sessions.time.monotonic", return_value=now + 11):
+        assert store.get_or_create(session_id)[0] != session_id
+
+def test_sqlite_backing_survives_lru_eviction(tmp_path):
+    store = SessionStore(max_sessions=1, db_path=str(tmp_path / "sessions.db"))
+    session_id, _ = store.get_or_create()
+    store.append(session_id, {"role": "user", "content": "persisted"})
+    store.get_or_create()  # pushes the first session out of memory
+    assert store.get_or_create(session_id) == (session_id, [{"role": "user", "content": "persisted"}])
+
+def test_sqlite_backing_survives_restart(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+    session_id, _ = SessionStore(db_path=db_path).get_or_create(None, [{"role": "user", "content": "hi"}])
+    assert SessionStore(db_path=db_path).get_or_create(session_id)[1] == [{"role": "user", "content": "hi"}]
+
+def test_delete():
+    store = SessionStore()
+    session_id, _ = store.get_or_create()
+    store.delete(session_id)
+    assert store.get_or_create(session_id)[0] != session_id
+
+def test_sqlite_log_uses_wal_and_appends_rows(tmp_path):
+    store = SessionStore(db_path=str(tmp_path / "sessions.db"))
+    session_id, _ = store.get_or_create()
+    store.append(session_id, {"role": "user", "content": "a"})
+    store.append(session_id, {"role": "assistant", "content": "b"})
+    assert store._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    rows = store._db.execute("SELECT seq FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)).fetchall()
+    assert rows == [(0,), (1,)]
+
+def test_reload_keeps_recent_messages_from_a_user_turn(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+    store = SessionStore(db_path=db_path)
+    session_id, _ = store.get_or_create()
+    for i in range(3):
+        store.append(session_id, {"role": "user", "content": f"q{i}"}, {"role": "tool", "content": f"t{i}"},
+                     {"role": "assistant", "content": f"a{i}"})
+
+    restarted = SessionStore(db_path=db_path, load_limit=4)
+    _, history = restarted.get_or_create(session_id)
+    assert [m["content"] for m in history] == ["q2", "t2", "a2"]
+    # New messages continue after the ones left on disk
+    restarted.append(session_id, {"role": "user", "content": "q3"})
+    messages, more = restarted.messages(session_id, limit=2)
+    assert [(m["seq"], m["content"]) for m in messages] == [(8, "a2"), (9, "q3")]
+    assert more
+
+def test_messages_pages_back_from_the_newest():
+    store = SessionStore()
+    session_id, _ = store.get_or_create(None, [{"role": "user", "content": str(i)} for i in range(5)])
+    page, more = store.messages(session_id, limit=2)
+    assert [m["content"] for m in page] == ["3", "4"] and more
+    page, more = store.messages(session_id, limit=2, before=page[0]["seq"])
+    assert [m["content"] for m in page] == ["1", "2"] and more
+    page, more = store.messages(session_id, limit=2, before=1)
+    assert [m["content"] for m in page] == ["0"] and not more
+    assert store.messages("missing") is None
+
+def test_session_index(tmp_path):
+    store = SessionStore(db_path=str(tmp_path / "sessions.db"))
+    first, _ = store.get_or_create(None, [{"role": "user", "content": "How   much disk is free?"}])
+    second, _ = store.get_or_create()
+    store.append(second, {"role": "user", "content": "hello"})
+    store.append(first, {"role": "user", "content": "and memory?"})
+    index = store.list_sessions()
+    assert [(s["id"], s["title"], s["messages"]) for s in index] == [
+        (first, "How much disk is free?", 2), (second, "hello", 1)]
+    assert index[0]["created"] <= index[0]["updated"]
+
+def test_sqlite_sessions_outlive_ttl_within_retention(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+    session_id, _ = SessionStore(db_path=db_path, ttl=10).get_or_create(None, [{"role": "user", "content": "hi"}])
+    later = time.time() + 60
+    with patch("entityAgent.web.sessions.time.time", return_value=later):
+        assert SessionStore(db_path=db_path, ttl=10, retention=3600).get_or_create(session_id)[0] == session_id
+    # Without a retention the rows expire with the TTL
+    with patch("entityAgent.web.sessions.time.time", return_value=later + 60):
+        assert SessionStore(db_path=db_path, ttl=10).get_or_create(session_id)[0] != session_id
+
+def test_database_without_session_index_is_upgraded(tmp_path):
+    import sqlite3
+    db_path = str(tmp_path / "sessions.db")
+    db = sqlite3.connect(db_path)
+    db.executescript(
+        "CREATE TABLE sessions (id TEXT PRIMARY KEY, updated REAL NOT NULL);"
+        "CREATE TABLE messages (session_id TEXT NOT NULL, seq INTEGER NOT NULL, message TEXT NOT NULL, "
+        "PRIMARY KEY (session_id, seq));"
+    )
+    db.execute("INSERT INTO sessions VALUES ('old', ?)", (time.time(),))
+    db.execute("INSERT INTO messages VALUES ('old', 0, '{\"role\": \"user\", \"content\": \"hi\"}')")
+    db.commit()
+    db.close()
+
+    store = SessionStore(db_path=db_path)
+    store.append("old", {"role": "assistant", "content": "hello"})
+    assert store.get_or_create("old")[1][-1]["content"] == "hello"
+    assert [(s["id"], s["messages"]) for s in store.list_sessions()] == [("old", 2)]
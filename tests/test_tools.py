@@ -0,0 +1,144 @@
+import json
+from unittest.mock import patch
+
+from entityAgent.config import Config
+from entityAgent.platform_interaction import (
+    cpu_info, disk_usage, file_info, is_read_only_command, memory_info, network_interfaces, system_info,
+)
+from entityAgent.tools import Tool, ToolRegistry, default_registry, format_probe, human_size, tools_unsupported
+
+
+def test_schema_follows_ollama_tool_format():
+    tool = Tool('echo', "Echo text.", lambda text: text,
+                {'text': {'type': 'string'}}, ['text'])
+    assert tool.schema() == {
+        'type': 'function',
+        'function': {
+            'name': 'echo',
+            'description': "Echo text.",
+            'parameters': {'type': 'object', 'properties': {'text': {'type': 'string'}}, 'required': ['text']},
+        },
+    }
+
+
+def test_call_accepts_dict_or_json_arguments_and_drops_unknown_ones():
+    registry = ToolRegistry([Tool('echo', "Echo text.", lambda text: text, {'text': {'type': 'string'}}, ['text'])])
+    assert registry.call('echo', {'text': 'hi', 'extra': 1}) == 'hi'
+    assert registry.call('echo', json.dumps({'text': 'hi'})) == 'hi'
+
+
+def test_call_reports_errors_as_text():
+    def fail(path):
+        raise FileNotFoundError(f"No such file: {path}")
+
+    registry = ToolRegistry([Tool('read', "Read.", fail, {'path': {'type': 'string'}}, ['path'])])
+    assert registry.call('missing') == "Unknown tool 'missing'. Available tools: read"
+    assert registry.call('read', {}) == "read failed: missing required argument(s): path"
+    assert registry.call('read', {'path': 'x'}) == "read failed: No such file: x"
+
+
+def test_default_registry_tools(tmp_path):
+    (tmp_path / "notes.txt").write_text("hello")
+    (tmp_path / "sub").mkdir()
+    registry = default_registry(Config(), run=lambda command: (f"ran {command}", "", 0))
+
+    assert [s['function']['name'] for s in registry.schemas()] == [
+        'execute_command', 'list_processes', 'read_file', 'list_directory', 'system_info', 'cpu_usage',
+        'memory_usage', 'disk_usage', 'network_interfaces', 'file_info']
+    assert registry.call('execute_command', {'command': 'uptime'}) == "ran uptime"
+    assert registry.call('read_file', {'path': str(tmp_path / "notes.txt")}) == "hello"
+    assert registry.call('list_directory', {'path': str(tmp_path)}) == "notes.txt\nsub/"
+
+
+def test_execute_command_reports_failures():
+    registry = default_registry(Config(), run=lambda command: ("partial", "boom", 2))
+    assert registry.call('execute_command', {'command': 'x'}) == (
+        "Command exited with code 2.\nOutput:\npartial\nError:\nboom")
+
+
+def test_read_file_is_capped(tmp_path):
+    (tmp_path / "big.txt").write_text("x" * 20)
+    registry = default_registry(Config(max_command_output_bytes=10))
+    assert registry.call('read_file', {'path': str(tmp_path / "big.txt")}) == (
+        "x" * 10 + "\n... [file truncated at 10 bytes]")
+
+
+def test_list_processes_tool_passes_options():
+    registry = default_registry(Config(process_list_limit=5))
+    with patch("entityAgent.tools.list_processes", return_value=[{'pid': 1, 'name': 'init'}]) as mock_list:
+        result = registry.call('list_processes', {'fields': ['pid', 'name'], 'sort': 'pid'})
+    assert result == "pid\tname\n1\tinit"
+    mock_list.assert_called_once_with(fields=['pid', 'name'], name=None, user=None, sort='pid',
+                                      min_cpu=None, limit=5)
+
+
+def test_list_processes_tool_reports_invalid_name_pattern():
+    registry = default_registry(Config())
+    result = registry.call('list_processes', {'name': 'python('})
+    assert result.startswith("list_processes failed: invalid name pattern:")
+
+
+def test_tools_unsupported():
+    class ResponseError(Exception):
+        status_code = 400
+
+    assert tools_unsupported(ResponseError("registry.ollama.ai/library/llama3:latest does not support tools"))
+    assert not tools_unsupported(ResponseError("invalid options"))
+    assert not tools_unsupported(ConnectionError("does not support tools"))
+
+
+def _command(command):
+    return {'function': {'name': 'execute_command', 'arguments': {'command': command}}}
+
+
+def test_is_read_only_command():
+    assert is_read_only_command("df -h")
+    assert is_read_only_command("cat /etc/os-release | grep ID")
+    assert is_read_only_command("/bin/ls -la")
+    assert not is_read_only_command("rm -rf build")
+    assert not is_read_only_command("ls > listing.txt")
+    assert not is_read_only_command("uptime; reboot")
+    assert not is_read_only_command("echo $(touch x)")
+    assert not is_read_only_command("ps aux || kill 1")
+    assert not is_read_only_command("")
+
+
+def test_batches_group_consecutive_read_only_calls():
+    registry = default_registry(Config())
+    calls = [_command("df -h"), _command("uptime"), _command("mkdir logs"),
+             {'function': {'name': 'list_directory', 'arguments': {'path': 'logs'}}}, _command("free -m")]
+    assert registry.batches(calls) == [calls[:2], [calls[2]], calls[3:]]
+
+
+def test_system_probes_return_structured_results(tmp_path):
+    info = system_info()
+    assert info['uptime'] >= 0 and info['hostname']
+    assert cpu_info(interval=0.01)['logical'] >= 1
+    memory = memory_info()
+    assert 0 < memory['available'] <= memory['total']
+    root = disk_usage(str(tmp_path))
+    assert len(root) == 1 and root[0]['total'] >= root[0]['free']
+    assert all('name' in interface for interface in network_interfaces())
+
+    (tmp_path / "notes.txt").write_text("hello")
+    details = file_info(str(tmp_path / "notes.txt"))
+    assert (details['type'], details['size']) == ('file', 5)
+    assert details['mode'].startswith('-rw')
+    assert file_info(str(tmp_path))['type'] == 'directory'
+
+
+def test_probe_tools_format_compact_text(tmp_path):
+    registry = default_registry(Config())
+    with patch("entityAgent.tools.memory_info", return_value={'total': 8 * 1024 ** 3, 'percent': 40.0}):
+        assert registry.call('memory_usage') == "total: 8.0G\npercent: 40"
+    header, row = registry.call('disk_usage', {'path': str(tmp_path)}).split("\n")
+    assert dict(zip(header.split("\t"), row.split("\t")))['mount'] == str(tmp_path)
+    assert registry.call('file_info', {'path': str(tmp_path / "missing")}).startswith("file_info failed:")
+    assert all(registry.tools[name].read_only for name in ('system_info', 'cpu_usage', 'disk_usage', 'file_info'))
+
+
+def test_human_size():
+    assert human_size(512) == "512B"
+    assert human_size(1536) == "1.5K"
+    assert human_size(5 * 1024 ** 4) == "5.0T"
+    assert format_probe([{'size': 2048, 'name': 'x'}]) == "size\tname\n2.0K\tx"
@@ -0,0 +1,61 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+from entityAgent.config import Config
+from entityAgent.warmup import ModelHeartbeat, heartbeat_from_config, warm_up, warm_up_async
+
+
+def test_warm_up_sends_empty_chat():
+    client = MagicMock()
+    assert warm_up(client, "llama3", keep_alive="30m") is not None
+    client.chat.assert_called_once_with(model="llama3", messages=[], keep_alive="30m")
+
+
+def test_warm_up_failure_is_not_fatal():
+    client = MagicMock()
+    client.chat.side_effect = ConnectionError("refused")
+    assert warm_up(client, "llama3") is None
+    client.chat.assert_called_once_with(model="llama3", messages=[])
+
+
+def test_warm_up_async():
+    client = MagicMock()
+    client.chat = AsyncMock()
+    assert asyncio.run(warm_up_async(client, "llama3", keep_alive=-1)) is not None
+    client.chat.assert_awaited_once_with(model="llama3", messages=[], keep_alive=-1)
+
+
+def test_heartbeat_pings_while_active():
+    client = MagicMock()
+    heartbeat = ModelHeartbeat(client, "llama3", interval=0.02, idle_timeout=60, keep_alive="10m")
+    heartbeat.start()
+    try:
+        deadline = time.monotonic() + 2
+        while heartbeat.beats < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        heartbeat.stop()
+    assert heartbeat.beats >= 2
+    client.chat.assert_called_with(model="llama3", messages=[], keep_alive="10m")
+
+
+def test_heartbeat_stops_when_idle():
+    client = MagicMock()
+    heartbeat = ModelHeartbeat(client, "llama3", interval=0.02, idle_timeout=0)
+    time.sleep(0.01)
+    assert not heartbeat.active()
+    heartbeat.start()
+    time.sleep(0.1)
+    heartbeat.stop()
+    client.chat.assert_not_called()
+
+    heartbeat.touch()
+    heartbeat.idle_timeout = 60
+    assert heartbeat.active()
+
+
+def test_heartbeat_from_config():
+    assert heartbeat_from_config(MagicMock(), Config(model_heartbeat_interval=None)) is None
+    heartbeat = heartbeat_from_config(MagicMock(), Config(model="mistral", keep_alive="1h"))
+    assert (heartbeat.model, heartbeat.interval, heartbeat.keep_alive) == ("mistral", 240, "1h")
@@ -1,17 +1,59 @@
+import json
+import sys
+import pytest
+import asyncio
+import time
 from fastapi.testclient import TestClient
-from entityAgent.web.server import app
-from unittest.mock import patch
+from entityAgent.web.server import app, config
+from unittest.mock import AsyncMock, MagicMock, patch
 
 client = TestClient(app)
 
+@pytest.fixture(autouse=True)
+def command_slots():
+    # `client` does not run the lifespan hook, which creates the semaphore on the server's loop
+    with patch("entityAgent.web.server.command_slots", asyncio.Semaphore(config.max_concurrency)) as slots:
+        yield slots
+
+async def _stream(chunks):
+    for chunk in chunks:
+        yield chunk
+
 def test_read_root():
     response = client.get("/")
     assert response.status_code == 200
     # assert "text/html" in response.headers["content-type"]
 
-@patch("ollama.chat")
-def test_chat_api(mock_chat):
-    mock_chat.return_value = {'message': {'content': 'Hello from LLM'}}
+@patch("entityAgent.web.server.process_sampler")
+@patch("entityAgent.web.server.heartbeat")
+@patch("entityAgent.web.server.load_client")
+@patch("entityAgent.web.server.make_async_client")
+@patch("entityAgent.web.server.llm_client")
+def test_lifespan_manages_clients_and_model(mock_client, mock_make_async, mock_load_client, mock_heartbeat,
+                                           mock_sampler, command_slots):
+    from entityAgent.web import server
+    ollama_client = mock_make_async.return_value
+    ollama_client.chat = AsyncMock()
+    ollama_client.close = AsyncMock()
+    mock_client.chat = AsyncMock(return_value={'message': {'content': 'Hi'}})
+    with TestClient(app) as started:
+        # One pooled client, created on startup and used for every request
+        assert mock_client.client is ollama_client
+        assert server.command_slots is not command_slots
+        started.post("/api/chat", json={"message": "Hello"})
+        ollama_client.close.assert_not_awaited()
+    mock_make_async.assert_called_once_with(config)
+    ollama_client.chat.assert_awaited_once_with(model=config.model, messages=[])
+    ollama_client.close.assert_awaited_once()
+    mock_load_client.close.assert_called_once()
+    mock_heartbeat.start.assert_called_once()
+    mock_heartbeat.touch.assert_called_once()
+    mock_sampler.stop.assert_called_once()
+    mock_heartbeat.stop.assert_called_once()
+
+@patch("entityAgent.web.server.llm_client")
+def test_chat_api(mock_client):
+    mock_client.chat = AsyncMock(return_value={'message': {'content': 'Hello from LLM'}})
     
     response = client.post("/api/chat", json={
         "message": "Hello",
@@ -19,9 +61,122 @@ def test_chat_api(mock_chat):
     })
     
     assert response.status_code == 200
-    assert response.json() == {"response": "Hello from LLM"}
+    assert response.json()["response"] == "Hello from LLM"
+    assert response.json()["session_id"]
+
+@patch("entityAgent.web.server.llm_client")
+def test_chat_api_keeps_history_server_side(mock_client):
+    mock_client.chat = AsyncMock(return_value={'message': {'content': 'First reply'}})
+    session_id = client.post("/api/chat", json={"message": "First"}).json()["session_id"]
+
+    mock_client.chat = AsyncMock(return_value={'message': {'content': 'Second reply'}})
+    response = client.post("/api/chat", json={"message": "Second", "session_id": session_id})
+
+    assert response.json()["session_id"] == session_id
+    # The agent's message list, which also holds the reply by now
+    sent = mock_client.chat.call_args.kwargs["messages"]
+    assert sent[0]["role"] == "system"
+    assert [m["content"] for m in sent[1:]] == ["First", "First reply", "Second", "Second reply"]
+
+@patch("entityAgent.web.server.llm_client")
+def test_chat_without_lifespan_fails_clearly(mock_client):
+    mock_client.client = None
+
+    response = client.post("/api/chat", json={"message": "Hello"})
+
+    assert response.status_code == 500
+    assert "lifespan hook has not run" in response.json()["detail"]
+    mock_client.chat.assert_not_called()
+
+@patch("entityAgent.web.server.llm_client")
+def test_session_index_and_message_pages(mock_client):
+    mock_client.chat = AsyncMock(return_value={'message': {'content': 'Reply'}})
+    session_id = client.post("/api/chat", json={"message": "Page me"}).json()["session_id"]
+    client.post("/api/chat", json={"message": "Again", "session_id": session_id})
+
+    index = client.get("/api/sessions").json()["sessions"]
+    assert {"id": session_id, "title": "Page me", "messages": 4}.items() <= index[0].items()
+
+    page = client.get(f"/api/sessions/{session_id}/messages", params={"limit": 3}).json()
+    assert [m["content"] for m in page["messages"]] == ["Reply", "Again", "Reply"]
+    assert page["more"] is True
+    older = client.get(f"/api/sessions/{session_id}/messages",
+                       params={"limit": 3, "before": page["messages"][0]["seq"]}).json()
+    assert [m["content"] for m in older["messages"]] == ["Page me"]
+    assert older["more"] is False
+    assert client.get("/api/sessions/missing/messages").status_code == 404
+
+@patch("entityAgent.web.server.llm_client")
+def test_session_store_runs_off_the_event_loop(mock_client):
+    import threading
+    from entityAgent.web.server import sessions
+    mock_client.chat = AsyncMock(return_value={'message': {'content': 'Reply'}})
+    threads = []
+    with patch.object(sessions, "_append", side_effect=lambda *args: threads.append(threading.current_thread().name)):
+        client.post("/api/chat", json={"message": "Hi"})
+    assert threads and all(name.startswith("entity-sessions") for name in threads)
+
+@patch("entityAgent.web.server.llm_client")
+def test_chat_stream_api(mock_client):
+    mock_client.chat = AsyncMock(return_value=_stream([
+        {'message': {'content': 'Hello'}},
+        {'message': {'content': ' from'}},
+        {'message': {'content': ' LLM'}},
+    ]))
+
+    response = client.post("/api/chat/stream", json={
+        "message": "Hello",
+        "history": []
+    })
 
-@patch("entityAgent.web.server.execute_command")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines()]
+    session_id = events[0]["session_id"]
+    assert "".join(e.get("token", "") for e in events) == "Hello from LLM"
+    assert events[-1] == {"done": True}
+    assert mock_client.chat.call_args.kwargs["stream"] is True
+
+    mock_client.chat = AsyncMock(return_value=_stream([{'message': {'content': 'Again'}}]))
+    client.post("/api/chat/stream", json={"message": "Next", "session_id": session_id})
+    sent = mock_client.chat.call_args.kwargs["messages"]
+    assert [m["content"] for m in sent[1:]] == ["Hello", "Hello from LLM", "Next", "Again"]
+
+@patch("entityAgent.web.server.llm_client")
+def test_chat_stream_api_error(mock_client):
+    mock_client.chat = AsyncMock(side_effect=Exception("model not found"))
+
+    response = client.post("/api/chat/stream", json={
+        "message": "Hello",
+        "history": []
+    })
+
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events[1:] == [{"error": "model not found"}]
+
+@patch("entityAgent.web.server.llm_client")
+def test_chat_stream_api_runs_tools(mock_client):
+    mock_client.chat = AsyncMock(side_effect=[
+        _stream([{'message': {'role': 'assistant', 'content': '', 'tool_calls': [
+            {'function': {'name': 'execute_command', 'arguments': {'command': 'uptime'}}}]}}]),
+        _stream([{'message': {'content': 'Up for 3 days.'}}]),
+    ])
+    with patch("entityAgent.tools.execute_command", return_value=("up 3 days", "", 0)):
+        response = client.post("/api/chat/stream", json={"message": "How long has it been up?"})
+
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert {"tool_call": {"name": "execute_command", "arguments": {"command": "uptime"}}} in events
+    assert {"tool_result": {"name": "execute_command", "result": "up 3 days"}} in events
+    assert events[-2:] == [{"token": "Up for 3 days."}, {"done": True}]
+    assert 'tools' in mock_client.chat.call_args_list[0].kwargs
+
+    session_id = events[0]["session_id"]
+    from entityAgent.web.server import sessions
+    history = sessions.get_or_create(session_id)[1]
+    assert [m["role"] for m in history] == ["user", "assistant", "tool", "assistant"]
+
+@patch("entityAgent.web.server.execute_command_async", new_callable=AsyncMock)
 def test_execute_api(mock_execute):
     mock_execute.return_value = ("Output", "", 0)
     
@@ -34,12 +189,167 @@ def test_execute_api(mock_execute):
     assert data["stdout"] == "Output"
     assert data["return_code"] == 0
 
-@patch("entityAgent.web.server.list_processes")
-def test_processes_api(mock_list):
-    mock_list.return_value = [{"pid": 1, "name": "test", "username": "user"}]
+def test_execute_stream_api():
+    response = client.post("/api/execute/stream", json={"command": "echo one; echo two >&2"})
+
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert "job_id" in events[0]
+    assert {"stream": "stdout", "line": "one"} in events and {"stream": "stderr", "line": "two"} in events
+    assert events[-1] == {"return_code": 0, "truncated": False, "timed_out": False, "cancelled": False}
+
+def test_execute_stream_api_stops_streaming_at_output_cap():
+    with patch.object(config, "max_command_output_bytes", 20):
+        response = client.post("/api/execute/stream", json={"command": "seq 1 100"})
+
+    events = [json.loads(line) for line in response.text.splitlines()]
+    # "1\n" to "9\n" fit in 20 bytes; "10\n" would not
+    assert [event["line"] for event in events if "line" in event] == [str(i) for i in range(1, 10)]
+    assert events[-1]["return_code"] == 0 and events[-1]["truncated"] is True
+
+def test_execute_api_does_not_block_event_loop():
+    async def slow_command(command, **kwargs):
+        await asyncio.sleep(0.5)
+        return ("done", "", 0)
+
+    async def run_concurrently():
+        import httpx
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            started = time.monotonic()
+            responses = await asyncio.gather(
+                ac.post("/api/execute", json={"command": "sleep"}),
+                ac.post("/api/execute", json={"command": "sleep"}),
+            )
+            return time.monotonic() - started, responses
+
+    with patch("entityAgent.web.server.execute_command_async", side_effect=slow_command):
+        elapsed, responses = asyncio.run(run_concurrently())
+
+    assert all(r.status_code == 200 for r in responses)
+    assert elapsed < 0.9
+
+SNAPSHOT = [
+    {"pid": 1, "name": "init", "username": "root", "cpu": 0.5, "rss": 100},
+    {"pid": 42, "name": "python", "username": "user", "cpu": 12.0, "rss": 300},
+    {"pid": 7, "name": "python3", "username": "user", "cpu": 3.0, "rss": 200},
+]
+
+@patch("entityAgent.web.server.process_sampler")
+def test_processes_api(mock_sampler):
+    mock_sampler.version = 3
+    mock_sampler.snapshot.return_value = (3, SNAPSHOT)
     
     response = client.get("/api/processes")
     
     assert response.status_code == 200
-    assert len(response.json()) == 1
-    assert response.json()[0]["name"] == "test"
+    assert len(response.json()) == 3
+    assert response.json()[0] == {"pid": 1, "name": "init", "username": "root"}
+    assert response.headers["etag"] == '"3"'
+
+@patch("entityAgent.web.server.process_sampler")
+def test_processes_api_query(mock_sampler):
+    mock_sampler.version = 3
+    mock_sampler.snapshot.return_value = (3, SNAPSHOT)
+
+    response = client.get("/api/processes", params={
+        "fields": "pid,cpu", "name": "python", "sort": "cpu", "limit": 1
+    })
+
+    assert response.status_code == 200
+    assert response.json() == [{"pid": 42, "cpu": 12.0}]
+
+@patch("entityAgent.web.server.process_sampler")
+def test_processes_api_not_modified(mock_sampler):
+    mock_sampler.version = 3
+    mock_sampler.snapshot.return_value = (3, SNAPSHOT)
+
+    response = client.get("/api/processes", headers={"If-None-Match": '"3"'})
+
+    assert response.status_code == 304
+
+@patch("entityAgent.web.server.list_processes")
+def test_processes_api_unsampled_field_scans_live(mock_list):
+    mock_list.return_value = [{"pid": 1, "cmdline": "init"}]
+
+    response = client.get("/api/processes", params={"fields": "pid,cmdline"})
+
+    assert response.json() == [{"pid": 1, "cmdline": "init"}]
+    assert mock_list.call_args.kwargs["fields"] == ["pid", "cmdline"]
+
+@patch("entityAgent.web.server.process_sampler")
+def test_process_delta_api(mock_sampler):
+    mock_sampler.version = 5
+    mock_sampler.delta.return_value = {"version": 5, "full": False, "started": [], "updated": [], "exited": [9]}
+
+    response = client.get("/api/processes/delta", params={"since": 4})
+
+    assert response.json()["exited"] == [9]
+    assert response.headers["etag"] == '"5"'
+    mock_sampler.delta.assert_called_once_with(4)
+    assert client.get("/api/processes/delta", params={"since": 4}, headers={"If-None-Match": '"5"'}).status_code == 304
+
+def test_processes_api_unknown_field():
+    response = client.get("/api/processes", params={"fields": "pid,bogus"})
+    assert response.status_code == 400
+
+@patch("entityAgent.web.server.process_sampler")
+def test_processes_api_invalid_name_pattern(mock_sampler):
+    mock_sampler.version = 3
+    mock_sampler.snapshot.return_value = (3, SNAPSHOT)
+
+    response = client.get("/api/processes", params={"name": "python("})
+
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("invalid name pattern:")
+
+@patch("entityAgent.web.server.llm_client")
+def test_chat_refused_when_queue_is_full(mock_client):
+    from entityAgent.web.admission import AdmissionController
+    mock_client.chat = AsyncMock()
+    with patch("entityAgent.web.server.admission", AdmissionController(concurrency=0, max_queue=0)):
+        for path in ("/api/chat", "/api/chat/stream"):
+            response = client.post(path, json={"message": "Hello"})
+            assert response.status_code == 503
+            assert int(response.headers["Retry-After"]) >= 1
+    mock_client.chat.assert_not_called()
+
+@patch("entityAgent.web.server.llm_client")
+def test_stats_report_prefix_cache_hits(mock_client):
+    from entityAgent.web.server import prefix_cache
+    before = prefix_cache.requests
+    mock_client.chat = AsyncMock(return_value={'message': {'content': 'Hi'}, 'prompt_eval_count': 3})
+    client.post("/api/chat", json={"message": "Hello"})
+    stats = client.get("/api/stats").json()["prefix_cache"]
+    assert stats["requests"] == before + 1
+    assert 0 <= stats["hit_rate"] <= 1
+
+def test_chat_stream_releases_slot_when_body_is_never_read():
+    from entityAgent.web import server
+    from entityAgent.web.admission import AdmissionController
+
+    async def main():
+        admission = AdmissionController(concurrency=1)
+        with patch("entityAgent.web.server.admission", admission):
+            http_request = MagicMock()
+            http_request.client.host = "client"
+            responses = [await server.chat_stream(server.ChatRequest(message="Hi"), http_request) for _ in range(3)]
+
+            async def receive():
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                raise OSError("client went away")
+
+            for response in responses:
+                with pytest.raises(OSError):
+                    await response({"type": "http"}, receive, send)
+            queue = admission._queues[config.model]
+            assert (queue.running, queue.depth()) == (0, 0)
+
+            # A session lookup that fails gives the slot back too
+            with patch.object(server.sessions, "get_or_create", side_effect=RuntimeError("db locked")):
+                with pytest.raises(RuntimeError):
+                    await server.chat_stream(server.ChatRequest(message="Hi"), http_request)
+            assert queue.running == 0
+
+    asyncio.run(main())